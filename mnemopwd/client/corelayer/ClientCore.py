@@ -52,6 +52,7 @@ class ClientCore(Subject):
     - transport: a SSL/TLS asynchronous socket (see the official ssl module)
     - protocol: a communication handler (see the official asyncio module)
     - table: table of blocks (a dictionary)
+    - stats: statistics of the database (set by S38A state)
 
     Method(s):
     - start: start the domain layer
@@ -84,6 +85,7 @@ class ClientCore(Subject):
         self.task = None  # The current task executed by the command handler
         self.taskInProgress = False  # Flag to indicate a task is in progress
         self.lastblock = None  # The last block or the last index used
+        self.stats = None  # The statistics of the database
 
         # Create and set an executor
         executor = concurrent.futures.ThreadPoolExecutor(Configuration.poolsize)
@@ -281,13 +283,19 @@ class ClientCore(Subject):
         self.taskInProgress = True
         yield from self.loop.run_in_executor(
             None, self.protocol.data_received, pattern)
-        while self.taskInProgress:
-            yield from asyncio.sleep(0.01, loop=self.loop)
-        # Notify the result to the UI layer
-        if len(self.searchTable) > 0:
-            yield from self.loop.run_in_executor(
-                None, self.update, 'application.searchblock.result',
-                self.searchTable)
+        # Notify each result to the UI layer as soon as it is received
+        nbresult = 0
+        while self.taskInProgress or nbresult < len(self.searchTable):
+            for idblock in self.searchTable[nbresult:]:
+                nbresult += 1
+                yield from self.loop.run_in_executor(
+                    None, self.update, 'application.searchblock.oneresult',
+                    (idblock, self.table[idblock]))
+            if self.taskInProgress:
+                yield from asyncio.sleep(0.01, loop=self.loop)
+        # Notify the end of the search to the UI layer
+        yield from self.loop.run_in_executor(
+            None, self.update, 'application.searchblock.endresult', nbresult)
 
     @asyncio.coroutine
     def _task_export_data(self):
@@ -306,6 +314,20 @@ class ClientCore(Subject):
                 None, self.update, 'application.searchblock.result',
                 self.searchTable)
 
+    @asyncio.coroutine
+    def _task_get_statistics(self):
+        """Get the statistics of the database (no block is transferred)"""
+        self.protocol.state = self.protocol.states['38R']  # Statistics
+        # Execute protocol state
+        self.taskInProgress = True
+        yield from self.loop.run_in_executor(
+            None, self.protocol.data_received, None)
+        while self.taskInProgress:
+            yield from asyncio.sleep(0.01, loop=self.loop)
+        # Notify the result to UI layer
+        yield from self.loop.run_in_executor(
+            None, self.update, 'application.statistics.result', self.stats)
+
     @asyncio.coroutine
     def _task_get_block_values(self, idblock):
         """Return values of a block"""
@@ -386,6 +408,8 @@ class ClientCore(Subject):
             coro = self._task_export_data()
         if key == "application.searchblock.blockvalues":
             coro = self._task_get_block_values(value)
+        if key == "application.statistics":
+            coro = self._task_get_statistics()
 
         if coro is not None:
             asyncio.run_coroutine_threadsafe(self.queue.put(coro), self.loop)
@@ -82,7 +82,8 @@ class ProtocolHandler(asyncio.Protocol):
                        '34R': StateS34R(), '34A': StateS34A(),
                        '35R': StateS35R(), '35A': StateS35A(),
                        '36R': StateS36R(), '36A': StateS36A(),
-                       '37R': StateS37R(), '37A': StateS37A()}
+                       '37R': StateS37R(), '37A': StateS37A(),
+                       '38R': StateS38R(), '38A': StateS38A()}
         # The client configuration
         self.config = is_none(Configuration.curve1) + ";" + \
             is_none(Configuration.cipher1) + ";" + \
@@ -29,8 +29,8 @@
 State S32 : Exportation
 """
 
-import pickle
-
+from ....common.InfoBlock import InfoBlock
+from ....common.SecretInfoBlock import SecretInfoBlock
 from ...util.funcutils import singleton
 from .StateSCC import StateSCC
 
@@ -108,7 +108,9 @@ class StateS32A(StateSCC):
 
                         # Treat one sib
                         if len_sib == len(psib):
-                            sib = pickle.loads(psib)
+                            sib = InfoBlock.decode(psib)
+                            if not isinstance(sib, SecretInfoBlock):
+                                raise ValueError('not a secret information block')
                             sib.control_integrity(handler.keyH)
                             handler.core.assign_result_search_block(index_sib, sib)
                             handler.nbSIBDone += 1
@@ -27,10 +27,14 @@
 
 """
 State S34 : SearchData
-"""
 
-import pickle
+Results of a search are received as a stream: 'OK' then each matching block
+(';SIB;index;length;block') as soon as the server finds it, then the end of
+results with the number of blocks sent (';END;number;').
+"""
 
+from ....common.InfoBlock import InfoBlock
+from ....common.SecretInfoBlock import SecretInfoBlock
 from ...util.funcutils import singleton
 from .StateSCC import StateSCC
 
@@ -41,102 +45,105 @@ class StateS34A(StateSCC):
 
     def __init__(self):
         """Object initialization"""
-        self.buffer = None  # Intern buffer
+        self.buffer = b''  # Intern buffer (data not yet treated)
+        self.started = False  # Request accepted, results are being received
+
+    def reset(self):
+        """Ready for a new request"""
+        self.buffer = b''
+        self.started = False
+
+    def _treat_sib_(self, handler, data):
+        """Treat a block at the beginning of data. Return the data following
+        the block or None if the block is not complete."""
+        tab_data = data[5:].split(b';', maxsplit=2)
+        if len(tab_data) < 3:
+            return None  # Header not complete
+        index_sib = int(tab_data[0].decode())
+        len_sib = int(tab_data[1].decode())
+        if len(tab_data[2]) < len_sib:
+            return None  # Block not complete
+        sib = InfoBlock.decode(tab_data[2][:len_sib])
+        if not isinstance(sib, SecretInfoBlock):
+            raise ValueError('not a secret information block')
+        sib.control_integrity(handler.keyH)
+        handler.core.assign_result_search_block(index_sib, sib)
+        handler.nbSIBDone += 1
+        return tab_data[2][len_sib:]
+
+    def _treat_end_(self, handler, data):
+        """Treat the end of results at the beginning of data. Return the
+        data following it or None if it is not complete."""
+        tab_data = data[5:].split(b';', maxsplit=1)
+        if len(tab_data) < 2:
+            return None  # Not complete
+        if int(tab_data[0].decode()) != handler.nbSIBDone:
+            raise ValueError('number of blocks')
+        if handler.nbSIBDone == 0:
+            handler.loop.run_in_executor(
+                None, handler.notify, "application.state",
+                "No information found")
+        # Indicate the task is done
+        handler.core.taskInProgress = False
+        self.reset()
+        return tab_data[1]
 
     def do(self, handler, data):
         """Action of the state S34A: treat response of SearchData request"""
         with handler.lock:
             try:
-
-                # Test if request is rejected
-                is_KO = data[:5] == b"ERROR"
-                if is_KO:
-                    message = (data[6:]).decode()
-                    raise Exception(message)
-
-                # Test if request is accepted
-                is_OK = data[:2] == b"OK"
-                if is_OK:
-                    try:
-                        tab_data = data[3:].split(b';', maxsplit=1)
-                        nbblock = int(tab_data[0].decode())
-
-                        # Are there SIB to treat ?
-                        if nbblock > 0:
-                            handler.nbSIB = nbblock  # Number of SIB to treat
-                            handler.nbSIBDone = 0  # Number of SIB treated
-
-                            # Check if the first SIB is already received
-                            try:
-                                if len(tab_data[1]) > 0:
-                                    data = b';' + tab_data[1]
-                            except IndexError:
-                                pass
-
-                        else:
+                data = self.buffer + data
+                self.buffer = b''
+
+                if not self.started:
+                    # Test if request is rejected
+                    is_KO = data[:5] == b"ERROR"
+                    if is_KO:
+                        message = (data[6:]).decode()
+                        if message == "invalid search pattern":
+                            # Not a fatal error: the session goes on
                             handler.core.taskInProgress = False
                             handler.loop.run_in_executor(
                                 None, handler.notify, "application.state",
-                                "No information found")
-
-                    except:
-                        raise Exception("S34A protocol error")
+                                "Invalid search pattern")
+                            return
+                        raise Exception(message)
 
-                # Test if a sib has been truncated
-                if self.buffer is not None:
-                    if self.buffer[5:] == b";SIB;":
-                        data = self.buffer + data
+                    # Test if request is accepted
+                    is_OK = data[:2] == b"OK"
+                    if is_OK:
+                        handler.nbSIBDone = 0  # Number of SIB treated
+                        self.started = True
+                        data = data[2:]
+                    elif b"OK".startswith(data):
+                        self.buffer = data  # Wait for new data
+                        return
                     else:
-                        data = data + self.buffer
-                    self.buffer = None
-
-                # Test if a sib has been received
-                is_aSIB = data[:5] == b";SIB;"
-                if is_aSIB:
-                    try:
-                        tab_data = data[5:].split(b';', maxsplit=2)
-                        index_sib = int(tab_data[0].decode())
-                        len_sib = int(tab_data[1].decode())
-                        psib = tab_data[2]
-
-                        # Check if two SIB are received in the same packet
-                        if len_sib < len(psib):
-                            psib = tab_data[2][:len_sib]
-                            handler.loop.run_in_executor(
-                                None, handler.data_received,
-                                tab_data[2][len_sib:])
-
-                        # Treat one sib
-                        if len_sib == len(psib):
-                            sib = pickle.loads(psib)
-                            sib.control_integrity(handler.keyH)
-                            handler.core.assign_result_search_block(index_sib, sib)
-                            handler.nbSIBDone += 1
-
-                            # Notify the UI layer
-                            handler.loop.run_in_executor(
-                                None, handler.notify, "application.state.loadbar",
-                                (handler.nbSIBDone, handler.nbSIB))
-
-                            # Indicate the task is done
-                            if handler.nbSIBDone == handler.nbSIB:
-                                handler.core.taskInProgress = False
-                                self.buffer = None
+                        raise Exception("S34A protocol error")
 
-                        # Not enough data received, wait for new data
+                # Treat all blocks received
+                try:
+                    while len(data) > 0:
+                        if data[:5] == b";SIB;":
+                            rest = self._treat_sib_(handler, data)
+                        elif data[:5] == b";END;":
+                            rest = self._treat_end_(handler, data)
+                            if rest is not None:
+                                return  # End of results
+                        elif b";SIB;".startswith(data) or \
+                                b";END;".startswith(data):
+                            rest = None  # Header not complete
                         else:
-                            self.buffer = data  # Push data for a next treatment
-
-                    except:
-                        message = "S34A protocol error " + \
-                                  str(handler.nbSIBDone) + \
-                                  "/" + str(handler.nbSIB) + " blocks"
-                        raise Exception(message)
-
-                # Save data not treated
-                if is_OK is False and is_aSIB is False:
-                    self.buffer = data
+                            raise ValueError('unknown message')
+                        if rest is None:
+                            break  # Wait for new data
+                        data = rest
+                except Exception:
+                    raise Exception("S34A protocol error " +
+                                    str(handler.nbSIBDone) + " blocks")
+                self.buffer = data  # Data not treated
 
             except Exception as exc:
+                self.reset()
                 # Schedule a call to the exception handler
                 handler.loop.call_soon_threadsafe(handler.exception_handler, exc)
@@ -64,3 +64,4 @@ class StateS34R(StateSCC):
 
             else:
                 handler.state = handler.states['34A']  # Next state
+                handler.state.reset()  # Forget a previous response
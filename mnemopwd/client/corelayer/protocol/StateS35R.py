@@ -29,8 +29,6 @@
 State S35 : AddData
 """
 
-import pickle
-
 from ...util.funcutils import singleton
 from .StateSCC import StateSCC
 
@@ -48,7 +46,7 @@ class StateS35R(StateSCC):
                 if echallenge:
 
                     # Send AddData request
-                    msg = echallenge + b';ADDDATA;' + pickle.dumps(data)
+                    msg = echallenge + b';ADDDATA;' + data.encode()
                     handler.loop.call_soon_threadsafe(handler.transport.write, msg)
 
                     # Notify the handler a property has changed
@@ -29,8 +29,6 @@
 State S37 : UpdateData
 """
 
-import pickle
-
 from ...util.funcutils import singleton
 from .StateSCC import StateSCC
 
@@ -49,7 +47,7 @@ class StateS37R(StateSCC):
                     # Send UpdateData request
                     idx, sib = data
                     msg = echallenge + b';UPDATEDATA;' + (str(idx)).encode() + \
-                        b';' + pickle.dumps(sib)
+                        b';' + sib.encode()
                     handler.loop.call_soon_threadsafe(handler.transport.write, msg)
 
                     # Notify the handler a property has changed
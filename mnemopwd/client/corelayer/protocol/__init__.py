@@ -47,6 +47,8 @@ from .StateS36R import StateS36R
 from .StateS36A import StateS36A
 from .StateS37R import StateS37R
 from .StateS37A import StateS37A
+from .StateS38R import StateS38R
+from .StateS38A import StateS38A
 
 __author__ = "Thierry Lemeunier <thierry at lemeunier dot net>"
 __date__ = "$6 février 2016 10:35:44$"
@@ -55,4 +57,4 @@ __all__ = ['StateS0', 'StateS1S', 'StateS1CR', 'StateS1CA', 'StateS21R',
            'StateS21A', 'StateS22R', 'StateS22A', 'StateS31R', 'StateS31A',
            'StateS32R', 'StateS32A', 'StateS33R', 'StateS33A', 'StateS34R',
            'StateS34A', 'StateS35R', 'StateS35A', 'StateS36R', 'StateS36A',
-           'StateS37R', 'StateS37A']
+           'StateS37R', 'StateS37A', 'StateS38R', 'StateS38A']
@@ -132,6 +132,9 @@ class ClientUI(Thread, Observer):
         if key == "application.searchblock.oneresult":
             # Add one result
             self.wmain.update_window(key, value)
+        if key == "application.searchblock.endresult":
+            # Signal the end of a research
+            self.wmain.update_window(key, value)
         if key == "application.searchblock.tryoneresult":
             # Try to add one result to a previous research
             self.wmain.update_window(key, value)
@@ -141,6 +144,9 @@ class ClientUI(Thread, Observer):
         if key == "application.searchblock.removeresult":
             # Remove one previous result
             self.wmain.update_window(key, value)
+        if key == "application.statistics.result":
+            # Show the statistics of the database
+            self.wmain.update_window(key, value)
 
     def inform(self, key, value):
         """Indicate to core layer a user demand"""
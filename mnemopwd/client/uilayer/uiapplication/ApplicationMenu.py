@@ -32,19 +32,20 @@ from ...util.funcutils import sfill
 
 class ApplicationMenu(BaseWindow):
     """
-    The menu for login/logout, user account, quit application
+    The menu for login/logout, user account, statistics, quit application
     """
 
     ITEM1 = 'LOGINOUT'
     ITEM2 = 'CUACCOUNT'
     ITEM3 = 'DUACCOUNT'
     ITEM4 = 'LOCK'
-    ITEM5 = 'QUIT'
+    ITEM5 = 'STATISTICS'
+    ITEM6 = 'QUIT'
 
     def __init__(self, parent, y, x, connected):
         """Create the menu"""
         # Create the window
-        BaseWindow.__init__(self, parent, 7, 19 + 5, y, x, menu=True, modal=True)
+        BaseWindow.__init__(self, parent, 8, 19 + 5, y, x, menu=True, modal=True)
         self.window.border()
         self.window.refresh()
 
@@ -69,13 +70,18 @@ class ApplicationMenu(BaseWindow):
         self.items.append(MetaButtonBox(
             self, 4, 1, name, shortcut='k', data=self.ITEM4))
 
+        # Database statistics
+        name = 'Statistics' + sfill(19 - 10, ' ')
+        self.items.append(MetaButtonBox(
+            self, 5, 1, name, shortcut='S', data=self.ITEM5))
+
         # Quit button
         name = 'Quit' + sfill(19 - 4, ' ')
         self.items.append(MetaButtonBox(
-            self, 5, 1, name, shortcut='u', data=self.ITEM5))
+            self, 6, 1, name, shortcut='u', data=self.ITEM6))
 
         # Ordered list of shortcut keys
-        self.shortcuts = ['L', 'n', 'e', 'k', 'u']
+        self.shortcuts = ['L', 'n', 'e', 'k', 'S', 'u']
 
     def start(self, timeout=-1):
         """See mother class"""
@@ -226,7 +226,12 @@ class MainWindow(BaseWindow):
                 if result == ApplicationMenu.ITEM4:  # Lock screen
                     if self.connected:
                         self.lock_screen()
-                if result == ApplicationMenu.ITEM5:  # Quit application
+                if result == ApplicationMenu.ITEM5:  # Statistics
+                    if self.connected:
+                        self.uifacade.inform("application.statistics", None)
+                    else:
+                        self.update_status('Please start a connection')
+                if result == ApplicationMenu.ITEM6:  # Quit application
                     if self.connected:
                         # Disconnection
                         self.uifacade.inform("connection.close", None)
@@ -283,6 +288,9 @@ class MainWindow(BaseWindow):
         if key == "application.searchblock.oneresult":
             # Add one result
             self.searchscr.add_a_result(*value)
+        if key == "application.searchblock.endresult":
+            # End of a research
+            self.searchscr.end_search(value)
         if key == "application.searchblock.tryoneresult":
             # Try to add a new block to panel result
             self.searchscr.try_add_a_result(*value)
@@ -300,6 +308,11 @@ class MainWindow(BaseWindow):
         if key == "application.editionblock.cleareditors":
             # Clear edition window
             self.editscr.clear_content()
+        if key == "application.statistics.result":
+            # Statistics of the database
+            self.update_status(
+                "{} blocks, {} bytes (largest block: {} bytes)".format(
+                    value['count'], value['bytes'], value['largest']))
 
     def update_load_bar(self, actual, maxi):
         max_len = curses.COLS - 20
@@ -29,6 +29,7 @@ import re
 import curses
 import curses.ascii
 
+from ....common.SearchPlan import SearchPlan
 from ...util.Configuration import Configuration
 from ..uicomponents.TitledOnBorderWindow import TitledOnBorderWindow
 from ..uicomponents.Component import Component
@@ -102,6 +103,13 @@ class SearchWindow(TitledOnBorderWindow):
             self.parent.uifacade.inform(
                 "application.searchblock.blockvalues", index)
 
+    def end_search(self, nbresult):
+        """Prepare window after a research (results are already added)"""
+        self.nbMaxResult = nbresult
+        # Change focus on result panel if there is some results
+        if nbresult > 0 and self.nbResult == nbresult and self.index == 0:
+            self.focus_off_force(1)
+
     def add_a_result(self, idblock, sib):
         """Add a search result in the panel"""
         # Create and add a button to the result panel
@@ -119,13 +127,13 @@ class SearchWindow(TitledOnBorderWindow):
                 self.patternEditor.show()
                 self.add_a_result(idblock, sib)
             else:
-                for j in range(1, sib.nbInfo + 1):  # For all info in sib
-                    if re.search(pattern.upper(),
-                                 sib['info' + str(j)].decode().upper())\
-                            is not None:
-                        self.patternEditor.show()
-                        self.add_a_result(idblock, sib)
-                        break  # One info match so stop loop now
+                try:
+                    plan = SearchPlan(pattern)  # Same matching as the server
+                except re.error:
+                    return  # Invalid pattern (rejected by the server)
+                if plan.match(sib):
+                    self.patternEditor.show()
+                    self.add_a_result(idblock, sib)
 
     def update_a_result(self, idblock, sib):
         """Update a previous search result"""
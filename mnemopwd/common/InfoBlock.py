@@ -27,10 +27,23 @@
 
 """
 The class InfoBlock stores information.
+
+A block is serialized in a compact binary format (all integers are
+unsigned and big-endian):
+
+    magic 'IB' (2 bytes), format version (1 byte), kind (1 byte),
+    nbInfo (1 byte), number of entries (1 byte)
+    then for each entry in the order of information numbers:
+    information number (1 byte), length (4 bytes), value (bytes)
+    then a trailer depending on the kind of block (see SecretInfoBlock)
+
+The same block always gives the same bytes so the encoded form can be used
+as the message of an integrity control.
 """
 
 import logging
 import re
+import struct
 
 
 class InfoBlock:
@@ -46,10 +59,18 @@ class InfoBlock:
     - _infos : do not directly access to this attribute but use infos property
     - _nbInfo : do not directly access to this attribute but use nbInfo property
     
-    Method(s): none
+    Method(s):
+    - encode: a method returning the block in binary format
+    - decode: a static method returning a block from its binary format
     
     """
 
+    magic = b'IB'  # Binary format magic number
+    version = 1  # Binary format version
+    kind = 0  # Kind of block in binary format
+    header = struct.Struct('>2sBBBB')  # Magic, version, kind, nbInfo, count
+    entry = struct.Struct('>BI')  # Information number, length
+
     def __init__(self, nbInfo=1):
         """Object initialization.
         By default, the number of secret information is set to one."""
@@ -119,6 +140,22 @@ class InfoBlock:
         """Restores the object's state"""
         self.__dict__.update(state)
 
+    def _encode_infos_(self):
+        """Returns the header and the entries in binary format"""
+        infos = sorted((int(key[4:]), value)
+                       for key, value in self._infos.items())
+        parts = [InfoBlock.header.pack(InfoBlock.magic, InfoBlock.version,
+                                       self.kind, self._nbInfo, len(infos))]
+        for number, value in infos:
+            parts.append(InfoBlock.entry.pack(number, len(value)))
+            parts.append(value)
+        return b''.join(parts)
+
+    def _decode_trailer_(self, trailer):
+        """Restores the data following the entries in binary format"""
+        if len(trailer) != 0:
+            raise ValueError("unexpected data after the block")
+
     def _verify_index_(self, index):
         """Verifies if the index parameter is a valid index format"""
         if not isinstance(index, str):
@@ -165,3 +202,43 @@ class InfoBlock:
             logging.critical("The size of an InfoBlock object is not correct : %s / %s", str(size), self.nbInfo)
         assert condition 
         return size
+
+    # Extern methods
+    # --------------
+
+    def encode(self):
+        """Returns the block in binary format"""
+        return self._encode_infos_()
+
+    @staticmethod
+    def decode(data):
+        """Returns a block (an InfoBlock or a SecretInfoBlock object) from
+        its binary format. Raises a ValueError exception if data are not
+        a valid block"""
+        try:
+            magic, version, kind, nbInfo, count = \
+                InfoBlock.header.unpack_from(data)
+            if magic != InfoBlock.magic or version != InfoBlock.version:
+                raise ValueError("unknown block format")
+            if kind == InfoBlock.kind:
+                block = InfoBlock(nbInfo)
+            else:
+                from .SecretInfoBlock import SecretInfoBlock
+                if kind != SecretInfoBlock.kind:
+                    raise ValueError("unknown kind of block")
+                block = SecretInfoBlock(None, nbInfo)
+            offset = InfoBlock.header.size
+            for i in range(count):
+                number, length = InfoBlock.entry.unpack_from(data, offset)
+                offset += InfoBlock.entry.size
+                value = bytes(data[offset:offset + length])
+                offset += length
+                key = 'info' + str(number)
+                if not 0 < number <= nbInfo or len(value) != length or \
+                        key in block._infos:
+                    raise ValueError("invalid block entry")
+                block._infos[key] = value
+        except struct.error:
+            raise ValueError("truncated block")
+        block._decode_trailer_(data[offset:])
+        return block
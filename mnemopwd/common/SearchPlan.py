@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2015-2017, Thierry Lemeunier <thierry at lemeunier dot net>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR
+# OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Compiled search pattern
+
+A search pattern is compiled once per search then applied to every block:
+- a literal pattern (without any regular expression special character) is
+  a case insensitive substring test (casefolded strings);
+- other patterns are regular expressions compiled with the IGNORECASE flag.
+
+An invalid regular expression raises a re.error exception when the pattern
+is compiled, so it is rejected before any block is loaded or decrypted.
+
+The server searches blocks with a search plan and the client uses the same
+plan to filter the blocks added or updated while search results are shown,
+so both always agree on matching blocks.
+"""
+
+import re
+
+
+class SearchPlan:
+    """
+    Compiled search pattern
+
+    Attribute(s):
+    - pattern: the search pattern
+    - first: if True only the first information of a block is tested
+    - literal: the casefolded pattern or None if it is a regular expression
+    - regex: the compiled regular expression or None if it is a literal
+
+    Method(s):
+    - match: test if a block matches the pattern
+    """
+
+    special = frozenset('.^$*+?{}[]\\|()')  # Regular expression characters
+
+    # Intern methods
+
+    def __init__(self, pattern, mode='all'):
+        """Compile the pattern for the search mode ('all' or 'first').
+        Raise re.error if the pattern is not a valid regular expression."""
+        self.pattern = pattern
+        self.first = mode == 'first'
+        if SearchPlan.special.isdisjoint(pattern):
+            self.literal, self.regex = pattern.casefold(), None
+        else:
+            self.literal, self.regex = None, re.compile(pattern, re.IGNORECASE)
+
+    def _test_(self, info):
+        """Test if a decrypted information matches"""
+        if self.regex is None:
+            return self.literal in info.casefold()
+        return self.regex.search(info) is not None
+
+    # Extern methods
+
+    def match(self, sib, index=None, cache=None):
+        """Test if the block matches: its first information or one of its
+        information according to the search mode. Decrypted information are
+        taken from the cache of the session (see FieldCache) if it is given
+        with the index of the block."""
+        nbInfo = 1 if self.first else sib.nbInfo
+        for j in range(1, nbInfo + 1):  # Stop at the first matching info
+            if cache is None:
+                info = sib['info' + str(j)]
+            else:
+                info = cache.get(index, sib, j)
+            if self._test_(info.decode()):
+                return True
+        return False
@@ -37,6 +37,12 @@ depends on the maximum number of secret information stored by the object.
 Global integrity is controlled by a hmac (512 bits) performed before storing and
 controlled after loading. This treatment is done by server part of
 the application.
+
+In binary format (see InfoBlock), the entries are followed by the integrity
+scheme (1 byte) and the hmac (64 bytes). The hmac message is the block in
+binary format without this trailer followed by the cryptographic
+configuration. Blocks serialized by pickle by an older version have a hmac
+computed on the representation of their state (the legacy scheme).
 """
 
 import logging
@@ -53,11 +59,19 @@ class SecretInfoBlock(InfoBlock):
     
     Attribute(s):
     - keyH: a KeyHandler object (never saved)
+    - fingerprint: the hmac of a restored block
+    - scheme: the integrity scheme of the fingerprint (CANONICAL or LEGACY)
     
     Method(s):
     - control_integrity: a method used to control fingerprint value
+    - encode: a method returning the block in binary format
     
     """
+
+    kind = 1  # Kind of block in binary format
+    CANONICAL, LEGACY = 0, 1  # Integrity schemes
+    scheme = LEGACY  # Blocks restored by pickle
+    fingerprint_size = 64  # hmac_sha512 size
     
     # Intern methods
     # --------------
@@ -92,7 +106,23 @@ class SecretInfoBlock(InfoBlock):
     
     def __setstate__(self, state):
         """Restores the objet's state"""
+        self.keyH = None
         self.__dict__.update(state)
+
+    def _decode_trailer_(self, trailer):
+        """Restores the integrity scheme and the fingerprint"""
+        if len(trailer) != 1 + self.fingerprint_size or \
+                trailer[0] not in (self.CANONICAL, self.LEGACY):
+            raise ValueError("invalid block fingerprint")
+        self.scheme = trailer[0]
+        self.fingerprint = bytes(trailer[1:])
+
+    def _message_(self, scheme, config):
+        """Returns the message of the hmac"""
+        if scheme == self.CANONICAL:
+            return self._encode_infos_() + config.encode()
+        else:
+            return self.__sorted_state__(self.__dict__) + config.encode()
         
     def __getitem__(self, index):
         """Decrypt value after being restored from a block"""
@@ -125,7 +155,7 @@ class SecretInfoBlock(InfoBlock):
         del state["fingerprint"]
         
         # Compute the hmac
-        message = self.__sorted_state__(state) + keyH.config.encode()
+        message = self._message_(self.scheme, keyH.config)
         hmac = hash.hmac_sha512(keyH.ikey, message)
         
         # The hmac must be equal to the fingerprint 
@@ -135,3 +165,16 @@ class SecretInfoBlock(InfoBlock):
         assert condition
         
         self.keyH = keyH  # Store the key handler
+
+    def encode(self):
+        """Returns the block in binary format. The hmac is computed with
+        the key handler if it is set else the fingerprint of the restored
+        block is kept"""
+        infos = self._encode_infos_()
+        if self.keyH is not None:
+            scheme = self.CANONICAL
+            message = infos + self.keyH.config.encode()
+            fingerprint = hash.hmac_sha512(self.keyH.ikey, message)
+        else:
+            scheme, fingerprint = self.scheme, self.fingerprint
+        return infos + bytes([scheme]) + fingerprint
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2015-2017, Thierry Lemeunier <thierry at lemeunier dot net>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR
+# OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+Blind index of secret information blocks
+
+A search decrypts the information of every block. The blind index lets a
+search skip the blocks that cannot match without decrypting them. It is
+optional (see the configuration option 'blind_index').
+
+For each information of a block, the index stores the tokens of the
+trigrams (three consecutive characters) of the casefolded information. A
+token is a truncated hmac of a trigram keyed by a key derived from the
+integrity key of the client (see KeyHandler), so the server does not store
+clear trigrams. A literal pattern of at least three characters can only be
+found in an information containing all the trigrams of the pattern: other
+blocks are skipped. Regular expressions and shorter patterns do not use the
+index.
+
+The entry of a block is a named entry of the database (see DBHandler)
+storing the digest of the encrypted information of the block and the tokens
+of each information. An entry is only used if the digest matches the block:
+a block without an entry or with an outdated entry is always decrypted.
+
+The entries of a database are loaded at its first indexed search then kept
+in memory for the next searches (the most recently searched databases, as
+many as the opened database files, see the configuration option
+'dbpoolsize'). They are updated by the writers of the database.
+"""
+
+import collections
+import hashlib
+import hmac
+import threading
+
+from ..util.Configuration import Configuration
+
+
+class BlindIndex:
+    """
+    Blind index of secret information blocks
+
+    Attribute(s):
+    - prefix: the prefix of the named entries of the index
+    - size: the size in bytes of a token and of a digest
+    - vaults: an ordered dictionary of the entries of each database (a
+              dictionary by block index, the most recently used is the last)
+    - lock: a lock to serialize accesses to the loaded entries
+
+    Method(s):
+    - name: return the name of the named entry of a block
+    - entry: return the entry of a block
+    - query: return the tokens of a search pattern
+    - candidate: test if a block may match a search pattern
+    - get: return the loaded entries of a database or None
+    - load: keep the entries of a database in memory
+    - put: update the entry of a block of a loaded database
+    - invalidate: drop the entry of a block of a loaded database
+    - invalidate_vault: drop the entries of a database
+    """
+
+    prefix = 'blind.'  # Named entries 'blind.<index>'
+    size = 16  # Truncated hmac and digest
+    vaults = collections.OrderedDict()  # Loaded entries by database
+    lock = threading.Lock()  # Lock on the loaded entries
+
+    # Intern methods
+
+    @staticmethod
+    def _key_(keyH):
+        """Return the key of the tokens derived from the integrity key"""
+        return hmac.new(keyH.ikey, b'blind index', hashlib.sha256).digest()
+
+    @staticmethod
+    def _tokens_(key, text):
+        """Return the set of tokens of the trigrams of a casefolded text"""
+        return frozenset(
+            hmac.new(key, text[i:i + 3].encode(),
+                     hashlib.sha256).digest()[:BlindIndex.size]
+            for i in range(len(text) - 2))
+
+    @staticmethod
+    def _digest_(sib):
+        """Return the digest of the encrypted information of a block"""
+        return hashlib.sha256(sib._encode_infos_()).digest()[:BlindIndex.size]
+
+    # Extern methods
+
+    @staticmethod
+    def name(index):
+        """Return the name of the named entry of the block at index"""
+        return BlindIndex.prefix + str(index)
+
+    @staticmethod
+    def entry(keyH, sib):
+        """Return the entry of a block: the digest of its encrypted
+        information and a tuple of sets of tokens (one per information).
+        All information of the block are decrypted."""
+        key = BlindIndex._key_(keyH)
+        tokens = tuple(
+            BlindIndex._tokens_(key, sib['info' + str(j)].decode().casefold())
+            for j in range(1, sib.nbInfo + 1))
+        return BlindIndex._digest_(sib), tokens
+
+    @staticmethod
+    def query(keyH, plan):
+        """Return the set of tokens of a search plan (see SearchPlan) or None
+        if the index can not be used for the pattern"""
+        if plan.literal is None or len(plan.literal) < 3:
+            return None
+        return BlindIndex._tokens_(BlindIndex._key_(keyH), plan.literal)
+
+    @staticmethod
+    def candidate(plan, tokens, entry, sib):
+        """Test if a block may match the search plan: False if the tokens of
+        the pattern are missing in the entry of the block"""
+        if entry is None or entry[0] != BlindIndex._digest_(sib):
+            return True  # No entry or outdated entry
+        infos = entry[1][:1] if plan.first else entry[1]
+        return any(tokens <= info for info in infos)
+
+    @staticmethod
+    def get(database):
+        """Return the loaded entries of a database (a dictionary by block
+        index) or None if they are not loaded"""
+        with BlindIndex.lock:
+            entries = BlindIndex.vaults.get(database)
+            if entries is not None:
+                BlindIndex.vaults.move_to_end(database)  # The most recently used
+            return entries
+
+    @staticmethod
+    def load(database, entries):
+        """Keep the entries of a database in memory"""
+        with BlindIndex.lock:
+            BlindIndex.vaults[database] = entries
+            BlindIndex.vaults.move_to_end(database)
+            while len(BlindIndex.vaults) > max(Configuration.dbpoolsize, 1):
+                BlindIndex.vaults.popitem(last=False)  # LRU
+
+    @staticmethod
+    def put(database, index, entry):
+        """Update the entry of a block if the entries are loaded"""
+        with BlindIndex.lock:
+            if database in BlindIndex.vaults:
+                BlindIndex.vaults[database][index] = entry
+
+    @staticmethod
+    def invalidate(database, index):
+        """Drop the entry of a block if the entries are loaded"""
+        with BlindIndex.lock:
+            if database in BlindIndex.vaults:
+                BlindIndex.vaults[database].pop(index, None)
+
+    @staticmethod
+    def invalidate_vault(database):
+        """Drop the entries of a database"""
+        with BlindIndex.lock:
+            BlindIndex.vaults.pop(database, None)
@@ -28,7 +28,6 @@
 
 import asyncio
 import logging
-import os
 
 from ...pyelliptic import OpenSSL
 from .protocol import *
@@ -36,6 +35,11 @@ from ...common.KeyHandler import KeyHandler
 from ...common.SecretInfoBlock import SecretInfoBlock
 from .DBHandler import DBHandler
 from .DBAccess import DBAccess
+from .DBExecutor import DBExecutor
+from .DBPool import DBPool
+from .FieldCache import FieldCache
+from .VaultTier import VaultTier
+from ..util.Configuration import Configuration
 
 """
 The client connection handler
@@ -50,13 +54,17 @@ class ClientHandler(asyncio.Protocol):
         self.dbpath = path  # The path to the database
         self.loop = loop  # The i/o asynchronous loop
         self.shield = shield  # The brute-force shield
+        self.dbH = None  # The database handler (set after login)
+        self.fieldcache = None  # The decrypted information cache
+        if Configuration.sessioncachekb > 0:
+            self.fieldcache = FieldCache(Configuration.sessioncachekb * 1024)
         # The protocol states
         self.states = {
             '0': StateS0(), '1S': StateS1S(), '1C': StateS1C(),
             '2': StateS2(), '21': StateS21(), '22': StateS22(),
             '3': StateS3(), '31': StateS31(), '32': StateS32(),
             '33': StateS33(), '34': StateS34(), '35': StateS35(),
-            '36': StateS36(), '37': StateS37()
+            '36': StateS36(), '37': StateS37(), '38': StateS38()
         }
 
     def connection_made(self, transport):
@@ -76,12 +84,24 @@ class ClientHandler(asyncio.Protocol):
             self.state = self.states['0']  # State 0 at the beginning
             self.loop.run_in_executor(None, self.state.do, self, None)
 
+            # Schedule closing of idle database files and eviction of idle
+            # resident databases
+            self.loop.run_in_executor(DBExecutor.get(), DBPool.evict_idle)
+            self.loop.run_in_executor(DBExecutor.get(), VaultTier.evict_idle)
+
     def connection_lost(self, exc):
         """Connection finishing"""
         if exc is None:
             logging.info('Disconnection from {}'.format(self.peername))
         else:
             logging.warning('Lost connection from {}'.format(self.peername))
+        if self.fieldcache is not None:
+            # Zero decrypted information
+            self.fieldcache.clear()
+            self.fieldcache = None
+        if self.dbH is not None:
+            # Flush and close the database file if no more used
+            self.loop.run_in_executor(DBExecutor.get(), self.dbH.close)
         self.transport.close()
 
     def data_received(self, data):
@@ -89,6 +109,15 @@ class ClientHandler(asyncio.Protocol):
         # Future execution
         self.loop.run_in_executor(None, self.state.do, self, data)
 
+    def invalidate_fields(self, index):
+        """Forget the decrypted information of a modified block"""
+        cache = self.fieldcache
+        if cache is not None:
+            try:
+                cache.invalidate(int(index))
+            except ValueError:
+                pass  # Not a valid index: nothing cached
+
     def exception_handler(self, exc):
         """Exception handler for actions executed by the executor"""
         logging.critical('Closing connection with {} because server detects an error : {}'
@@ -159,49 +188,37 @@ class ClientHandler(asyncio.Protocol):
                     dbH_tmp = DBHandler(
                         self.dbH.path, self.dbH.filename + '_tmp')
                     config_tmp = self.dbH['config_tmp']
-                    dbH_tmp['config'] = config_tmp
                     config = config_tmp.split(';')
                     keyH_tmp = KeyHandler(
                         self.ms, cur1=config[0], cip1=config[1],
                         cur2=config[2], cip2=config[3],
                         cur3=config[4], cip3=config[5])
-                
-                    # Data exchange
-                    nbsibs = self.dbH['nbsibs']
-                    index = self.dbH['index']
-                    if nbsibs > 0:
-                    
-                        dbH_tmp['nbsibs'] = nbsibs  # Same 'nbsibs' value
-                        dbH_tmp['index'] = index    # Same 'index' value
-                        
-                        for i in range(1, index + 1):  # For all sibs
-
-                            try:
-                                # Original secret information block
-                                sib = self.dbH[str(i)]
-                            except KeyError:
-                                continue  # Continue with the next key
-
-                            sib.keyH = self.keyH  # Set actual KeyHandler
-                            if sib.nbInfo > 0:
-                                # New sib with new KeyHandler
-                                sib_tmp = SecretInfoBlock(keyH_tmp, sib.nbInfo)
-                                # For all secret information
-                                for j in range(1, sib.nbInfo + 1):
-                                    # Exchange
-                                    sib_tmp['info' + str(j)] = sib['info' + str(j)]
-                                    # Verification
-                                    assert sib_tmp['info' + str(j)] == sib['info' + str(j)]
-                                # Save sib in the new database with same index
-                                dbH_tmp[str(i)] = sib_tmp
-                                
-                    # Delete original database
-                    os.unlink(self.dbH.path + '/' + self.dbH.filename + '.db')
-                    # Rename temporary database
-                    os.rename(self.dbH.path + '/' + self.dbH.filename + '_tmp.db',
-                              self.dbH.path + '/' + self.dbH.filename + '.db')
-                    # Update handlers of the client handler
-                    self.dbH = dbH_tmp
+
+                    def exchange(sib):
+                        """Return a new sib encrypted with the new handler"""
+                        sib.keyH = self.keyH  # Set actual KeyHandler
+                        if sib.nbInfo > 0:
+                            # New sib with new KeyHandler
+                            sib_tmp = SecretInfoBlock(keyH_tmp, sib.nbInfo)
+                            # For all secret information
+                            for j in range(1, sib.nbInfo + 1):
+                                # Exchange
+                                sib_tmp['info' + str(j)] = sib['info' + str(j)]
+                                # Verification
+                                assert sib_tmp['info' + str(j)] == sib['info' + str(j)]
+                            return sib_tmp
+
+                    # Data exchange (same indexes in the new database)
+                    with dbH_tmp.batch() as vault_tmp:
+                        self.dbH.copy_to(dbH_tmp, exchange)
+                        vault_tmp.set_meta('config', config_tmp)
+                        vault_tmp.del_meta('config_tmp')
+                    dbH_tmp.index_data(keyH_tmp)  # Rebuild the blind index
+
+                    # Replace original database by temporary database
+                    DBHandler.rename(self.dbH.path, dbH_tmp.filename,
+                                     self.dbH.filename)
+                    # Update crypto handler of the client handler
                     self.keyH = keyH_tmp
                 
                 else:
@@ -210,7 +227,7 @@ class ClientHandler(asyncio.Protocol):
             
             except:
                 # Delete temporary database
-                os.unlink(self.dbH.path + '/' + self.dbH.filename + '_tmp.db')
+                DBHandler.delete(self.dbH.path, self.dbH.filename + '_tmp')
                 # Delete new configuration string
                 del self.dbH['config_tmp']
                 return False
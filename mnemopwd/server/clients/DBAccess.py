@@ -27,31 +27,157 @@
 
 """
 A class to control access to database files
+
+Each database file has a reader/writer lock: several threads can read a
+database file at the same time but a thread modifying it has an exclusive
+access. Waiting times are measured.
 """
 
+import contextlib
 import threading
+import time
+
+
+class RWLock:
+    """
+    A reader/writer lock
+
+    The exclusive (writer) lock is acquired by 'with lock:' or by the
+    acquire and release methods. It is reentrant and the owner can also
+    acquire the shared lock. The shared (reader) lock is acquired by
+    'with lock.reader():'. It is reentrant too but it can not be upgraded
+    to the exclusive lock. Waiting writers have priority over new readers.
+    """
+
+    def __init__(self):
+        """Lock initialization"""
+        self.cond = threading.Condition(threading.Lock())
+        self.readers = dict()  # Number of shared locks by thread
+        self.writer = None  # Thread owning the exclusive lock
+        self.writes = 0  # Number of exclusive locks of the owner
+        self.waiting_writers = 0  # Number of threads waiting to write
+
+    def acquire(self, blocking=True):
+        """Acquire the exclusive lock. Return a boolean."""
+        me = threading.get_ident()
+        with self.cond:
+            if self.writer == me:
+                self.writes += 1
+                return True
+            if self.writer is not None or self.readers:
+                if not blocking:
+                    return False
+                if me in self.readers:
+                    raise RuntimeError('shared lock can not be upgraded')
+                start = time.time()
+                self.waiting_writers += 1
+                try:
+                    while self.writer is not None or self.readers:
+                        self.cond.wait()
+                finally:
+                    self.waiting_writers -= 1
+                DBAccess.record_wait('write', time.time() - start)
+            self.writer = me
+            self.writes = 1
+            return True
+
+    def owned(self):
+        """Test if the current thread owns the exclusive or the shared lock"""
+        me = threading.get_ident()
+        with self.cond:
+            return self.writer == me or me in self.readers
+
+    def release(self):
+        """Release the exclusive lock"""
+        with self.cond:
+            self.writes -= 1
+            if self.writes == 0:
+                self.writer = None
+                self.cond.notify_all()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+
+    def acquire_read(self):
+        """Acquire the shared lock"""
+        me = threading.get_ident()
+        with self.cond:
+            if self.writer != me and me not in self.readers and \
+                    (self.writer is not None or self.waiting_writers):
+                start = time.time()
+                while self.writer is not None or self.waiting_writers:
+                    self.cond.wait()
+                DBAccess.record_wait('read', time.time() - start)
+            self.readers[me] = self.readers.get(me, 0) + 1
+
+    def release_read(self):
+        """Release the shared lock"""
+        me = threading.get_ident()
+        with self.cond:
+            self.readers[me] -= 1
+            if self.readers[me] == 0:
+                del self.readers[me]
+                if not self.readers:
+                    self.cond.notify_all()
+
+    @contextlib.contextmanager
+    def reader(self):
+        """Context manager for the shared lock"""
+        self.acquire_read()
+        try:
+            yield self
+        finally:
+            self.release_read()
 
 
 class DBAccess:
     """
     A class to serialize database file access
+
+    Attribute(s):
+    - locks: a dictionary of RWLock instances indexed by database file
+    - lock: a lock on the dictionary and the statistics
+    - waits: the number of waits and the total and maximum waiting times
+             for shared (read) and exclusive (write) locks
     """
     
-    locks = dict()  # A dictionary of Lock instances
+    locks = dict()  # A dictionary of RWLock instances
+    lock = threading.Lock()  # Lock on the dictionary and the statistics
+    waits = {'read': [0, 0.0, 0.0], 'write': [0, 0.0, 0.0]}
     
     @staticmethod
     def getLock(dbfile):
-        """Return  Lock object on the database file"""
-        try:
-            return DBAccess.locks[dbfile]
-        except KeyError:
-            DBAccess.locks[dbfile] = threading.RLock()
-            return DBAccess.locks[dbfile]
+        """Return the RWLock object on the database file"""
+        with DBAccess.lock:
+            try:
+                return DBAccess.locks[dbfile]
+            except KeyError:
+                DBAccess.locks[dbfile] = RWLock()
+                return DBAccess.locks[dbfile]
     
     @staticmethod
     def delLock(dbfile):
-        """Delete Lock instance on the database file"""
-        try:
-            del DBAccess.locks[dbfile]
-        except:
-            pass
+        """Delete RWLock instance on the database file"""
+        with DBAccess.lock:
+            DBAccess.locks.pop(dbfile, None)
+
+    @staticmethod
+    def record_wait(kind, duration):
+        """Record a waiting time for a 'read' or 'write' lock"""
+        with DBAccess.lock:
+            wait = DBAccess.waits[kind]
+            wait[0] += 1
+            wait[1] += duration
+            wait[2] = max(wait[2], duration)
+
+    @staticmethod
+    def stats():
+        """Return the lock waiting statistics (a dictionary)"""
+        with DBAccess.lock:
+            return {kind + '_' + name: round(value, 6)
+                    for kind, wait in DBAccess.waits.items()
+                    for name, value in zip(('waits', 'wait_total', 'wait_max'), wait)}
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2015-2017, Thierry Lemeunier <thierry at lemeunier dot net>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR
+# OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+Online backup of the database directory
+
+A backup is a new directory (named by the date) in the backup directory with
+a copy of all databases, in the same tree of subdirectories, and a manifest
+file listing the SHA-256 checksum and the size of each copied file.
+
+Each database is copied as it was at a point in time (see the snapshot
+method of storage engines): the lock of a database is owned to start its
+copy (the sqlite and log engines finish it without the lock, the shelve
+engine copies the whole file under the shared lock so only writers of this
+database wait). The backup directory has a
+'.tmp' suffix until the backup is complete: such a directory left by an
+interrupted backup is removed by the next backup.
+"""
+
+import hashlib
+import logging
+import os
+import shutil
+import threading
+import time
+
+from .DBHandler import DBHandler
+from .VaultIndex import VaultIndex
+
+
+class DBBackup:
+    """
+    Online backup of the database directory
+
+    Attribute(s):
+    - manifest: the name of the manifest file
+    - lock: a lock to run only one backup at a time
+
+    Method(s):
+    - backup: copy all databases in a new backup directory
+    """
+
+    manifest = 'MANIFEST'  # Manifest file name
+    lock = threading.Lock()  # One backup at a time
+
+    # Intern methods
+
+    @staticmethod
+    def _clean_(destination):
+        """Remove the incomplete backup directories of the destination
+        directory (only one backup runs at a time)"""
+        for entry in os.listdir(destination):
+            directory = os.path.join(destination, entry)
+            if entry.endswith('.tmp') and os.path.isdir(directory):
+                logging.warning('Incomplete backup {} removed'
+                                .format(directory))
+                shutil.rmtree(directory)
+
+    @staticmethod
+    def _checksum_(filename):
+        """Return the SHA-256 checksum and the size of a file"""
+        ho = hashlib.sha256()
+        size = 0
+        with open(filename, 'rb') as file:
+            for data in iter(lambda: file.read(1 << 20), b''):
+                ho.update(data)
+                size += len(data)
+        return ho.hexdigest(), size
+
+    @staticmethod
+    def _write_manifest_(directory, header):
+        """Write the manifest file of the backup directory.
+        Return the total size of files."""
+        lines = []
+        total = 0
+        for dirpath, dirnames, filenames in os.walk(directory):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                fullname = os.path.join(dirpath, filename)
+                checksum, size = DBBackup._checksum_(fullname)
+                lines.append('{}  {}  {}\n'.format(
+                    checksum, size, os.path.relpath(fullname, directory)))
+                total += size
+        with open(os.path.join(directory, DBBackup.manifest), 'w') as file:
+            file.write('# ' + header + '\n')
+            file.writelines(lines)
+        return total
+
+    # Extern methods
+
+    @staticmethod
+    def backup(path, destination):
+        """Copy all databases of the directory path in a new directory of
+        the destination directory. Return the new directory or None if a
+        backup is already running."""
+        if not DBBackup.lock.acquire(blocking=False):
+            logging.warning('Backup already running')
+            return None
+        try:
+            os.makedirs(destination, mode=0o700, exist_ok=True)
+            DBBackup._clean_(destination)  # Interrupted backups
+            name = date = time.strftime('%Y%m%d-%H%M%S')
+            nb = 1
+            while os.path.exists(os.path.join(destination, name)):
+                nb += 1  # Several backups in one second
+                name = '{}-{}'.format(date, nb)
+            directory = os.path.join(destination, name)
+            os.makedirs(directory + '.tmp', mode=0o700)
+            engine = DBHandler.engine_class()
+            start = time.time()
+            nbcopied = 0
+            for filename in VaultIndex.vaults(path, engine):
+                if filename.endswith('_tmp'):
+                    continue  # Temporary database
+                dbfile = VaultIndex.location(directory + '.tmp', filename)
+                os.makedirs(os.path.dirname(dbfile), mode=0o700, exist_ok=True)
+                if DBHandler(path, filename).snapshot(dbfile):
+                    nbcopied += 1
+            size = DBBackup._write_manifest_(
+                directory + '.tmp', 'Mnemopwd backup {} of {} {} database(s)'
+                .format(name, nbcopied, engine.name))
+            os.rename(directory + '.tmp', directory)
+            logging.info('Backup of {} database(s) ({} bytes) in {} done in '
+                         '{:.1f} seconds'.format(nbcopied, size, directory,
+                                                 time.time() - start))
+            return directory
+        finally:
+            DBBackup.lock.release()
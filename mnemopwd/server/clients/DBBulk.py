@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2015-2017, Thierry Lemeunier <thierry at lemeunier dot net>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR
+# OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+Offline bulk dump and load of databases
+
+A dump file ('.sibs' suffix) contains all entries of one database as a
+stream of records so a database of any size is dumped or loaded without
+keeping it in memory:
+
+    magic  (8 bytes)
+    record (kind: 1 byte, index: 8 bytes, length: 4 bytes) + payload
+    ...
+
+A META record contains a pickled (key, value) named entry, a SIB record
+contains a serialized sib (as it is stored: never decoded nor decrypted) and the
+END record gives the last index used (index field) and the number of sibs
+(length field). A dump file without END record is a truncated one.
+
+A database is loaded in one batch: it is created with all its entries or
+not at all. Databases are dumped or loaded in parallel by a pool of worker
+processes. Workers are spawned (not forked) when it is possible: a process
+forked while other threads own a lock would wait for it forever. The
+server must be stopped.
+"""
+
+import concurrent.futures
+import logging
+import multiprocessing
+import os
+import pickle
+import struct
+
+from ...common.InfoBlock import InfoBlock
+from ..util.Configuration import Configuration
+from .DBHandler import DBHandler
+from .DBPool import DBPool
+from .VaultIndex import VaultIndex
+
+
+class DBBulk:
+    """
+    Offline bulk dump and load of databases
+
+    Attribute(s):
+    - suffix: the suffix of dump files
+    - magic: the first bytes of a dump file
+    - record: the structure of a record header
+    - META, SIB, END: the kinds of record
+    - settings: the settings applied in the current worker process
+
+    Method(s):
+    - dump: write a database in a dump file
+    - load: create a database from a dump file
+    - run: dump or load databases by a pool of worker processes
+    """
+
+    suffix = '.sibs'  # Dump file suffix
+    magic = b'MPWDBLK1'  # Dump file magic number
+    record = struct.Struct('>BQI')  # Kind, index, length
+    META, SIB, END = 1, 2, 3  # Record kinds
+    settings = None  # Settings of the worker process
+
+    # Intern methods
+
+    @staticmethod
+    def _setup_(settings):
+        """Apply the settings of the parent process in a worker process"""
+        if DBBulk.settings != settings:
+            Configuration.storage, Configuration.durability, path, \
+                datapaths = settings
+            VaultIndex.configure(path, datapaths)
+            DBBulk.settings = settings
+
+    @staticmethod
+    def _records_(file):
+        """Iterate over (kind, index, payload) of a dump file"""
+        if file.read(len(DBBulk.magic)) != DBBulk.magic:
+            raise ValueError('not a dump file')
+        size = DBBulk.record.size
+        while True:
+            header = file.read(size)
+            if len(header) < size:
+                raise ValueError('truncated dump file')
+            kind, index, length = DBBulk.record.unpack(header)
+            if kind == DBBulk.END:
+                yield kind, index, length
+                return
+            payload = file.read(length)
+            if len(payload) < length:
+                raise ValueError('truncated dump file')
+            yield kind, index, payload
+
+    @staticmethod
+    def _block_(payload):
+        """Return the serialized sib of a SIB record. Only its header is
+        controlled: the sib is stored as it is."""
+        try:
+            magic, version = InfoBlock.header.unpack_from(payload)[:2]
+        except struct.error:
+            raise ValueError('invalid block')
+        if magic != InfoBlock.magic or version != InfoBlock.version:
+            raise ValueError('invalid block')
+        return payload
+
+    @staticmethod
+    def _task_(action, settings, path, filename, bulkpath):
+        """Dump or load a database in a worker process"""
+        DBBulk._setup_(settings)
+        try:
+            if action == 'dump':
+                return DBBulk.dump(path, filename, bulkpath)
+            else:
+                return DBBulk.load(path, filename, bulkpath)
+        finally:
+            DBPool.close_all()
+
+    # Extern methods
+
+    @staticmethod
+    def dump(path, filename, bulkpath):
+        """Write the database in a dump file of the bulkpath directory.
+        Return the number of sibs dumped."""
+        dumpfile = os.path.join(bulkpath, filename + DBBulk.suffix)
+        record = DBBulk.record
+        nbsibs = 0
+        with DBHandler(path, filename).reader() as vault, \
+                open(dumpfile + '.tmp', 'wb') as file:
+            file.write(DBBulk.magic)
+            for key, value in vault.meta_items():
+                data = pickle.dumps((key, value))
+                file.write(record.pack(DBBulk.META, 0, len(data)))
+                file.write(data)
+            for index, data in vault.items_view():
+                file.write(record.pack(DBBulk.SIB, index, len(data)))
+                file.write(data)
+                nbsibs += 1
+            file.write(record.pack(DBBulk.END, vault.last_index(), nbsibs))
+        os.replace(dumpfile + '.tmp', dumpfile)  # No partial dump file
+        return nbsibs
+
+    @staticmethod
+    def load(path, filename, bulkpath):
+        """Create the database from its dump file of the bulkpath directory.
+        Return the number of sibs loaded or None if the database already
+        exists. Raise ValueError if the dump file is not valid."""
+        dumpfile = os.path.join(bulkpath, filename + DBBulk.suffix)
+        if not DBHandler.new(path, filename):
+            return None
+        nbsibs = 0
+        try:
+            with DBHandler(path, filename).batch() as vault, \
+                    open(dumpfile, 'rb') as file:
+                for kind, index, payload in DBBulk._records_(file):
+                    if kind == DBBulk.META:
+                        vault.set_meta(*pickle.loads(payload))
+                    elif kind == DBBulk.SIB:
+                        vault.put(index, DBBulk._block_(payload))
+                        nbsibs += 1
+                    elif kind == DBBulk.END:
+                        if payload != nbsibs:
+                            raise ValueError('inconsistent dump file')
+                        vault.set_last_index(index)
+                    else:
+                        raise ValueError('unknown record kind')
+        except:
+            DBHandler.delete(path, filename)  # No partial database
+            raise
+        return nbsibs
+
+    @staticmethod
+    def run(action, path, bulkpath, workers):
+        """Dump ('dump' action) all databases in the bulkpath directory or
+        load ('load' action) all dump files of the bulkpath directory.
+        Databases are handled by a pool of worker processes.
+        Return the number of databases and the number of sibs handled."""
+        engine = DBHandler.engine_class()
+        if action == 'dump':
+            filenames = [filename for filename in
+                         VaultIndex.vaults(path, engine)
+                         if not filename.endswith('_tmp')]
+        else:
+            filenames = sorted(
+                entry[:-len(DBBulk.suffix)] for entry in os.listdir(bulkpath)
+                if entry.endswith(DBBulk.suffix))
+        settings = (Configuration.storage, Configuration.durability, path,
+                    VaultIndex.roots.get(path, []))
+        nbvaults = nbsibs = 0
+        try:
+            executor = concurrent.futures.ProcessPoolExecutor(
+                workers, mp_context=multiprocessing.get_context('spawn'))
+        except TypeError:
+            executor = concurrent.futures.ProcessPoolExecutor(workers)  # < 3.7
+        with executor:
+            futures = {executor.submit(DBBulk._task_, action, settings, path,
+                                       filename, bulkpath): filename
+                       for filename in filenames}
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception as exc:
+                    logging.error('Bulk {} of database {} failed: {}'
+                                  .format(action, futures[future], exc))
+                    continue
+                if result is None:
+                    logging.warning('Database {} already exists (not loaded)'
+                                    .format(futures[future]))
+                    continue
+                if action == 'load':  # Created by another process
+                    VaultIndex.add(path, futures[future], engine)
+                nbvaults += 1
+                nbsibs += result
+        return nbvaults, nbsibs
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2015-2017, Thierry Lemeunier <thierry at lemeunier dot net>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR
+# OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Background compaction of database files
+
+When too much space of a database file is unused (see the configuration
+option 'compaction_ratio'), the database file is rewritten by a background
+thread so client sessions are not delayed. The compaction of all database
+files can also be requested by an administrator (see serverctl module).
+"""
+
+import concurrent.futures
+import logging
+import threading
+
+from ..util.Configuration import Configuration
+
+
+class DBCompactor:
+    """
+    Background compaction of database files
+
+    Attribute(s):
+    - executor: the thread executing compactions (created on demand)
+    - pending: the set of database files waiting for a compaction
+    - reclaimed: the number of bytes reclaimed since the set was empty
+    - lock: a lock on the pending set
+
+    Method(s):
+    - check: schedule a compaction if the database file is fragmented
+    - schedule: schedule a compaction of a database file
+    """
+
+    executor = None  # Background thread
+    pending = set()  # Database files to compact
+    reclaimed = 0  # Bytes reclaimed by the compactions in progress
+    lock = threading.Lock()  # Lock on the pending set
+
+    # Intern methods
+
+    @staticmethod
+    def _compact_(dbH):
+        """Compact the database file"""
+        reclaimed = 0
+        try:
+            reclaimed = dbH.compact()
+        except Exception as exc:
+            logging.error('Compaction of {} failed: {}'
+                          .format(dbH.database, exc))
+        finally:
+            with DBCompactor.lock:
+                DBCompactor.pending.discard(dbH.database)
+                DBCompactor.reclaimed += reclaimed
+                if not DBCompactor.pending:
+                    logging.info('Compaction done: {} bytes reclaimed'
+                                 .format(DBCompactor.reclaimed))
+                    DBCompactor.reclaimed = 0
+
+    # Extern methods
+
+    @staticmethod
+    def check(dbH, ratio):
+        """Schedule a compaction if the ratio of unused space of the database
+        file (measured while its lock was owned) is too high"""
+        if ratio > Configuration.compaction_ratio:
+            DBCompactor.schedule(dbH)
+
+    @staticmethod
+    def schedule(dbH):
+        """Schedule a compaction of the database file"""
+        with DBCompactor.lock:
+            if dbH.database in DBCompactor.pending:
+                return  # Already scheduled
+            DBCompactor.pending.add(dbH.database)
+            if DBCompactor.executor is None:
+                DBCompactor.executor = \
+                    concurrent.futures.ThreadPoolExecutor(1)
+        DBCompactor.executor.submit(DBCompactor._compact_, dbH)
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2015-2017, Thierry Lemeunier <thierry at lemeunier dot net>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR
+# OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+Executor of storage operations
+
+Operations on databases (storage calls of client sessions, closing and
+eviction of database files) are executed by their own pool of threads
+(see the configuration option 'iopoolsize'). So slow disk operations do not
+delay the protocol and cryptographic operations of other sessions which are
+executed by the default executor of the loop. A state of a session runs in
+the default executor and only hands its storage calls to the pool (see the
+call method): decryption and pacing delays never hold a storage thread.
+"""
+
+import logging
+import threading
+
+from ..util.Configuration import Configuration
+from ..util.MeteredExecutor import MeteredExecutor
+
+
+class DBExecutor:
+    """
+    Executor of storage operations
+
+    Attribute(s):
+    - executor: the pool of threads (created on demand)
+    - lock: a lock for creating the pool
+
+    Method(s):
+    - get: return the pool of threads
+    - call: execute a storage operation in the pool and return its result
+    - spawn: execute a storage operation in background (errors are logged)
+    - stats: return the metrics of the pool
+    - shutdown: wait for the end of operations and delete the pool
+    """
+
+    executor = None  # Pool of threads
+    lock = threading.Lock()  # Lock for creating the pool
+
+    # Intern methods
+
+    @staticmethod
+    def _done_(description, future):
+        """Log the error of a background operation"""
+        if not future.cancelled() and future.exception() is not None:
+            logging.error('{} failed: {}'.format(description, future.exception()))
+
+    # Extern methods
+
+    @staticmethod
+    def get():
+        """Return the pool of threads executing storage operations"""
+        with DBExecutor.lock:
+            if DBExecutor.executor is None:
+                DBExecutor.executor = \
+                    MeteredExecutor(Configuration.iopoolsize, 'storage')
+            return DBExecutor.executor
+
+    @staticmethod
+    def call(function, *args):
+        """Execute function(*args) in the pool and return its result (or
+        raise its exception). The calling thread waits: it must not be a
+        thread of the pool."""
+        return DBExecutor.get().submit(function, *args).result()
+
+    @staticmethod
+    def spawn(description, function, *args):
+        """Execute function(*args) in the pool without waiting for its
+        result. An error is logged with the description of the operation.
+        Return the future of the operation."""
+        future = DBExecutor.get().submit(function, *args)
+        future.add_done_callback(
+            lambda future: DBExecutor._done_(description, future))
+        return future
+
+    @staticmethod
+    def stats():
+        """Return the metrics of the pool (None if it is not created)"""
+        with DBExecutor.lock:
+            if DBExecutor.executor is None:
+                return None
+            return DBExecutor.executor.stats()
+
+    @staticmethod
+    def shutdown():
+        """Wait for the end of storage operations and delete the pool.
+        Return the last metrics of the pool (None if it was not created)."""
+        with DBExecutor.lock:
+            executor, DBExecutor.executor = DBExecutor.executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+            return executor.stats()
@@ -29,31 +29,42 @@
 """
 Database Handler
 
-A database is a shelf object: a persistent dictionary stored in a database file
-(see module shelve for more explanations).
-
-Each shelf have at least two entries : 'nbsibs' for the number of sibs stored
-(must be incremented or decremented) and 'index' for the last index used
-(must only be incremented)
-
-An example of a shelve: 
-    {
-        'nbsibs': 4 (it means that there are exactly 4 sibs in the database) 
-        'index' : 5 (it means that the next entry will have 6 for index) 
-        '1' : a sib
-        '2' : a sib
-        '4' : a sib (it means that a sib has been deleted before this entry)
-        '5' : a sib
-    }
+A database (or vault) stores the secret information blocks of a client and
+some named entries like the cryptographic configuration ('config').
+
+Data are stored by a storage engine (see storage package): a shelf object
+by default, a SQLite database or an append-only log file. The engine is
+chosen by configuration.
+
+Database files are stored in a tree of subdirectories and existing
+databases are indexed in memory (see VaultIndex).
+
+A database file stays opened while a client session uses it (see DBPool).
+Deserialized secret information blocks are cached (see SIBCache) and the
+blocks of active databases stay in memory (see VaultTier).
+Searches may skip blocks thanks to an optional blind index (see BlindIndex)
+stored in named entries.
+Modifications are made in atomic batches written on disk according to the
+durability option (see DBSyncer).
 """
 
+import contextlib
+import logging
 import os
-import os.path
-import stat
-import shelve
-import re
+from ...common.SearchPlan import SearchPlan
 from ..util.Configuration import Configuration
+from .BlindIndex import BlindIndex
 from .DBAccess import DBAccess
+from .DBPool import DBPool
+from .DBSearcher import DBSearcher
+from .DBCompactor import DBCompactor
+from .DBSyncer import DBSyncer
+from .SIBCache import SIBCache
+from .VaultFormat import VaultFormat
+from .VaultIndex import VaultIndex
+from .VaultStats import VaultStats
+from .VaultTier import VaultTier
+from .storage import engines
 
 
 class DBHandler:
@@ -64,134 +75,404 @@ class DBHandler:
     - path: a string for the database directory (instance attribute)
     - filename: a string for the database file name (instance attribute)
     - database: a string for the path + database file (instance attribute)
+    - engine: the storage engine class (instance attribute)
     
     Method(s):
+    - engine_class: a static method returning the configured storage engine
     - new: a static method for database file creation
     - exist: a static method for testing if a database file already exist
     - delete: a static method for deleting a database file
+    - rename: a static method for renaming a database file
+    - convert: a static method for converting a database to another engine
+    - recover: a static method for recovering databases after a crash
+    - batch: a context manager grouping modifications in one atomic batch
+    - reader: a context manager giving a read access to the database
+    - upgrade: a method to upgrade the format of the database
+    - open: a method to use the database file during a client session
+    - load: a method to keep the blocks of the database in memory
+    - close: a method to stop using the database file
     - add_data: a method for adding a secret information block in database
     - search_data: search secret information blocks matching a pattern
+    - index_data: a method for rebuilding the blind index of the database
     - get_data: a method for getting all secret information blocks
+    - get_raw_data: a method for getting all secret information blocks
+      in their serialized form
     - update_data: a method for updating a secret information block in database
     - delete_data: a method for deleting a secret information block in database
+    - get_stats: a method for getting the statistics of the database
+    - copy_to: a method for copying all entries to another database
+    - compact: a method for reclaiming unused space of the database file
+    - snapshot: a method for copying the database file as it is now
     """
     
     # Intern methods
     
-    def __init__(self, path, filename):
+    def __init__(self, path, filename, engine=None):
         """Set attributes"""
         self.path = path                # Client database path
         self.filename = filename        # Client database filename
-        self.database = self.path + '/' + self.filename  # Client database
-        
-    def __getitem__(self, index):
-        """Get an item. Raise KeyError exception if index does not exist"""
-        with DBAccess.getLock(self.database):
-            with shelve.open(self.database, flag='r') as db:
-                value = db[index]
-        return value
+        self.database = VaultIndex.location(path, filename)  # Client database
+        self.engine = engine or DBHandler.engine_class()  # Storage engine
+
+    @contextlib.contextmanager
+    def _locked_(self, shared=False):
+        """Lock the database file and return the opened storage engine
+        without upgrading the database: the database must have been upgraded
+        before owning any lock (an upgrade needs the exclusive lock).
+        A shared lock is enough to read: readers do not block each other."""
+        lock = DBAccess.getLock(self.database)
+        if shared:
+            with lock.reader():
+                yield DBPool.get(self.database, self.engine)
+        else:
+            with lock:
+                yield DBPool.get(self.database, self.engine)
+
+    @contextlib.contextmanager
+    def _vault_(self, shared=False):
+        """Upgrade the database then lock the database file and return the
+        opened storage engine (see _locked_)"""
+        self.upgrade()  # First use of the database
+        with self._locked_(shared) as vault:
+            yield vault
+
+    @contextlib.contextmanager
+    def _batch_(self):
+        """Batch of modifications without upgrading the database
+        (see batch and _locked_)"""
+        with self._locked_() as vault:
+            vault.begin()
+            try:
+                yield vault
+            except:
+                vault.rollback()
+                raise
+            vault.commit()
+            DBSyncer.committed(self.database, vault)
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Lock the database file and return the opened storage engine.
+        Modifications are applied all together at the end of the block or
+        none of them if an exception is raised."""
+        self.upgrade()  # Before owning the lock
+        with self._batch_() as vault:
+            yield vault
+
+    @contextlib.contextmanager
+    def reader(self):
+        """Lock the database file (shared lock) and return the opened
+        storage engine. The database must not be modified in the block."""
+        with self._vault_(shared=True) as vault:
+            yield vault
+
+    def _items_(self, vault):
+        """Return the list of (index, sib) of the opened vault.
+        Blocks are taken from the cache if possible."""
+        if not SIBCache.enabled():
+            return list(vault.items())
+        items = []
+        for i in vault.indexes():
+            sib = SIBCache.get(self.database, i)
+            if sib is None:
+                psib = vault.get_raw(i)
+                sib = vault.loads(psib)
+                SIBCache.put(self.database, i, sib, len(psib))
+            items.append((i, sib))
+        return items
+
+    def __getitem__(self, key):
+        """Get a named entry. Raise KeyError exception if key does not exist"""
+        with self._vault_(shared=True) as vault:
+            return vault.get_meta(key)
     
-    def __setitem__(self, index, value):
-        """Set an item"""
-        with DBAccess.getLock(self.database):
-            with shelve.open(self.database, flag='w') as db:
-                db[index] = value
+    def __setitem__(self, key, value):
+        """Set a named entry"""
+        with self.batch() as vault:
+            vault.set_meta(key, value)
                 
-    def __delitem__(self, index):
-        """Delete an item. Raise KeyError exception if index does not exist"""
-        with DBAccess.getLock(self.database):
-            with shelve.open(self.database, flag='w') as db:
-                del db[index]
+    def __delitem__(self, key):
+        """Delete a named entry. Raise KeyError exception if key does not exist"""
+        with self.batch() as vault:
+            vault.del_meta(key)
+
+    def _blind_entry_(self, keyH, sib):
+        """Return the blind index entry of a sib or None if the index is
+        disabled (information are decrypted: call it without any lock)"""
+        if keyH is None or not Configuration.blind_index:
+            return None
+        return BlindIndex.entry(keyH, sib)
+
+    def _blind_entries_(self):
+        """Return a dictionary of the blind index entries by block index
+        (they are only read in the database file at the first search)"""
+        prefix = BlindIndex.prefix
+        with self._vault_(shared=True) as vault:
+            entries = BlindIndex.get(self.database)
+            if entries is None:
+                entries = {int(key[len(prefix):]): value
+                           for key, value in vault.meta_items()
+                           if key.startswith(prefix)}
+                BlindIndex.load(self.database, entries)
+        return entries
 
     # Extern methods
+
+    @staticmethod
+    def engine_class():
+        """Return the configured storage engine class"""
+        return engines[Configuration.storage]
     
     @staticmethod
-    def new(path, filename):
+    def new(path, filename, engine=None):
         """Try to create a new db. Return a boolean."""
-        if DBHandler.exist(path, filename):
-            return False
-        else:
-            # Create a new database file with good permissions
-            dbfile = path + '/' + filename
-            with shelve.open(dbfile, flag='n') as db:
-                db['nbsibs'] = 0  # Number of secret information blocks
-                db['index'] = 0   # Last entry index
-            os.chmod(dbfile + '.db',
-                     stat.S_IRUSR | stat.S_IWUSR | stat.S_IREAD | stat.S_IWRITE)
-            return True
+        engine = engine or DBHandler.engine_class()
+        dbfile = VaultIndex.location(path, filename)
+        with DBAccess.getLock(dbfile):
+            if DBHandler.exist(path, filename, engine):
+                return False
+            else:
+                # Create a new database file with good permissions
+                os.makedirs(os.path.dirname(dbfile), mode=0o700, exist_ok=True)
+                engine.create(dbfile)
+                VaultIndex.add(path, filename, engine)
+                VaultFormat.stamp(dbfile, DBPool.get(dbfile, engine))
+                return True
     
     @staticmethod
-    def exist(path, filename):
-        """Test if the database file exist"""
-        return os.path.exists(path + '/' + filename + '.db')
+    def exist(path, filename, engine=None):
+        """Test if the database file exist (without file system access)"""
+        engine = engine or DBHandler.engine_class()
+        return VaultIndex.exists(path, filename, engine)
     
     @staticmethod
     def delete(path, filename):
         """Try to delete database file"""
         result = False
-        dbfile = path + '/' + filename
+        engine = DBHandler.engine_class()
+        dbfile = VaultIndex.location(path, filename)
         with DBAccess.getLock(dbfile):
-            os.unlink(dbfile + '.db')
-            result = not os.path.exists(dbfile + '.db')
+            DBPool.close(dbfile)  # Flush and close before deleting
+            SIBCache.invalidate_vault(dbfile)
+            BlindIndex.invalidate_vault(dbfile)
+            VaultTier.evict(dbfile)
+            VaultFormat.forget(dbfile)
+            result = engine.remove(dbfile)
             if result:
+                VaultIndex.discard(path, filename, engine)
                 DBAccess.delLock(dbfile)
         return result
+
+    @staticmethod
+    def rename(path, src, dst):
+        """Rename a database file (replacing the destination file)"""
+        engine = DBHandler.engine_class()
+        dbsrc = VaultIndex.location(path, src)
+        dbdst = VaultIndex.location(path, dst)
+        with DBAccess.getLock(dbdst):
+            DBPool.close(dbsrc)  # Flush and close before renaming
+            DBPool.close(dbdst)
+            SIBCache.invalidate_vault(dbsrc)
+            SIBCache.invalidate_vault(dbdst)
+            BlindIndex.invalidate_vault(dbsrc)
+            BlindIndex.invalidate_vault(dbdst)
+            VaultTier.evict(dbsrc)
+            VaultTier.evict(dbdst)
+            VaultFormat.forget(dbsrc)
+            VaultFormat.forget(dbdst)
+            os.makedirs(os.path.dirname(dbdst), mode=0o700, exist_ok=True)
+            engine.rename(dbsrc, dbdst)
+            if Configuration.durability == 'commit':
+                # Write the directory on disk so the renaming is durable
+                fd = os.open(os.path.dirname(dbdst), os.O_RDONLY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+            VaultIndex.discard(path, src, engine)
+            VaultIndex.add(path, dst, engine)
+
+    @staticmethod
+    def recover(path):
+        """Finish or cancel operations interrupted by a crash of the
+        server: interrupted renamings are finished and interrupted commits
+        are replayed or canceled (see the recover method of storage engines)
+        then the remaining temporary databases of a cryptographic
+        configuration change or of a conversion are deleted (the original
+        database is kept).
+        Return the number of databases recovered."""
+        engine = DBHandler.engine_class()
+        nbrecovered = 0
+        filenames = VaultIndex.vaults(path, engine)
+        for filename in filenames:
+            if not filename.endswith('_tmp') and \
+                    engine.recover(VaultIndex.location(path, filename)):
+                nbrecovered += 1
+        for filename in filenames:
+            if not filename.endswith('_tmp'):
+                continue
+            if engine.exists(VaultIndex.location(path, filename)):
+                DBHandler.delete(path, filename)
+                nbrecovered += 1
+            else:
+                VaultIndex.discard(path, filename, engine)  # Renamed
+        if nbrecovered > 0:
+            logging.warning('{} database(s) recovered in {}'
+                            .format(nbrecovered, path))
+        return nbrecovered
+
+    @staticmethod
+    def convert(path, filename, source):
+        """Copy a database stored by the source engine into a new database
+        stored by the configured engine. The source database is kept.
+        Return a boolean."""
+        if DBHandler.exist(path, filename) or \
+                not DBHandler.new(path, filename + '_tmp'):
+            return False  # Already converted or conversion in progress
+        dbH_source = DBHandler(path, filename, source)
+        dbH_tmp = DBHandler(path, filename + '_tmp')
+        try:
+            dbH_source.copy_to(dbH_tmp)
+            with DBAccess.getLock(dbH_source.database):
+                DBPool.close(dbH_source.database)
+            DBHandler.rename(path, dbH_tmp.filename, filename)
+        except:
+            DBHandler.delete(path, dbH_tmp.filename)  # No partial copy
+            raise
+        return True
+
+    def upgrade(self):
+        """Upgrade the format of the database if it is not known to be
+        up to date (see VaultFormat class). The shared lock of the database
+        must not be owned. Return True if the database is upgraded."""
+        if VaultFormat.is_current(self.database):
+            return False
+        with DBAccess.getLock(self.database):
+            if not DBHandler.exist(self.path, self.filename, self.engine):
+                return False  # Deleted database
+            old = VaultFormat.upgrade(
+                self.database, DBPool.get(self.database, self.engine))
+            return old < VaultFormat.version
+
+    def open(self):
+        """Keep the database file opened during the client session"""
+        DBPool.acquire(self.database)
+
+    def close(self):
+        """The client session does not use the database file anymore"""
+        DBPool.release(self.database)
+
+    def load(self):
+        """Keep the blocks of the database in memory (if the tier is
+        enabled) so reads do not access the database file"""
+        if not VaultTier.enabled() or VaultTier.resident(self.database):
+            return
+        with self._vault_(shared=True) as vault:
+            if VaultTier.load(self.database, vault.items_raw()):
+                SIBCache.invalidate_vault(self.database)  # Useless now
         
-    def add_data(self, sib):
-        """Add a secret information block and return his index (a string)"""
-        nbsibs = self['nbsibs'] + 1   # Increment the number of block
-        self['nbsibs'] = nbsibs       # Store the new number of block
-        index = self['index'] + 1     # Increment the index
-        self['index'] = index         # Store the new index
-        index = str(index)            # index as string
-        self[index] = sib             # Store the block
-        return index                  # Return the index of the block
+    def add_data(self, sib, keyH=None):
+        """Add a secret information block and return his index (a string).
+        The blind index entry of the block is set if keyH is given."""
+        entry = self._blind_entry_(keyH, sib)
+        psib = sib.encode()  # Serialized once
+        with self._vault_() as vault:
+            with self._batch_():
+                VaultStats.update(vault, new=len(psib))
+                index = vault.add(psib)
+                if entry is not None:
+                    vault.set_meta(BlindIndex.name(index), entry)
+            if entry is not None:
+                BlindIndex.put(self.database, index, entry)
+            VaultTier.put(self.database, index, psib)  # Write-through
+            ratio = vault.fragmentation()  # While the vault is locked
+        DBCompactor.check(self, ratio)
+        return str(index)
         
-    def search_data(self, keyH, pattern):
-        """Search secret information matching the pattern.
-        Return a list of found sibs."""
-        tabsibs = []             # Table of sibs
-        nbsibs = self['nbsibs']  # Number of sibs
-        if nbsibs > 0:
-            for i in range(1, self['index'] + 1):  # For all sibs
-                try:
-                    sib = self[str(i)]  # Get sib
-                except KeyError:
-                    continue  # Try next key
-                if sib.nbInfo > 0:
-                    sib.keyH = keyH  # Set actual KeyHandler
-                    if Configuration.search_mode == 'first':
-                        if re.search(pattern.upper(), sib['info1'].decode().upper()) is not None:
-                            tabsibs.append((i, sib))  # Matching so add sib
-                    else:
-                        for j in range(1, sib.nbInfo + 1):  # For all info
-                            if re.search(pattern.upper(), sib['info' + str(j)].decode().upper()) is not None:
-                                tabsibs.append((i, sib))  # Matching so add sib
-                                break  # One info match so stop loop now
-        return tabsibs
+    def search_data(self, keyH, pattern, cache=None):
+        """Search secret information matching the pattern (decrypted
+        information are taken from the cache of the session if it is given).
+        Return an iterator over found sibs: they are found while iterating.
+        Raise re.error if the pattern is not a valid regular expression
+        (before any block is loaded).
+        If the blind index is enabled, blocks that can not match are skipped
+        without being decrypted."""
+        plan = SearchPlan(pattern, Configuration.search_mode)
+        items = self.get_data(keyH)
+        tokens = None
+        if keyH is not None and Configuration.blind_index:
+            tokens = BlindIndex.query(keyH, plan)
+        if tokens is not None:
+            entries = self._blind_entries_()
+            items = [(i, sib) for i, sib in items
+                     if BlindIndex.candidate(plan, tokens, entries.get(i), sib)]
+        return DBSearcher.search(plan, items, cache)
+
+    def index_data(self, keyH):
+        """Rebuild the blind index of all blocks (all information are
+        decrypted) or delete it if the index is disabled"""
+        entries = {}
+        if Configuration.blind_index:
+            for i, sib in self.get_data(keyH):  # Before owning the lock
+                entries[i] = BlindIndex.entry(keyH, sib)
+        with self.batch() as vault:
+            prefix = BlindIndex.prefix
+            for key, value in list(vault.meta_items()):
+                if key.startswith(prefix) and \
+                        int(key[len(prefix):]) not in entries:
+                    vault.del_meta(key)  # Block deleted or index disabled
+            for i, entry in entries.items():
+                vault.set_meta(BlindIndex.name(i), entry)
+            BlindIndex.invalidate_vault(self.database)  # Reloaded if used
     
     def get_data(self, keyH):
         """Return a list of all sibs"""
+        self.upgrade()  # Before owning the shared lock
+        with DBAccess.getLock(self.database).reader():
+            items = VaultTier.items(self.database)  # Resident database ?
+            if items is None:
+                with self._locked_(shared=True) as vault:
+                    items = self._items_(vault)  # Load sibs
         tabsibs = []             # Table of sibs
-        nbsibs = self['nbsibs']  # Number of sibs
-        if nbsibs > 0: 
-            for i in range(1, self['index'] + 1):  # For all sibs
-                try:
-                    sib = self[str(i)]  # Get sib
-                except KeyError:
-                    continue  # Try next key
-                if sib.nbInfo > 0:
-                    sib.keyH = keyH  # Set actual KeyHandler
-                    tabsibs.append((i, sib))
+        for i, sib in items:
+            if sib.nbInfo > 0:
+                sib.keyH = keyH  # Set actual KeyHandler
+                tabsibs.append((i, sib))
         return tabsibs
     
-    def update_data(self, index, sib):
-        """Update a secret information block. Return a boolean."""
+    def get_raw_data(self):
+        """Return a list of all sibs in their serialized form (binary format).
+        Sibs are not deserialized nor copied: they may be read-only views of
+        the database file (memoryview objects) to release after use."""
+        self.upgrade()  # Before owning the shared lock
+        with DBAccess.getLock(self.database).reader():
+            items = VaultTier.items_raw(self.database)  # Resident database ?
+            if items is None:
+                with self._locked_(shared=True) as vault:
+                    items = list(vault.items_view())
+        return items
+    
+    def update_data(self, index, sib, keyH=None):
+        """Update a secret information block. Return a boolean.
+        The blind index entry of the block is set if keyH is given."""
         try:
             index = int(index)      # Conversion to int
-            index = str(index)      # index as a string type
-            oldsib = self[index]    # Get actual sib (test if index is OK)
-            self[index] = sib       # Set updated sib
+            entry = self._blind_entry_(keyH, sib)
+            psib = sib.encode()  # Serialized once
+            with self._vault_() as vault:
+                with self._batch_():
+                    # Get actual sib size (test if index is OK)
+                    old = len(vault.get_raw(index))
+                    VaultStats.update(vault, old, len(psib))
+                    vault.put(index, psib)  # Set updated sib
+                    if entry is not None:
+                        vault.set_meta(BlindIndex.name(index), entry)
+                    SIBCache.invalidate(self.database, index)
+                if entry is not None:
+                    BlindIndex.put(self.database, index, entry)
+                VaultTier.put(self.database, index, psib)  # Write-through
+                ratio = vault.fragmentation()  # While the vault is locked
+            DBCompactor.check(self, ratio)
             return True
         except ValueError:
             return False
@@ -202,12 +483,86 @@ class DBHandler:
         """Delete a secret information block. Return a boolean."""
         try:
             index = int(index)  # Conversion in int
-            index = str(index)  # index as a string type
-            del self[index]  # Delete entry at index
-            nbsibs = self['nbsibs'] - 1  # Decrement the number of block
-            self['nbsibs'] = nbsibs      # Store the new number of block
+            with self._vault_() as vault:
+                with self._batch_():
+                    old = len(vault.get_raw(index))  # Test if index is OK
+                    VaultStats.update(vault, old)
+                    vault.delete(index)  # Delete entry at index
+                    try:
+                        vault.del_meta(BlindIndex.name(index))
+                    except KeyError:
+                        pass  # Block not indexed
+                    SIBCache.invalidate(self.database, index)
+                BlindIndex.invalidate(self.database, index)
+                VaultTier.drop(self.database, index)  # Write-through
+                ratio = vault.fragmentation()  # While the vault is locked
+            DBCompactor.check(self, ratio)
             return True
         except ValueError:
             return False
         except KeyError:
             return False
+
+    def get_stats(self):
+        """Return the statistics of the database (a dictionary with the
+        number of blocks 'count', the size of all blocks 'bytes' and the size
+        of the largest block 'largest'). No block is read."""
+        with self._vault_(shared=True) as vault:
+            try:
+                stats = vault.get_meta(VaultStats.key)
+            except KeyError:
+                stats = {}  # Database of an older version
+        if 'sizes' not in stats:
+            with self.batch() as vault:
+                stats = VaultStats.load(vault)
+                vault.set_meta(VaultStats.key, stats)
+        return VaultStats.public(stats)
+
+    def copy_to(self, dbH, convert=None):
+        """Copy all named entries and sibs to another (empty) database.
+        The convert function, if given, is applied to each sib and
+        returns the sib to store (or None to skip it).
+        The copy is done in one batch."""
+        with self._vault_(shared=True) as vault, dbH.batch() as vault_dst:
+            for key, value in vault.meta_items():
+                if key != VaultStats.key:
+                    vault_dst.set_meta(key, value)
+            sizes = []
+            for i, sib in vault.items():
+                if convert is not None:
+                    sib = convert(sib)
+                if sib is not None:
+                    psib = sib.encode()
+                    vault_dst.put(i, psib)
+                    sizes.append(len(psib))
+            vault_dst.set_meta(VaultStats.key, VaultStats.compute(sizes))
+            vault_dst.set_last_index(vault.last_index())
+        logging.debug('Database {} copied to {}'
+                      .format(self.database, dbH.database))
+
+    def compact(self):
+        """Reclaim unused space of the database file.
+        Return the number of bytes reclaimed."""
+        self.upgrade()  # Before owning the lock
+        with DBAccess.getLock(self.database):
+            if not DBHandler.exist(self.path, self.filename, self.engine):
+                return 0  # Deleted database
+            with self._locked_() as vault:
+                reclaimed = vault.compact()
+        logging.info('Database {} compacted ({} bytes reclaimed)'
+                     .format(self.database, reclaimed))
+        return reclaimed
+
+    def snapshot(self, dbfile):
+        """Copy the database file as it is now to dbfile (a path without
+        suffix). The lock is owned to start the copy (the default storage
+        engine copies the whole file under the lock, see StorageEngine).
+        Return False if the database does not exist anymore."""
+        self.upgrade()  # Before owning the shared lock
+        with DBAccess.getLock(self.database).reader():
+            if not DBHandler.exist(self.path, self.filename, self.engine):
+                return False  # Deleted database
+            with self._locked_(shared=True) as vault:
+                copy = vault.snapshot(dbfile)
+        copy()  # Without the lock
+        return True
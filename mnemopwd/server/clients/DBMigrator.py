@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2015-2017, Thierry Lemeunier <thierry at lemeunier dot net>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR
+# OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+Background upgrade of the format of idle databases
+
+Databases are upgraded to the current format version the first time they
+are used (see VaultFormat class). If the configuration option
+'format_sweeper' is set, a background thread also upgrades databases not
+used by a client session after the server starts so the migrations of a
+new release are not done during client sessions.
+"""
+
+import logging
+import threading
+import time
+
+from .DBAccess import DBAccess
+from .DBHandler import DBHandler
+from .DBPool import DBPool
+from .VaultFormat import VaultFormat
+from .VaultIndex import VaultIndex
+
+
+class DBMigrator:
+    """
+    Background upgrade of the format of idle databases
+
+    Attribute(s):
+    - thread: the background thread (created on demand)
+    - pause: the delay (in seconds) between two upgrades
+    - lock: a lock for creating the thread
+
+    Method(s):
+    - sweep: upgrade all idle databases
+    - start: upgrade all idle databases in a background thread
+    """
+
+    thread = None  # Background thread
+    pause = 0.01  # Delay between two upgrades
+    lock = threading.Lock()  # Lock for creating the thread
+
+    # Extern methods
+
+    @staticmethod
+    def sweep(path):
+        """Upgrade all databases of the directory path not used by a client
+        session. Return the number of databases upgraded."""
+        nbupgraded = 0
+        for filename in VaultIndex.vaults(path, DBHandler.engine_class()):
+            dbH = DBHandler(path, filename)
+            if VaultFormat.is_current(dbH.database) or \
+                    DBPool.sessions(dbH.database) > 0:
+                continue  # Up to date or upgraded at its first use
+            try:
+                with DBAccess.getLock(dbH.database):
+                    if dbH.upgrade():
+                        nbupgraded += 1
+                    if DBPool.sessions(dbH.database) == 0:
+                        DBPool.close(dbH.database)  # Do not fill the pool
+            except Exception as exc:
+                logging.error('Upgrade of database {} failed: {}'
+                              .format(dbH.database, exc))
+            time.sleep(DBMigrator.pause)  # Let client sessions work
+        logging.info('Format sweep done: {} database(s) upgraded'
+                     .format(nbupgraded))
+        return nbupgraded
+
+    @staticmethod
+    def start(path):
+        """Upgrade all idle databases of the directory path in a background
+        thread"""
+        with DBMigrator.lock:
+            if DBMigrator.thread is None or not DBMigrator.thread.is_alive():
+                DBMigrator.thread = threading.Thread(
+                    target=DBMigrator.sweep, args=(path,), daemon=True)
+                DBMigrator.thread.start()
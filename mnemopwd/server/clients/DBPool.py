@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2015-2017, Thierry Lemeunier <thierry at lemeunier dot net>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR
+# OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+A pool of opened database files shared by all client sessions
+
+Opening a database file is expensive so a database file is opened once and
+stays opened while a client session uses it. The number of opened database
+files is bounded: the least recently used ones are closed when the limit is
+reached. Database files not accessed for a while are closed too.
+
+The caller must own the lock of the database file (see DBAccess class) before
+getting or closing a database file. A database file whose lock is owned (by
+any thread, including the current one higher up in its stack) is in use and
+is never closed by the pool.
+"""
+
+import collections
+import logging
+import threading
+import time
+
+from ..util.Configuration import Configuration
+from .DBAccess import DBAccess
+
+
+class DBPool:
+    """
+    A pool of opened database files
+
+    Attribute(s):
+    - handles: an ordered dictionary of [engine, sessions, last access time]
+               indexed by database file (the most recently used is the last)
+    - lock: a lock to serialize pool modifications
+
+    Method(s):
+    - acquire: register a client session using a database file
+    - release: unregister a client session and close the database file if
+               no more session uses it
+    - sessions: return the number of client sessions using a database file
+    - get: return an opened database file
+    - close: flush and close a database file
+    - close_all: flush and close all database files
+    - evict_idle: close database files not accessed for a while
+    """
+
+    handles = collections.OrderedDict()  # Opened database files
+    lock = threading.Lock()  # Lock on the pool
+
+    # Intern methods
+
+    @staticmethod
+    def _close_(dbfile):
+        """Close a database file. The pool lock must be owned."""
+        try:
+            entry = DBPool.handles[dbfile]
+        except KeyError:
+            return  # Not opened
+        if entry[0] is not None:
+            entry[0].close()  # Flush and close
+            entry[0] = None
+        if entry[1] <= 0:
+            del DBPool.handles[dbfile]  # No more session
+
+    @staticmethod
+    def _evict_(exclude):
+        """Close the least recently used database files while the pool is
+        full. The pool lock must be owned."""
+        nbopened = sum(1 for e in DBPool.handles.values() if e[0] is not None)
+        for dbfile in list(DBPool.handles.keys()):
+            if nbopened < Configuration.dbpoolsize:
+                break
+            entry = DBPool.handles[dbfile]
+            if dbfile == exclude or entry[0] is None:
+                continue
+            lock = DBAccess.getLock(dbfile)
+            if lock.owned():
+                continue  # In use by the current thread (reentrant lock)
+            if lock.acquire(blocking=False):  # Skip a database file in use
+                try:
+                    entry[0].close()
+                    entry[0] = None  # Keep sessions, reopen later
+                    nbopened -= 1
+                finally:
+                    lock.release()
+
+    # Extern methods
+
+    @staticmethod
+    def acquire(dbfile):
+        """Register a client session using the database file"""
+        with DBPool.lock:
+            try:
+                DBPool.handles[dbfile][1] += 1
+            except KeyError:
+                DBPool.handles[dbfile] = [None, 1, time.time()]
+
+    @staticmethod
+    def release(dbfile):
+        """Unregister a client session. The database file is closed
+        if no more session uses it."""
+        with DBAccess.getLock(dbfile):
+            with DBPool.lock:
+                try:
+                    entry = DBPool.handles[dbfile]
+                except KeyError:
+                    return  # Already closed (deleted database ?)
+                entry[1] -= 1
+                if entry[1] <= 0:
+                    DBPool._close_(dbfile)  # No more session
+
+    @staticmethod
+    def sessions(dbfile):
+        """Return the number of client sessions using the database file"""
+        with DBPool.lock:
+            try:
+                return DBPool.handles[dbfile][1]
+            except KeyError:
+                return 0
+
+    @staticmethod
+    def get(dbfile, engine):
+        """Return the opened database file (a storage engine object)"""
+        with DBPool.lock:
+            try:
+                entry = DBPool.handles[dbfile]
+            except KeyError:
+                entry = DBPool.handles[dbfile] = [None, 0, 0]
+            if entry[0] is None:
+                DBPool._evict_(dbfile)  # Make room if needed
+                entry[0] = engine(dbfile, Configuration.durability)
+            entry[2] = time.time()  # Last access time
+            DBPool.handles.move_to_end(dbfile)  # The most recently used
+            return entry[0]
+
+    @staticmethod
+    def close(dbfile):
+        """Flush and close the database file (before deleting or
+        renaming it for example)"""
+        with DBPool.lock:
+            DBPool._close_(dbfile)
+
+    @staticmethod
+    def close_all():
+        """Flush and close all database files"""
+        with DBPool.lock:
+            dbfiles = list(DBPool.handles.keys())
+        for dbfile in dbfiles:
+            with DBAccess.getLock(dbfile):
+                DBPool.close(dbfile)
+
+    @staticmethod
+    def evict_idle():
+        """Close database files not accessed for a while"""
+        with DBPool.lock:
+            limit = time.time() - Configuration.dbidle
+            for dbfile in list(DBPool.handles.keys()):
+                entry = DBPool.handles[dbfile]
+                if entry[0] is None or entry[2] > limit:
+                    continue
+                lock = DBAccess.getLock(dbfile)
+                if lock.owned():
+                    continue  # In use by the current thread (reentrant lock)
+                if lock.acquire(blocking=False):  # Skip a database file in use
+                    try:
+                        DBPool._close_(dbfile)
+                        logging.debug('Idle database {} closed'.format(dbfile))
+                    finally:
+                        lock.release()
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2015-2017, Thierry Lemeunier <thierry at lemeunier dot net>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR
+# OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Parallel search in databases
+
+The blocks of a database are searched by chunks of consecutive blocks
+executed concurrently by a pool of threads (see the configuration option
+'searchpoolsize'). Decrypting an information of a block is done by OpenSSL
+which releases the GIL so threads run in parallel (a pool of processes
+would have to copy the key handler of the session which can not be done).
+
+The matching blocks of each chunk are given in the order of the chunks as
+soon as the chunk is searched (the first results are sent to the client
+while next chunks are searched) so the result does not depend on the number
+of threads. A small database, or a pool of one thread, is searched by the
+calling thread. A search has at most as many chunks submitted to the pool
+as the pool has threads, so a big database does not monopolize the pool
+shared by all sessions.
+"""
+
+import collections
+import threading
+
+from ..util.Configuration import Configuration
+from ..util.MeteredExecutor import MeteredExecutor
+
+
+class DBSearcher:
+    """
+    Parallel search in databases
+
+    Attribute(s):
+    - chunk: the number of blocks of a chunk
+    - executor: the pool of threads (created on demand)
+    - lock: a lock for creating the pool
+
+    Method(s):
+    - get: return the pool of threads
+    - search: iterate over the blocks matching a compiled search pattern
+    - stats: return the metrics of the pool
+    - shutdown: wait for the end of searches and delete the pool
+    """
+
+    chunk = 32  # Number of blocks of a chunk
+    executor = None  # Pool of threads
+    lock = threading.Lock()  # Lock for creating the pool
+
+    # Intern methods
+
+    @staticmethod
+    def _match_(plan, items, cache):
+        """Return the (index, sib) of items matching the search plan"""
+        return [(i, sib) for i, sib in items if plan.match(sib, i, cache)]
+
+    # Extern methods
+
+    @staticmethod
+    def get():
+        """Return the pool of threads executing searches"""
+        with DBSearcher.lock:
+            if DBSearcher.executor is None:
+                DBSearcher.executor = \
+                    MeteredExecutor(Configuration.searchpoolsize, 'search')
+            return DBSearcher.executor
+
+    @staticmethod
+    def search(plan, items, cache=None):
+        """Iterate over (index, sib) of items (a list in index order)
+        matching the search plan (see SearchPlan class) in index order.
+        cache is the decrypted information cache of the session or None."""
+        size = DBSearcher.chunk
+        if Configuration.searchpoolsize < 2 or len(items) <= size:
+            for i, sib in items:
+                if plan.match(sib, i, cache):
+                    yield i, sib
+            return
+        executor = DBSearcher.get()
+        futures = collections.deque()  # Chunks in progress
+        try:
+            for k in range(0, len(items), size):
+                if len(futures) >= Configuration.searchpoolsize:
+                    yield from futures.popleft().result()
+                futures.append(executor.submit(
+                    DBSearcher._match_, plan, items[k:k + size], cache))
+            while futures:
+                yield from futures.popleft().result()
+        finally:
+            for future in futures:
+                future.cancel()  # Error or iteration stopped by the caller
+
+    @staticmethod
+    def stats():
+        """Return the metrics of the pool (None if it is not created)"""
+        with DBSearcher.lock:
+            if DBSearcher.executor is None:
+                return None
+            return DBSearcher.executor.stats()
+
+    @staticmethod
+    def shutdown():
+        """Wait for the end of searches and delete the pool.
+        Return the last metrics of the pool (None if it was not created)."""
+        with DBSearcher.lock:
+            executor, DBSearcher.executor = DBSearcher.executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+            return executor.stats()
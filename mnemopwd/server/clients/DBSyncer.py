@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2015-2017, Thierry Lemeunier <thierry at lemeunier dot net>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR
+# OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+Group commit of database files
+
+With the 'group' durability option, committed data are not written on disk
+at each commit: modified database files are written on disk together by a
+background thread every 'group_commit_ms' milliseconds. A crash of the
+server loses nothing but a power failure can lose the last commits.
+"""
+
+import logging
+import threading
+import time
+
+from ..util.Configuration import Configuration
+from .DBAccess import DBAccess
+
+
+class DBSyncer:
+    """
+    Group commit of database files
+
+    Attribute(s):
+    - thread: the background thread (created on demand)
+    - dirty: a dictionary of opened vaults modified since the last group
+             commit indexed by database file
+    - lock: a lock on the dictionary
+
+    Method(s):
+    - committed: register a vault modified by a commit
+    - sync_all: write all modified vaults on disk
+    """
+
+    thread = None  # Background thread
+    dirty = dict()  # Modified vaults
+    lock = threading.Lock()  # Lock on the dictionary
+
+    # Intern methods
+
+    @staticmethod
+    def _run_():
+        """Write modified vaults on disk periodically"""
+        while True:
+            time.sleep(Configuration.group_commit_ms / 1000)
+            DBSyncer.sync_all()
+
+    # Extern methods
+
+    @staticmethod
+    def committed(dbfile, vault):
+        """Register a vault modified by a commit"""
+        if Configuration.durability != 'group':
+            return  # Written on disk at commit or by the operating system
+        with DBSyncer.lock:
+            DBSyncer.dirty[dbfile] = vault
+            if DBSyncer.thread is None:
+                DBSyncer.thread = threading.Thread(target=DBSyncer._run_,
+                                                   daemon=True)
+                DBSyncer.thread.start()
+
+    @staticmethod
+    def sync_all():
+        """Write all modified vaults on disk"""
+        with DBSyncer.lock:
+            dirty, DBSyncer.dirty = DBSyncer.dirty, dict()
+        for dbfile, vault in dirty.items():
+            try:
+                with DBAccess.getLock(dbfile).reader():
+                    vault.sync()
+            except Exception as exc:
+                logging.error('Synchronization of {} failed: {}'
+                              .format(dbfile, exc))
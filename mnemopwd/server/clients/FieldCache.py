@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2015-2017, Thierry Lemeunier <thierry at lemeunier dot net>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR
+# OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+A cache of decrypted information of a client session
+
+Searches of a session decrypt the same information again and again. The
+cache keeps the decrypted information of the blocks of the session so next
+searches only decrypt modified blocks. It is optional (see the configuration
+option 'sessioncachekb'): decrypted information are kept in memory during
+the session.
+
+Information are indexed by (block index, information number) and stored with
+their encrypted value: a cached information is only used if the encrypted
+value has not changed (for example by another session of the same user).
+The cache is bounded by a memory budget: the least recently used information
+are dropped when the budget is exceeded.
+
+The cache stores its own copies of decrypted information in bytearray
+objects so these copies are zeroed when they are dropped. Only these copies
+are zeroed: the temporary objects created by the decryption (bytes), the
+copies returned to a search (bytes, a cached copy may be zeroed by another
+search thread while it is used) and the objects created by the matching
+(str) are immutable and are only freed, as in a search without cache. The cache of a session is invalidated for each modified block and
+cleared when the connection is lost.
+"""
+
+import collections
+import threading
+
+
+class FieldCache:
+    """
+    A cache of decrypted information of a client session
+
+    Attribute(s):
+    - budget: the maximum number of bytes of decrypted information
+    - fields: an ordered dictionary of (encrypted value, decrypted value)
+              indexed by (block index, information number) (the most recently
+              used is the last)
+    - size: the number of bytes of decrypted information
+    - hits, misses: the number of successful and unsuccessful lookups
+    - closed: True when the cache is cleared at the end of the session
+    - lock: a lock to serialize cache accesses (parallel searches)
+
+    Method(s):
+    - get: return a decrypted information of a block
+    - invalidate: drop the information of a block
+    - clear: zero and drop all information
+    """
+
+    # Intern methods
+
+    def __init__(self, budget):
+        """Create an empty cache of budget bytes"""
+        self.budget = budget
+        self.fields = collections.OrderedDict()
+        self.size = 0
+        self.hits = self.misses = 0
+        self.closed = False
+        self.lock = threading.Lock()
+
+    def _drop_(self, key):
+        """Zero and drop an information. The lock must be owned."""
+        evalue, value = self.fields.pop(key)
+        self.size -= len(value)
+        value[:] = bytes(len(value))
+
+    # Extern methods
+
+    def get(self, index, sib, number):
+        """Return the decrypted information number of the block sib at the
+        index (bytes)"""
+        key, infokey = (index, number), 'info' + str(number)
+        evalue = sib.infos[infokey]
+        with self.lock:
+            entry = self.fields.get(key)
+            if entry is not None and entry[0] == evalue:
+                self.fields.move_to_end(key)
+                self.hits += 1
+                return bytes(entry[1])
+            self.misses += 1
+        info = sib[infokey]  # Decryption without the lock
+        value = bytearray(info)
+        with self.lock:
+            if self.closed or len(value) > self.budget:
+                return info  # Not cached
+            if key in self.fields:
+                self._drop_(key)
+            self.fields[key] = (evalue, value)
+            self.size += len(value)
+            while self.size > self.budget:
+                self._drop_(next(iter(self.fields)))  # LRU
+        return info
+
+    def invalidate(self, index):
+        """Drop the information of the block at the index"""
+        with self.lock:
+            for key in [key for key in self.fields if key[0] == index]:
+                self._drop_(key)
+
+    def clear(self):
+        """Zero and drop all information. The cache is not used anymore."""
+        with self.lock:
+            self.closed = True
+            while self.fields:
+                self._drop_(next(iter(self.fields)))
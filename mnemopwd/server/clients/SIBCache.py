@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2015-2017, Thierry Lemeunier <thierry at lemeunier dot net>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR
+# OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+A cache of deserialized secret information blocks shared by all sessions
+
+Blocks are indexed by (database file, block index). The cache is bounded
+by a memory budget (see the configuration option 'cachemb'): the size of a
+block is the size of its serialized form and the least recently used blocks
+are dropped when the budget is exceeded.
+
+A cached block is never given to the caller: a shallow copy is returned so
+a session can set its own KeyHandler on it.
+"""
+
+import collections
+import threading
+
+from ..util.Configuration import Configuration
+
+
+class SIBCache:
+    """
+    A cache of deserialized secret information blocks
+
+    Attribute(s):
+    - blocks: an ordered dictionary of (sib, size) indexed by
+              (database, index) (the most recently used is the last)
+    - vaults: a dictionary of the cached indexes of each database
+    - size: the number of bytes of cached blocks
+    - hits, misses: the number of successful and unsuccessful lookups
+    - lock: a lock to serialize cache accesses
+
+    Method(s):
+    - copy: return a shallow copy of a block
+    - enabled: test if the cache is enabled by configuration
+    - get: return a copy of a cached block or None
+    - put: store a block
+    - invalidate: drop a block
+    - invalidate_vault: drop all blocks of a database
+    - stats: return the cache statistics
+    """
+
+    blocks = collections.OrderedDict()  # Cached blocks
+    vaults = dict()  # Cached indexes by database
+    size = 0  # Bytes used
+    hits = 0  # Successful lookups
+    misses = 0  # Unsuccessful lookups
+    lock = threading.Lock()  # Lock on the cache
+
+    # Intern methods
+
+    @staticmethod
+    def _drop_(key):
+        """Drop a block. The cache lock must be owned."""
+        sib, size = SIBCache.blocks.pop(key)
+        SIBCache.size -= size
+        indexes = SIBCache.vaults[key[0]]
+        indexes.discard(key[1])
+        if not indexes:
+            del SIBCache.vaults[key[0]]
+
+    # Extern methods
+
+    @staticmethod
+    def copy(sib):
+        """Return a shallow copy of a block (without pickling it)"""
+        clone = object.__new__(type(sib))
+        clone.__dict__.update(sib.__dict__)
+        return clone
+
+    @staticmethod
+    def enabled():
+        """Test if the cache is enabled"""
+        return Configuration.cachemb > 0
+
+    @staticmethod
+    def get(database, index):
+        """Return a copy of the cached block or None"""
+        key = (database, index)
+        with SIBCache.lock:
+            try:
+                sib, size = SIBCache.blocks[key]
+            except KeyError:
+                SIBCache.misses += 1
+                return None
+            SIBCache.hits += 1
+            SIBCache.blocks.move_to_end(key)  # The most recently used
+        return SIBCache.copy(sib)
+
+    @staticmethod
+    def put(database, index, sib, size):
+        """Store a block (size is the length of its serialized form)"""
+        budget = Configuration.cachemb * 1024 * 1024
+        if size > budget:
+            return  # Too big
+        key = (database, index)
+        with SIBCache.lock:
+            if key in SIBCache.blocks:
+                SIBCache._drop_(key)
+            SIBCache.blocks[key] = (SIBCache.copy(sib), size)
+            SIBCache.vaults.setdefault(database, set()).add(index)
+            SIBCache.size += size
+            while SIBCache.size > budget:
+                SIBCache._drop_(next(iter(SIBCache.blocks)))  # LRU
+
+    @staticmethod
+    def invalidate(database, index):
+        """Drop a block"""
+        with SIBCache.lock:
+            if (database, index) in SIBCache.blocks:
+                SIBCache._drop_((database, index))
+
+    @staticmethod
+    def invalidate_vault(database):
+        """Drop all blocks of a database"""
+        with SIBCache.lock:
+            for index in list(SIBCache.vaults.get(database, ())):
+                SIBCache._drop_((database, index))
+
+    @staticmethod
+    def stats():
+        """Return the cache statistics (a dictionary)"""
+        with SIBCache.lock:
+            return {'hits': SIBCache.hits, 'misses': SIBCache.misses,
+                    'blocks': len(SIBCache.blocks), 'bytes': SIBCache.size}
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2015-2017, Thierry Lemeunier <thierry at lemeunier dot net>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR
+# OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+Format version of databases and migrations between versions
+
+Each database stores the version of its format as a named entry (a database
+without this entry has the version 0). When the way data are stored changes,
+the format version is increased and a migration function converting a
+database from the previous version is registered:
+
+    @VaultFormat.migration(1)
+    def something(vault):
+        ...  # Convert the opened vault from version 1 to version 2
+
+A database is upgraded lazily, the first time it is used after a new release
+of the server (see DBHandler class), by applying all missing migrations in
+one batch. So no stop-the-world conversion is needed. Idle databases can be
+upgraded in background too (see DBMigrator class).
+"""
+
+import logging
+import pickle
+import threading
+
+from .DBSyncer import DBSyncer
+from .VaultStats import VaultStats
+
+
+class VaultFormat:
+    """
+    Format version of databases and migrations between versions
+
+    Attribute(s):
+    - version: the format version of this release
+    - key: the name of the named entry storing the format version
+    - migrations: a dictionary of migration functions indexed by the version
+                  they convert from
+    - current: the set of database files known to be at the current version
+    - lock: a lock on the set
+
+    Method(s):
+    - migration: a decorator registering a migration function
+    - is_current: test if a database file is known to be up to date
+    - forget: forget a deleted or renamed database file
+    - stamp: set the current version in a new database
+    - upgrade: apply the missing migrations to a database
+    """
+
+    version = 2  # Current format version
+    key = 'version'  # Named entry
+    migrations = dict()  # Migration functions
+    current = set()  # Up to date database files
+    lock = threading.Lock()  # Lock on the set
+
+    # Extern methods
+
+    @staticmethod
+    def migration(version):
+        """Return a decorator registering a function converting an opened
+        vault from version to version + 1"""
+        def register(function):
+            VaultFormat.migrations[version] = function
+            return function
+        return register
+
+    @staticmethod
+    def is_current(dbfile):
+        """Test if the database file is known to be at the current version"""
+        with VaultFormat.lock:
+            return dbfile in VaultFormat.current
+
+    @staticmethod
+    def forget(dbfile):
+        """Forget the database file (it is deleted or renamed)"""
+        with VaultFormat.lock:
+            VaultFormat.current.discard(dbfile)
+
+    @staticmethod
+    def stamp(dbfile, vault):
+        """Set the current version in the new opened vault"""
+        vault.set_meta(VaultFormat.key, VaultFormat.version)
+        with VaultFormat.lock:
+            VaultFormat.current.add(dbfile)
+
+    @staticmethod
+    def upgrade(dbfile, vault):
+        """Apply the missing migrations to the opened vault in one batch.
+        The lock of the database file must be owned.
+        Return the version of the vault before the upgrade."""
+        try:
+            old = vault.get_meta(VaultFormat.key)
+        except KeyError:
+            old = 0  # Database of a version without format version
+        if old > VaultFormat.version:
+            raise ValueError('database {} has an unknown format version {}'
+                             .format(dbfile, old))
+        if old < VaultFormat.version:
+            vault.begin()
+            try:
+                for version in range(old, VaultFormat.version):
+                    VaultFormat.migrations[version](vault)
+                vault.set_meta(VaultFormat.key, VaultFormat.version)
+            except:
+                vault.rollback()
+                raise
+            vault.commit()
+            DBSyncer.committed(dbfile, vault)
+            logging.info('Database {} upgraded from format version {} to {}'
+                         .format(dbfile, old, VaultFormat.version))
+        with VaultFormat.lock:
+            VaultFormat.current.add(dbfile)
+        return old
+
+
+# Migrations
+
+
+@VaultFormat.migration(0)
+def add_statistics(vault):
+    """Version 1: statistics of the database (see VaultStats class)"""
+    vault.set_meta(VaultStats.key, VaultStats.load(vault))
+
+
+@VaultFormat.migration(1)
+def encode_blocks(vault):
+    """Version 2: blocks in binary format instead of pickle format (see
+    InfoBlock class). Secret information blocks keep their fingerprint
+    until they are rewritten by their owner."""
+    for index, psib in list(vault.items_raw()):
+        if psib[:1] == b'\x80':
+            vault.put(index, pickle.loads(psib))
+    vault.set_meta(VaultStats.key, VaultStats.compute(
+        len(psib) for i, psib in vault.items_raw()))
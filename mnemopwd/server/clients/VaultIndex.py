@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2015-2017, Thierry Lemeunier <thierry at lemeunier dot net>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR
+# OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+Layout of the database directories and index of existing databases
+
+Database files can be spread over several data directories (for example on
+several disks). The data directory of a database is chosen by a rendezvous
+hash of its filename: adding a data directory only moves the databases that
+the new directory wins. Temporary databases derived from a database (a
+filename suffix like '_tmp') are placed with it. The hash uses the identity
+of a data directory (a random string stored in the file '.datapath' of the
+directory) and not its path: a data directory can be renamed or mounted
+elsewhere without moving databases.
+
+In a data directory, database files are not stored flat but in a two level
+tree of subdirectories named by the first characters of the database
+filename (base32 characters):
+
+    datapath/AB/CD/ABCDEFGH...
+
+The names of existing databases are kept in memory (a set by main directory
+and storage engine) so testing if a database exists does not access the file
+system. The sets are loaded once then kept current on creation, deletion
+and renaming of databases.
+
+Databases which are not at their place (stored directly in a directory by an
+older version or in another data directory) are moved by the migrate method.
+"""
+
+import binascii
+import hashlib
+import logging
+import os
+import shutil
+import threading
+
+from .storage import engines
+
+
+class VaultIndex:
+    """
+    Layout and index of database files
+
+    Attribute(s):
+    - width: the number of characters of a subdirectory name
+    - levels: the number of levels of subdirectories
+    - roots: a dictionary of lists of data directories indexed by main
+             directory (the main directory is the only data directory if
+             it is not configured)
+    - idfile: the name of the identity file of a data directory
+    - ids: a dictionary of identities indexed by data directory
+    - names: a dictionary of sets of database filenames indexed by
+             (main directory, engine name)
+    - lock: a lock on the dictionaries
+
+    Method(s):
+    - configure: set the data directories of a main directory
+    - location: return the database file path (without suffix)
+    - vaults: return the names of databases stored by an engine
+    - exists: test if a database exists
+    - add: register a new database
+    - discard: unregister a deleted database
+    - migrate: move databases which are not at their place
+    """
+
+    width = 2  # Characters by subdirectory name
+    levels = 2  # Levels of subdirectories
+    roots = dict()  # Data directories
+    idfile = '.datapath'  # Identity file of a data directory
+    ids = dict()  # Identities of data directories
+    names = dict()  # Sets of database filenames
+    lock = threading.Lock()  # Lock on the dictionaries
+
+    # Intern methods
+
+    @staticmethod
+    def _roots_(path):
+        """Return the data directories of the main directory"""
+        return VaultIndex.roots.get(path, [os.path.normpath(path)])
+
+    @staticmethod
+    def _identity_(root):
+        """Return the identity of a data directory. It is created if the
+        directory has no identity file yet."""
+        idfile = os.path.join(root, VaultIndex.idfile)
+        try:
+            with open(idfile) as file:
+                return file.read().strip()
+        except FileNotFoundError:
+            identity = binascii.hexlify(os.urandom(16)).decode()
+            os.makedirs(root, mode=0o700, exist_ok=True)
+            with open(idfile, 'w') as file:
+                file.write(identity + '\n')
+            return identity
+
+    @staticmethod
+    def _names_(path, engine):
+        """Return the set of database filenames. Load it if needed.
+        The lock must be owned."""
+        try:
+            return VaultIndex.names[(path, engine.name)]
+        except KeyError:
+            names = set()
+            for root in VaultIndex._roots_(path):
+                for directory in VaultIndex._directories_(root):
+                    names.update(engine.vaults(directory))
+            VaultIndex.names[(path, engine.name)] = names
+            logging.debug('{} {} database(s) found in {}'
+                          .format(len(names), engine.name, path))
+            return names
+
+    @staticmethod
+    def _directories_(path, level=0):
+        """Iterate over the deepest subdirectories of the tree"""
+        try:
+            entries = list(os.scandir(path))
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            if entry.is_dir() and len(entry.name) == VaultIndex.width:
+                if level + 1 == VaultIndex.levels:
+                    yield entry.path
+                else:
+                    yield from VaultIndex._directories_(entry.path, level + 1)
+
+    @staticmethod
+    def _root_(path, filename):
+        """Return the data directory of a database (rendezvous hashing)"""
+        roots = VaultIndex._roots_(path)
+        if len(roots) == 1:
+            return roots[0]
+        key = filename.split('_')[0]  # Not a base32 character
+
+        def weight(root):
+            identity = VaultIndex.ids[root]
+            return hashlib.sha256((identity + '/' + key).encode()).digest()
+
+        return max(roots, key=weight)
+
+    @staticmethod
+    def _move_(engine, src, dst):
+        """Move the files of a database (maybe to another file system)"""
+        os.makedirs(os.path.dirname(dst), mode=0o700, exist_ok=True)
+        for filename in engine.files(src):
+            if os.path.exists(filename):
+                shutil.move(filename, dst + filename[len(src):])
+
+    # Extern methods
+
+    @staticmethod
+    def configure(path, directories):
+        """Set the data directories of the main directory"""
+        roots = [os.path.normpath(root) for root in directories]
+        ids = {root: VaultIndex._identity_(root) for root in roots}
+        with VaultIndex.lock:
+            VaultIndex.roots[path] = roots or [os.path.normpath(path)]
+            VaultIndex.ids.update(ids)
+            for key in [key for key in VaultIndex.names if key[0] == path]:
+                del VaultIndex.names[key]  # Reload
+
+    @staticmethod
+    def location(path, filename):
+        """Return the path of the database file (without suffix)"""
+        width = VaultIndex.width
+        directories = [filename[i * width:(i + 1) * width]
+                       for i in range(VaultIndex.levels)]
+        root = VaultIndex._root_(path, filename)
+        return '/'.join([root] + directories + [filename])
+
+    @staticmethod
+    def vaults(path, engine):
+        """Return the sorted names of databases stored by the engine"""
+        with VaultIndex.lock:
+            return sorted(VaultIndex._names_(path, engine))
+
+    @staticmethod
+    def exists(path, filename, engine):
+        """Test if the database exists"""
+        with VaultIndex.lock:
+            return filename in VaultIndex._names_(path, engine)
+
+    @staticmethod
+    def add(path, filename, engine):
+        """Register a new database"""
+        with VaultIndex.lock:
+            VaultIndex._names_(path, engine).add(filename)
+
+    @staticmethod
+    def discard(path, filename, engine):
+        """Unregister a deleted database"""
+        with VaultIndex.lock:
+            VaultIndex._names_(path, engine).discard(filename)
+
+    @staticmethod
+    def migrate(path):
+        """Move databases stored directly in a directory or in another data
+        directory than their own. Databases must be closed.
+        Return the number of databases moved."""
+        nbmoved = 0
+        with VaultIndex.lock:
+            directories = set([os.path.normpath(path)] +
+                              VaultIndex._roots_(path))
+            for root in sorted(directories):
+                if not os.path.isdir(root):
+                    continue  # New data directory
+                for directory in [root] + list(VaultIndex._directories_(root)):
+                    for engine in engines.values():
+                        for filename in engine.vaults(directory):
+                            dbfile = VaultIndex.location(path, filename)
+                            if directory + '/' + filename == dbfile:
+                                continue  # At its place
+                            VaultIndex._move_(engine,
+                                              directory + '/' + filename,
+                                              dbfile)
+                            nbmoved += 1
+            if nbmoved > 0:
+                for key in [key for key in VaultIndex.names if key[0] == path]:
+                    del VaultIndex.names[key]  # Reload
+        if nbmoved > 0:
+            logging.info('{} database(s) moved in the data directories of {}'
+                         .format(nbmoved, path))
+        return nbmoved
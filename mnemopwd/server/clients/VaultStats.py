@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2015-2017, Thierry Lemeunier <thierry at lemeunier dot net>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR
+# OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+Statistics of a database
+
+The statistics of a database (number of blocks, total size of serialized
+blocks and size of the largest block) are stored in the database itself as
+a named entry so they are given without reading any block. They are updated
+in the batch of each modification of a block. The entry keeps also the
+number of blocks of each size so the size of the largest block is updated
+without reading the other blocks when the largest one is removed.
+
+A database of an older version has no statistics: they are computed the
+first time they are needed.
+"""
+
+
+class VaultStats:
+    """
+    Statistics of a database
+
+    Attribute(s):
+    - key: the name of the named entry storing the statistics
+    - fields: the statistics given to a client of the class
+
+    Method(s):
+    - compute: compute the named entry from the sizes of blocks
+    - load: return the named entry of an opened vault
+    - public: return the statistics of a named entry
+    - update: update the statistics before a modification of a block
+    """
+
+    key = 'stats'  # Named entry
+    fields = ('count', 'bytes', 'largest')  # Without the sizes of blocks
+
+    # Extern methods
+
+    @staticmethod
+    def load(vault):
+        """Return the named entry of the opened vault (the statistics and
+        the number of blocks of each size)"""
+        try:
+            stats = dict(vault.get_meta(VaultStats.key))
+        except KeyError:
+            stats = {}
+        if 'sizes' not in stats:
+            # Database of an older version
+            stats = VaultStats.compute(
+                len(psib) for i, psib in vault.items_view())
+        return stats
+
+    @staticmethod
+    def compute(sizes):
+        """Compute the named entry from an iterable of block sizes"""
+        stats = {'count': 0, 'bytes': 0, 'largest': 0, 'sizes': {}}
+        for size in sizes:
+            stats['count'] += 1
+            stats['bytes'] += size
+            stats['largest'] = max(stats['largest'], size)
+            stats['sizes'][size] = stats['sizes'].get(size, 0) + 1
+        return stats
+
+    @staticmethod
+    def public(stats):
+        """Return the statistics of a named entry (a dictionary with
+        'count', 'bytes' and 'largest' keys)"""
+        return {field: stats[field] for field in VaultStats.fields}
+
+    @staticmethod
+    def update(vault, old=None, new=None):
+        """Update the statistics of the opened vault (in a batch) before
+        the modification of a block of size old (None if it is added) into
+        a block of size new (None if it is deleted)"""
+        stats = VaultStats.load(vault)
+        sizes = stats['sizes'] = dict(stats['sizes'])
+        if old is not None:
+            stats['count'] -= 1
+            stats['bytes'] -= old
+            sizes[old] -= 1
+            if sizes[old] == 0:
+                del sizes[old]
+                if old == stats['largest']:
+                    # The largest block is removed
+                    stats['largest'] = max(sizes, default=0)
+        if new is not None:
+            stats['count'] += 1
+            stats['bytes'] += new
+            stats['largest'] = max(stats['largest'], new)
+            sizes[new] = sizes.get(new, 0) + 1
+        vault.set_meta(VaultStats.key, stats)
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2015-2017, Thierry Lemeunier <thierry at lemeunier dot net>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR
+# OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+An in-memory tier of active databases shared by all sessions
+
+The blocks of a database are loaded in memory at login (the database becomes
+resident) then reads are served from memory without accessing the database
+file. Writes are done in the database file then in memory (write-through).
+
+A resident database is evicted when it is not accessed for a while (see the
+configuration option 'tieridle') or, the least recently used first, when
+the memory budget is exceeded (see the configuration option 'tiermb'). The
+size of a database is the size of its serialized blocks. Each eviction is
+logged with the statistics of the tier and of the block cache.
+
+Resident data of a database are read and written by a caller owning the
+lock of the database (shared lock for reading) so they are always the same
+as the database file.
+"""
+
+import collections
+import logging
+import threading
+import time
+
+from ...common.InfoBlock import InfoBlock
+from ..util.Configuration import Configuration
+from .SIBCache import SIBCache
+
+
+class VaultTier:
+    """
+    An in-memory tier of active databases
+
+    Attribute(s):
+    - vaults: an ordered dictionary of [blocks, size, last access time]
+              indexed by database file (the most recently used is the last);
+              blocks is a dictionary of (sib, serialized sib) indexed by
+              block index
+    - size: the number of bytes of resident databases
+    - hits, misses: the number of reads served from memory or not
+    - loads, evictions: the number of databases loaded and evicted
+    - lock: a lock to serialize tier accesses
+
+    Method(s):
+    - enabled: test if the tier is enabled by configuration
+    - resident: test if a database is resident
+    - load: make a database resident
+    - items, items_raw: return the blocks of a resident database or None
+    - put: write a block of a resident database
+    - drop: drop a block of a resident database
+    - evict: evict a database
+    - evict_idle: evict databases not accessed for a while
+    - stats: return the tier statistics
+    """
+
+    vaults = collections.OrderedDict()  # Resident databases
+    size = 0  # Bytes used
+    hits = 0  # Reads served from memory
+    misses = 0  # Reads of databases not resident
+    loads = 0  # Databases loaded
+    evictions = 0  # Databases evicted
+    lock = threading.Lock()  # Lock on the tier
+
+    # Intern methods
+
+    @staticmethod
+    def _evict_(database):
+        """Evict a database. The tier lock must be owned."""
+        blocks, size, last = VaultTier.vaults.pop(database)
+        VaultTier.size -= size
+        VaultTier.evictions += 1
+        logging.info('Database {} evicted from memory ({} bytes): '
+                     'tier {} block cache {}'
+                     .format(database, size, VaultTier._stats_(),
+                             SIBCache.stats()))
+
+    @staticmethod
+    def _stats_():
+        """Return the tier statistics. The tier lock must be owned."""
+        lookups = VaultTier.hits + VaultTier.misses
+        return {'hits': VaultTier.hits, 'misses': VaultTier.misses,
+                'hit_rate': round(VaultTier.hits / lookups, 3)
+                if lookups else 0.0,
+                'loads': VaultTier.loads,
+                'evictions': VaultTier.evictions,
+                'vaults': len(VaultTier.vaults), 'bytes': VaultTier.size}
+
+    @staticmethod
+    def _touch_(database):
+        """Return the entry of a database and update its access time or
+        return None if the database is not resident.
+        The tier lock must be owned."""
+        try:
+            entry = VaultTier.vaults[database]
+        except KeyError:
+            VaultTier.misses += 1
+            return None
+        VaultTier.hits += 1
+        entry[2] = time.time()
+        VaultTier.vaults.move_to_end(database)  # The most recently used
+        return entry
+
+    # Extern methods
+
+    @staticmethod
+    def enabled():
+        """Test if the tier is enabled"""
+        return Configuration.tiermb > 0
+
+    @staticmethod
+    def resident(database):
+        """Test if the database is resident"""
+        with VaultTier.lock:
+            return database in VaultTier.vaults
+
+    @staticmethod
+    def load(database, items_raw):
+        """Make the database resident from its (index, serialized sib).
+        Return False if the database is bigger than the memory budget."""
+        budget = Configuration.tiermb * 1024 * 1024
+        blocks, size = {}, 0
+        for index, psib in items_raw:
+            blocks[index] = (InfoBlock.decode(psib), psib)
+            size += len(psib)
+            if size > budget:
+                return False  # Too big
+        with VaultTier.lock:
+            if database in VaultTier.vaults:
+                VaultTier._evict_(database)  # Reload
+            while VaultTier.vaults and VaultTier.size + size > budget:
+                VaultTier._evict_(next(iter(VaultTier.vaults)))  # LRU
+            VaultTier.vaults[database] = [blocks, size, time.time()]
+            VaultTier.size += size
+            VaultTier.loads += 1
+        logging.debug('Database {} resident ({} bytes)'.format(database, size))
+        return True
+
+    @staticmethod
+    def items(database):
+        """Return the list of (index, sib) of a resident database in index
+        order (sibs are copies) or None if the database is not resident"""
+        with VaultTier.lock:
+            entry = VaultTier._touch_(database)
+            if entry is None:
+                return None
+            blocks = sorted(entry[0].items())
+        return [(i, SIBCache.copy(sib)) for i, (sib, psib) in blocks]
+
+    @staticmethod
+    def items_raw(database):
+        """Return the list of (index, serialized sib) of a resident database
+        in index order or None if the database is not resident"""
+        with VaultTier.lock:
+            entry = VaultTier._touch_(database)
+            if entry is None:
+                return None
+            return [(i, psib) for i, (sib, psib) in sorted(entry[0].items())]
+
+    @staticmethod
+    def put(database, index, psib):
+        """Write a block of a resident database (in its serialized form)"""
+        with VaultTier.lock:
+            if database not in VaultTier.vaults:
+                return  # Not resident
+        sib = InfoBlock.decode(psib)  # Without the KeyHandler of the session
+        budget = Configuration.tiermb * 1024 * 1024
+        with VaultTier.lock:
+            try:
+                entry = VaultTier.vaults[database]
+            except KeyError:
+                return  # Evicted
+            if index in entry[0]:
+                entry[1] -= len(entry[0][index][1])
+                VaultTier.size -= len(entry[0][index][1])
+            entry[0][index] = (sib, psib)
+            entry[1] += len(psib)
+            VaultTier.size += len(psib)
+            if entry[1] > budget:
+                VaultTier._evict_(database)  # Too big to stay resident
+            for other in list(VaultTier.vaults.keys()):  # LRU first
+                if VaultTier.size <= budget:
+                    break
+                if other != database:
+                    VaultTier._evict_(other)
+
+    @staticmethod
+    def drop(database, index):
+        """Drop a block of a resident database"""
+        with VaultTier.lock:
+            try:
+                sib, psib = VaultTier.vaults[database][0].pop(index)
+            except KeyError:
+                return  # Not resident
+            VaultTier.vaults[database][1] -= len(psib)
+            VaultTier.size -= len(psib)
+
+    @staticmethod
+    def evict(database):
+        """Evict a database (deleted or renamed for example)"""
+        with VaultTier.lock:
+            if database in VaultTier.vaults:
+                VaultTier._evict_(database)
+
+    @staticmethod
+    def evict_idle():
+        """Evict databases not accessed for a while"""
+        with VaultTier.lock:
+            limit = time.time() - Configuration.tieridle
+            for database in list(VaultTier.vaults.keys()):
+                if VaultTier.vaults[database][2] > limit:
+                    break  # Next ones are more recently used
+                VaultTier._evict_(database)
+
+    @staticmethod
+    def stats():
+        """Return the tier statistics (a dictionary)"""
+        with VaultTier.lock:
+            return VaultTier._stats_()
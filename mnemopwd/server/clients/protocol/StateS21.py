@@ -35,6 +35,7 @@ import logging
 from ...util.funcutils import singleton
 from .StateSCC import StateSCC
 from ..DBHandler import DBHandler
+from ..DBExecutor import DBExecutor
 
 
 @singleton
@@ -71,14 +72,20 @@ class StateS21(StateSCC):
 
                 # Test if login exists
                 filename = self.compute_client_filename(id, client.ms, login)
-                exist = DBHandler.exist(client.dbpath, filename)
+                exist = DBExecutor.call(DBHandler.exist, client.dbpath, filename)
 
                 # If login is OK and ids are equal
                 if id == id_from_client and exist:
                     client.dbH = DBHandler(client.dbpath, filename)
+                    # Keep database opened during session
+                    DBExecutor.call(client.dbH.open)
                     client.loop.call_soon_threadsafe(
                         client.transport.write, b'OK')
                     client.state = client.states['31']
+                    # Keep blocks in memory during session
+                    DBExecutor.spawn('Loading of database {}'
+                                     .format(client.dbH.database),
+                                     client.dbH.load)
 
                 # If login is unknown
                 elif id == id_from_client and not exist:
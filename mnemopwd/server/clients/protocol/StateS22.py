@@ -35,6 +35,7 @@ import logging
 from ...util.funcutils import singleton
 from .StateSCC import StateSCC
 from ..DBHandler import DBHandler
+from ..DBExecutor import DBExecutor
 
 
 @singleton
@@ -71,10 +72,12 @@ class StateS22(StateSCC):
 
                 # Try to create a new database
                 filename = self.compute_client_filename(id, client.ms, login)
-                result = DBHandler.new(client.dbpath, filename)
+                result = DBExecutor.call(DBHandler.new, client.dbpath, filename)
 
                 if result:
                     client.dbH = DBHandler(client.dbpath, filename)
+                    # Keep database opened during session
+                    DBExecutor.call(client.dbH.open)
                     client.loop.call_soon_threadsafe(
                         client.transport.write, b'OK')
                     client.state = client.states['31']  # Next state
@@ -35,7 +35,8 @@ from ...util.funcutils import singleton
 
 @singleton
 class StateS3:
-    """State S3 : select substate (S31, S32, S33, S34, S35, S36 or S37) """
+    """State S3 : select substate (S31, S32, S33, S34, S35, S36, S37 or
+    S38) """
         
     def do(self, client, data):
         """Action of the state S3: select a substate"""
@@ -47,6 +48,7 @@ class StateS3:
         is_cd_S35 = data[170:177] == b"ADDDATA"         # Test for S35 substate
         is_cd_S36 = data[170:180] == b"DELETEDATA"      # Test for S36 substate
         is_cd_S37 = data[170:180] == b"UPDATEDATA"      # Test for S37 substate
+        is_cd_S38 = data[170:180] == b"STATISTICS"      # Test for S38 substate
         
         if is_cd_S31:
             client.state = client.states['31']  # S31 is the new state
@@ -62,10 +64,13 @@ class StateS3:
             client.state = client.states['36']  # S36 is the new state
         if is_cd_S37:
             client.state = client.states['37']  # S38 is the new state
+        if is_cd_S38:
+            client.state = client.states['38']  # S38 is the new state
             
         if is_cd_S31 or is_cd_S32 or is_cd_S33 or is_cd_S34 or is_cd_S35 or \
-                is_cd_S36 or is_cd_S37:
-            # Schedule an execution of the new state
+                is_cd_S36 or is_cd_S37 or is_cd_S38:
+            # Schedule an execution of the new state (storage operations are
+            # handed to the storage executor by the state, see DBExecutor)
             client.loop.run_in_executor(None, client.state.do, client, data)
         else:
             # Schedule a callback to client exception handler
@@ -33,6 +33,7 @@ import logging
 
 from ...util.funcutils import singleton
 from .StateSCC import StateSCC
+from ..DBExecutor import DBExecutor
 
 
 @singleton
@@ -56,7 +57,8 @@ class StateS31(StateSCC):
                 config = client.ephecc.decrypt(econfig)  # Decrypting
 
                 # Try to configure client cryptographic handler
-                result = client.configure_crypto(config.decode())
+                result = DBExecutor.call(client.configure_crypto,
+                                         config.decode())
 
                 if result is False:
                     msg = b'ERROR;application protocol error'
@@ -73,7 +75,8 @@ class StateS31(StateSCC):
                             client.transport.write, msg)
 
                     if result == 2:
-                        if client.update_crypto():  # Re-do encryption
+                        # Re-do encryption
+                        if DBExecutor.call(client.update_crypto):
                             # Send result value
                             msg = b'OK;' + b'2'
                             client.loop.call_soon_threadsafe(
@@ -29,11 +29,11 @@
 State S32 : exportation operation
 """
 import logging
-import pickle
 import asyncio
 
 from ...util.funcutils import singleton
 from .StateSCC import StateSCC
+from ..DBExecutor import DBExecutor
 
 
 @singleton
@@ -53,20 +53,21 @@ class StateS32(StateSCC):
                 if not is_cd_S32:
                     raise Exception('S32 protocol error')
 
-                # Get all sibs
-                tabsibs = client.dbH.get_data(client.keyH)
+                # Get all sibs as they are stored (already serialized)
+                tabsibs = DBExecutor.call(client.dbH.get_raw_data)
 
                 # Send number of blocks
                 msg = b'OK;' + str(len(tabsibs)).encode()
                 client.loop.call_soon_threadsafe(client.transport.write, msg)
 
                 # Send sib one by one
-                for i, sib in tabsibs:
+                for i, psib in tabsibs:
                     si = str(i).encode()
-                    psib = pickle.dumps(sib)
                     lpsib = str(len(psib)).encode()
                     # Send message
                     msg = b';SIB;' + si + b';' + lpsib + b';' + psib
+                    if isinstance(psib, memoryview):
+                        psib.release()  # View of the database file
                     client.loop.call_soon_threadsafe(client.transport.write, msg)
                     # Wait for sending the message
                     coro = asyncio.sleep(0.005, loop=client.loop)
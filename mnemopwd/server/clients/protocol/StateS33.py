@@ -34,6 +34,7 @@ import logging
 from ...util.funcutils import singleton
 from .StateSCC import StateSCC
 from ..DBHandler import DBHandler
+from ..DBExecutor import DBExecutor
 
 
 @singleton
@@ -82,7 +83,8 @@ class StateS33(StateSCC):
                              .format(client.peername))
 
                 # If login is OK try to delete database file
-                result = DBHandler.delete(client.dbpath, filename)
+                result = DBExecutor.call(
+                    DBHandler.delete, client.dbpath, filename)
 
                 # If database file has been deleted close connection with client
                 if result:
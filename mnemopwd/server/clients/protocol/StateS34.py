@@ -27,14 +27,19 @@
 
 """
 State S34 : search data operation
+
+Matching blocks are sent as soon as they are found: 'OK' then each block
+(';SIB;index;length;block') then the end of results with the number of
+blocks sent (';END;number;').
 """
 
-import pickle
 import logging
 import asyncio
+import re
 
 from ...util.funcutils import singleton
 from .StateSCC import StateSCC
+from ..DBExecutor import DBExecutor
 
 
 @singleton
@@ -58,15 +63,26 @@ class StateS34(StateSCC):
                 pattern = client.ephecc.decrypt(epattern)  # Get search pattern
 
                 # Pattern matching
-                tabsibs = client.dbH.search_data(client.keyH, pattern.decode())
+                try:
+                    tabsibs = DBExecutor.call(
+                        client.dbH.search_data, client.keyH, pattern.decode(),
+                        client.fieldcache)
+                except re.error:
+                    # Not a fatal error: the session goes on
+                    msg = b'ERROR;invalid search pattern'
+                    client.loop.call_soon_threadsafe(client.transport.write, msg)
+                    client.state = client.states['3']  # New client state
+                    logging.info('Invalid search pattern from {}'
+                                 .format(client.peername))
+                    return
 
-                # Send number of blocks
-                msg = b'OK;' + str(len(tabsibs)).encode()
-                client.loop.call_soon_threadsafe(client.transport.write, msg)
+                # Search accepted
+                client.loop.call_soon_threadsafe(client.transport.write, b'OK')
 
+                nbsibs = 0  # Number of blocks sent
                 for i, sib in tabsibs:
                     si = str(i).encode()
-                    psib = pickle.dumps(sib)
+                    psib = sib.encode()
                     lpsib = str(len(psib)).encode()
                     # Send sib
                     msg = b';SIB;' + si + b';' + lpsib + b';' + psib
@@ -75,11 +91,16 @@ class StateS34(StateSCC):
                     coro = asyncio.sleep(0.005, loop=client.loop)
                     future = asyncio.run_coroutine_threadsafe(coro, client.loop)
                     future.result(1)
+                    nbsibs += 1
+
+                # Send end of results
+                msg = b';END;' + str(nbsibs).encode() + b';'
+                client.loop.call_soon_threadsafe(client.transport.write, msg)
 
                 client.state = client.states['3']  # New client state
 
                 logging.info('Searching blocks [{} found] from {}'
-                             .format(len(tabsibs), client.peername))
+                             .format(nbsibs, client.peername))
 
         except Exception as exc:
             # Schedule a callback to client exception handler
@@ -29,11 +29,13 @@
 State S35 : add data operation
 """
 
-import pickle
 import logging
 
+from ....common.InfoBlock import InfoBlock
+from ....common.SecretInfoBlock import SecretInfoBlock
 from ...util.funcutils import singleton
 from .StateSCC import StateSCC
+from ..DBExecutor import DBExecutor
 
 
 @singleton
@@ -52,13 +54,15 @@ class StateS35(StateSCC):
                 if not is_cd_S35:
                     raise Exception('S35 protocol error')
 
-                bsib = data[178:]  # A secret information block in pickle format
+                bsib = data[178:]  # A secret information block in binary format
 
                 try:
-                    sib = pickle.loads(bsib)  # A secret information block
+                    sib = InfoBlock.decode(bsib)  # A secret information block
+                    if not isinstance(sib, SecretInfoBlock):
+                        raise ValueError('not a secret information block')
                     sib.control_integrity(client.keyH)  # Configure + integrity
 
-                except AssertionError:
+                except (ValueError, AssertionError):
                     # Send an error message
                     msg = b'ERROR;application protocol error'
                     client.loop.call_soon_threadsafe(client.transport.write, msg)
@@ -66,7 +70,9 @@ class StateS35(StateSCC):
 
                 else:
                     # Add a secret information block
-                    index = client.dbH.add_data(sib)
+                    index = DBExecutor.call(
+                        client.dbH.add_data, sib, client.keyH)
+                    client.invalidate_fields(index)
                     # Send index value
                     msg = b'OK;' + (str(index)).encode()
                     client.loop.call_soon_threadsafe(client.transport.write, msg)
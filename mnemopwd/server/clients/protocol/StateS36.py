@@ -33,6 +33,7 @@ import logging
 
 from ...util.funcutils import singleton
 from .StateSCC import StateSCC
+from ..DBExecutor import DBExecutor
 
 
 @singleton
@@ -54,7 +55,8 @@ class StateS36(StateSCC):
                 index = data[181:].decode()  # sib index
 
                 # Delete a secret information block
-                result = client.dbH.delete_data(index)
+                result = DBExecutor.call(client.dbH.delete_data, index)
+                client.invalidate_fields(index)
 
                 if result:
                     # Send 'OK' message
@@ -29,11 +29,13 @@
 State S37 : update data operation
 """
 
-import pickle
 import logging
 
+from ....common.InfoBlock import InfoBlock
+from ....common.SecretInfoBlock import SecretInfoBlock
 from ...util.funcutils import singleton
 from .StateSCC import StateSCC
+from ..DBExecutor import DBExecutor
 
 
 @singleton
@@ -55,13 +57,15 @@ class StateS37(StateSCC):
                 protocol_data = data[181:].split(b';', maxsplit=1)
 
                 index = protocol_data[0].decode() # sib index
-                bsib = protocol_data[1] # sib in pickle encoding
+                bsib = protocol_data[1] # sib in binary format
 
                 try:
-                    sib = pickle.loads(bsib) # sib object
+                    sib = InfoBlock.decode(bsib) # sib object
+                    if not isinstance(sib, SecretInfoBlock):
+                        raise ValueError('not a secret information block')
                     sib.control_integrity(client.keyH)  # Configure + integrity
 
-                except AssertionError:
+                except (ValueError, AssertionError):
                     # Send an error message
                     msg = b'ERROR;application protocol error'
                     client.loop.call_soon_threadsafe(client.transport.write, msg)
@@ -69,7 +73,9 @@ class StateS37(StateSCC):
 
                 else:
                     # Update a secret information block
-                    result = client.dbH.update_data(index, sib)
+                    result = DBExecutor.call(
+                        client.dbH.update_data, index, sib, client.keyH)
+                    client.invalidate_fields(index)
 
                     if result:
                         # Send 'OK' message
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2015-2017, Thierry Lemeunier <thierry at lemeunier dot net>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR
+# OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+State S38 : statistics operation
+"""
+
+import logging
+
+from ...util.funcutils import singleton
+from .StateSCC import StateSCC
+from ..DBExecutor import DBExecutor
+
+
+@singleton
+class StateS38(StateSCC):
+    """State S38 : return the statistics of the database"""
+
+    def do(self, client, data):
+        """Action of the state S38: return the number of blocks, the size
+        of all blocks and the size of the largest block"""
+
+        try:
+            # Control challenge
+            if self.control_challenge(client, data, b'S38.4'):
+
+                # Test for S38 command
+                is_cd_S38 = data[170:180] == b"STATISTICS"
+                if not is_cd_S38:
+                    raise Exception('S38 protocol error')
+
+                # Get statistics (no block is read)
+                stats = DBExecutor.call(client.dbH.get_stats)
+
+                # Send statistics
+                msg = b'OK;' + str(stats['count']).encode() + b';' + \
+                    str(stats['bytes']).encode() + b';' + \
+                    str(stats['largest']).encode()
+                client.loop.call_soon_threadsafe(client.transport.write, msg)
+
+                client.state = client.states['3']  # New client state
+
+                logging.info('Statistics [{} blocks] to {}'
+                             .format(stats['count'], client.peername))
+
+        except Exception as exc:
+            # Schedule a callback to client exception handler
+            client.loop.call_soon_threadsafe(client.exception_handler, exc)
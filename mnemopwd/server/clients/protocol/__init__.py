@@ -40,10 +40,12 @@ from .StateS34 import StateS34
 from .StateS35 import StateS35
 from .StateS36 import StateS36
 from .StateS37 import StateS37
+from .StateS38 import StateS38
 
 __author__ = "Thierry Lemeunier <thierry at lemeunier dot net>"
 __date__ = "$6 oct. 2015 9:25:12$"
 
 __all__ = ['StateSCC', 'StateS0',  'StateS1C', 'StateS1S', 'StateS2',
            'StateS3', 'StateS21', 'StateS22', 'StateS31', 'StateS32',
-           'StateS33', 'StateS34', 'StateS35', 'StateS36', 'StateS37']
+           'StateS33', 'StateS34', 'StateS35', 'StateS36', 'StateS37',
+           'StateS38']
@@ -0,0 +1,388 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2015-2017, Thierry Lemeunier <thierry at lemeunier dot net>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR
+# OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Storage engine based on a log-structured file (append-only).
+
+Every modification appends a record to the vault file. A record is a header
+(operation, index, payload length, payload CRC32) followed by the payload:
+- PUT: the sib at the index (binary format);
+- DEL: the sib at the index is deleted (no payload);
+- META: a named entry (the pickled tuple (key, value));
+- UNMETA: a named entry is deleted (the key as payload);
+- SEQ: the last index used;
+- BEGIN and COMMIT: the limits of a batch of records.
+
+An in-memory offset index is rebuilt from the file when the vault is opened.
+A torn record at the end of the file (crash during a write) is discarded and
+so are the records of a batch without its COMMIT record.
+
+Replaced and deleted records are garbage: they are removed by a compaction
+that rewrites live records (in index order) in a new file.
+
+Full scans (exportation, search) read the sibs through a read-only memory
+map of the file: the payloads are memoryview slices of the map, never
+copied. Bytes already written are never modified (a compaction replaces the
+file, a rollback only truncates records written after the map) so slices
+stay valid after the lock is released. The map is closed at the end of the
+scan or, if the caller keeps slices, when the last one is released.
+"""
+
+import logging
+import mmap
+import os
+import pickle
+import struct
+import zlib
+
+from .StorageEngine import StorageEngine
+
+
+class LogEngine(StorageEngine):
+    """Storage engine based on an append-only log file"""
+
+    name = 'log'
+    suffix = '.vlog'
+    magic = b'MPWDLOG1'  # File format identifier
+    min_compaction_size = 65536  # Do not compact small files
+    record = struct.Struct('>BQII')  # Operation, index, length, crc32
+    PUT, DEL, META, UNMETA, SEQ, BEGIN, COMMIT = range(1, 8)  # Operations
+
+    # Intern methods
+
+    def __init__(self, dbfile, durability='group'):
+        """Open the log file and rebuild the offset index"""
+        StorageEngine.__init__(self, dbfile, durability)
+        self.file = open(dbfile + LogEngine.suffix, 'r+b')
+        self._load_()
+
+    def _load_(self):
+        """Rebuild the offset index from the log file"""
+        self.offsets = {}  # index -> (payload offset, payload length)
+        self.metas = {}  # key -> (value, record size)
+        self.last = 0  # Last index used
+        self.garbage = 0  # Number of bytes of dead records
+        self.seq = 0  # Size of the last SEQ record
+        self.file.seek(0)
+        data = self.file.read()
+        if data[:len(LogEngine.magic)] != LogEngine.magic:
+            raise ValueError('{} is not a log vault'.format(self.dbfile))
+        offset = len(LogEngine.magic)
+        batch = None  # Records of a batch not yet committed
+        while offset < len(data):
+            record = self._parse_(data, offset)
+            if record is None:
+                break  # Torn record
+            op, index, payload = record
+            if op == LogEngine.BEGIN:
+                batch, batch_start = [], offset
+            elif op == LogEngine.COMMIT and batch is not None:
+                for args in batch:
+                    self._apply_(*args)
+                batch = None
+            if batch is not None and op != LogEngine.BEGIN:
+                batch.append((op, index, payload, offset))
+            else:
+                self._apply_(op, index, payload, offset)
+            offset += LogEngine.record.size + len(payload)
+        if batch is not None:
+            offset = batch_start  # Uncommitted batch
+            self.garbage -= LogEngine.record.size  # Its BEGIN record
+        if offset < len(data):
+            # Forget the end of the file
+            logging.warning('Vault {} truncated at {} bytes'
+                            .format(self.dbfile, offset))
+            self.file.truncate(offset)
+        self.size = offset  # Size of the log file
+        self.file.seek(offset)
+
+    @staticmethod
+    def _parse_(data, offset):
+        """Return (operation, index, payload) of the record at the offset
+        or None if the record is not complete or corrupted"""
+        end = offset + LogEngine.record.size
+        if end > len(data):
+            return None
+        op, index, length, crc = LogEngine.record.unpack_from(data, offset)
+        payload = data[end:end + length]
+        if len(payload) != length or zlib.crc32(payload) != crc:
+            return None
+        return op, index, payload
+
+    def _apply_(self, op, index, payload, offset):
+        """Update the in-memory index with a record written at offset"""
+        size = LogEngine.record.size + len(payload)
+        if op == LogEngine.PUT:
+            if index in self.offsets:
+                self.garbage += LogEngine.record.size + self.offsets[index][1]
+            self.offsets[index] = (offset + LogEngine.record.size, len(payload))
+            self.last = max(self.last, index)
+        elif op == LogEngine.DEL:
+            old = self.offsets.pop(index)
+            self.garbage += LogEngine.record.size + old[1] + size
+        elif op == LogEngine.META:
+            key, value = pickle.loads(payload)
+            if key in self.metas:
+                self.garbage += self.metas[key][1]
+            self.metas[key] = (value, size)
+        elif op == LogEngine.UNMETA:
+            old = self.metas.pop(payload.decode())
+            self.garbage += old[1] + size
+        elif op == LogEngine.SEQ:
+            self.garbage += self.seq  # Only the last SEQ record is needed
+            self.seq = size
+            self.last = max(self.last, index)
+        elif op in (LogEngine.BEGIN, LogEngine.COMMIT):
+            self.garbage += size
+
+    def _append_(self, op, index, payload=b''):
+        """Append a record at the end of the log file"""
+        header = LogEngine.record.pack(op, index, len(payload),
+                                       zlib.crc32(payload))
+        self.file.write(header + payload)
+        if self.depth == 0:
+            self.file.flush()
+            if self.durability == 'commit':
+                os.fsync(self.file.fileno())
+        self._apply_(op, index, payload, self.size)
+        self.size += len(header) + len(payload)
+
+    def _pread_(self, length, offset):
+        """Read bytes of the log file (including records of a batch)"""
+        self.file.flush()
+        return os.pread(self.file.fileno(), length, offset)
+
+    def _read_(self, index):
+        """Return the payload of the sib at the index"""
+        offset, length = self.offsets[index]
+        return self._pread_(length, offset)
+
+    def _begin_(self):
+        """Start a batch"""
+        self.batch_start = self.size
+        self._append_(LogEngine.BEGIN, 0)
+
+    def _commit_(self):
+        """Write the COMMIT record of the batch"""
+        self._append_(LogEngine.COMMIT, 0)
+
+    def _rollback_(self):
+        """Forget records of the batch"""
+        self.file.flush()
+        self.file.truncate(self.batch_start)
+        self._load_()
+
+    # Vault files
+
+    @classmethod
+    def create(cls, dbfile):
+        """Create an empty log file"""
+        with open(dbfile + cls.suffix, 'xb') as file:
+            file.write(cls.magic)
+        cls._chmod_(dbfile)
+
+    @classmethod
+    def recover(cls, dbfile):
+        """Delete the new log file of an interrupted compaction (a torn
+        record or an uncommitted batch is discarded at opening)"""
+        try:
+            os.unlink(dbfile + cls.suffix + '.tmp')
+            return True
+        except FileNotFoundError:
+            return False
+
+    # Opened vault
+
+    def close(self):
+        """Flush and close the log file"""
+        self.file.close()
+
+    def sync(self):
+        """Flush and write the log file on disk"""
+        if self.file.closed:
+            StorageEngine.sync(self)
+        else:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def snapshot(self, dbfile):
+        """Start a point-in-time copy: the log file is append-only so its
+        actual size is enough (a compaction replaces the file but the opened
+        file descriptor still reads the old one)"""
+        self.file.flush()
+        fd = os.open(self.dbfile + LogEngine.suffix, os.O_RDONLY)
+        size = self.size
+
+        def copy():
+            try:
+                with open(dbfile + LogEngine.suffix, 'wb') as file:
+                    offset = 0
+                    while offset < size:
+                        data = os.pread(fd, min(size - offset, 1 << 20), offset)
+                        if not data:
+                            break
+                        file.write(data)
+                        offset += len(data)
+            finally:
+                os.close(fd)
+
+        return copy
+
+    def get_meta(self, key):
+        """Return a named entry"""
+        return self.metas[key][0]
+
+    def set_meta(self, key, value):
+        """Set a named entry"""
+        self._append_(LogEngine.META, 0, pickle.dumps((key, value)))
+
+    def del_meta(self, key):
+        """Delete a named entry"""
+        if key not in self.metas:
+            raise KeyError(key)
+        self._append_(LogEngine.UNMETA, 0, key.encode())
+
+    def meta_items(self):
+        """Iterate over (key, value) of named entries"""
+        for key in sorted(self.metas):
+            yield key, self.metas[key][0]
+
+    def add(self, sib):
+        """Add a sib and return its index"""
+        index = self.last + 1
+        self._append_(LogEngine.PUT, index, self.dumps(sib))
+        return index
+
+    def get(self, index):
+        """Return the sib at the index"""
+        return self.loads(self.get_raw(index))
+
+    def put(self, index, sib):
+        """Store a sib at the index"""
+        self._append_(LogEngine.PUT, int(index), self.dumps(sib))
+
+    def delete(self, index):
+        """Delete the sib at the index"""
+        index = int(index)
+        if index not in self.offsets:
+            raise KeyError(index)
+        self._append_(LogEngine.DEL, index)
+
+    def count(self):
+        """Return the number of sibs"""
+        return len(self.offsets)
+
+    def last_index(self):
+        """Return the last index used"""
+        return self.last
+
+    def set_last_index(self, index):
+        """Increase the last index used"""
+        if index > self.last:
+            self._append_(LogEngine.SEQ, index)
+
+    def indexes(self):
+        """Return the sorted list of indexes of sibs"""
+        return sorted(self.offsets)
+
+    def items(self):
+        """Iterate over (index, sib) in index order.
+        The log file is mapped only once."""
+        for index, psib in self.items_view():
+            yield index, self.loads(psib)
+
+    def get_raw(self, index):
+        """Return the serialized sib at the index"""
+        return self._read_(int(index))
+
+    def items_raw(self):
+        """Iterate over (index, serialized sib) in index order.
+        The log file is read only once."""
+        data = self._pread_(self.size, 0)
+        for index in sorted(self.offsets):
+            offset, length = self.offsets[index]
+            yield index, data[offset:offset + length]
+
+    def items_view(self):
+        """Iterate over (index, serialized sib) in index order. Serialized
+        sibs are memoryview slices of a read-only map of the log file.
+        During a batch (its records may be truncated) they are read."""
+        if self.depth > 0:
+            yield from self.items_raw()
+            return
+        self.file.flush()
+        mapped = mmap.mmap(self.file.fileno(), self.size,
+                           access=mmap.ACCESS_READ)
+        view = memoryview(mapped)
+        try:
+            for index in sorted(self.offsets):
+                offset, length = self.offsets[index]
+                yield index, view[offset:offset + length]
+        finally:
+            view.release()
+            try:
+                mapped.close()
+            except BufferError:
+                pass  # Slices kept by the caller: closed with the last one
+
+    def fragmentation(self):
+        """Return the ratio of dead records in the log file"""
+        if self.size < LogEngine.min_compaction_size:
+            return 0.0
+        return self.garbage / self.size
+
+    def compact(self):
+        """Rewrite live records in a new log file.
+        Return the number of bytes reclaimed."""
+        if self.depth > 0:
+            return 0  # Not during a batch
+        data = self._pread_(self.size, 0)
+        tmpfile = self.dbfile + LogEngine.suffix + '.tmp'
+        with open(tmpfile, 'wb') as file:
+            file.write(LogEngine.magic)
+            for key in sorted(self.metas):
+                payload = pickle.dumps((key, self.metas[key][0]))
+                file.write(LogEngine.record.pack(
+                    LogEngine.META, 0, len(payload), zlib.crc32(payload)))
+                file.write(payload)
+            for index in sorted(self.offsets):
+                offset, length = self.offsets[index]
+                payload = data[offset:offset + length]
+                file.write(LogEngine.record.pack(
+                    LogEngine.PUT, index, length, zlib.crc32(payload)))
+                file.write(payload)
+            file.write(LogEngine.record.pack(
+                LogEngine.SEQ, self.last, 0, zlib.crc32(b'')))
+            file.flush()
+            os.fsync(file.fileno())
+        os.chmod(tmpfile, os.stat(self.dbfile + LogEngine.suffix).st_mode)
+        os.replace(tmpfile, self.dbfile + LogEngine.suffix)
+        size = self.size
+        self.file.close()
+        self.file = open(self.dbfile + LogEngine.suffix, 'r+b')
+        self._load_()
+        return size - self.size
@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2015-2017, Thierry Lemeunier <thierry at lemeunier dot net>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR
+# OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Storage engine based on a SQLite database in WAL mode (see module sqlite3).
+
+Sibs are stored in the table 'sibs' with their index as integer primary key.
+The number of sibs and the last index used are not stored but derived from
+the table (the last index used is kept by the AUTOINCREMENT sequence).
+Named entries are stored in the table 'meta'.
+
+Sibs are stored in binary format, named entries in pickle format.
+
+Outside a batch each statement is committed at once (autocommit mode). A
+batch is a SQLite transaction. The WAL file is the journal: SQLite replays
+it when the database is opened after a crash. The durability option sets
+the synchronous mode of SQLite (FULL, NORMAL or OFF).
+
+Pages freed by deletions are kept in the database file (free list) until
+the database is compacted by the VACUUM command.
+"""
+
+import os
+import pickle
+import sqlite3
+
+from .StorageEngine import StorageEngine
+
+
+class SQLiteEngine(StorageEngine):
+    """Storage engine based on a SQLite database"""
+
+    name = 'sqlite'
+    suffix = '.sqlite'
+
+    # Intern methods
+
+    synchronous = {'commit': 'FULL', 'group': 'NORMAL', 'none': 'OFF'}
+
+    def __init__(self, dbfile, durability='group'):
+        """Open the database"""
+        StorageEngine.__init__(self, dbfile, durability)
+        self.db = SQLiteEngine._connect_(dbfile, durability)
+
+    @staticmethod
+    def _connect_(dbfile, durability='group'):
+        """Return a connection to the database"""
+        # The caller owns the vault lock so connection can be shared by threads
+        db = sqlite3.connect(dbfile + SQLiteEngine.suffix,
+                             check_same_thread=False, isolation_level=None)
+        db.execute('PRAGMA journal_mode=WAL')  # Concurrent readers
+        db.execute('PRAGMA synchronous={}'  # NORMAL is safe in WAL mode
+                   .format(SQLiteEngine.synchronous[durability]))
+        return db
+
+    def _begin_(self):
+        """Start a transaction"""
+        self.db.execute('BEGIN IMMEDIATE')
+
+    def _commit_(self):
+        """Commit the transaction"""
+        self.db.execute('COMMIT')
+
+    def _rollback_(self):
+        """Rollback the transaction"""
+        self.db.execute('ROLLBACK')
+
+    def _files_(self):
+        """Return the database and its WAL file"""
+        return [self.dbfile + self.suffix, self.dbfile + self.suffix + '-wal']
+
+    def _size_(self):
+        """Return the size of the database and its WAL file"""
+        size = 0
+        for filename in self._files_():
+            try:
+                size += os.path.getsize(filename)
+            except OSError:
+                pass
+        return size
+
+    # Vault files
+
+    @classmethod
+    def create(cls, dbfile):
+        """Create an empty database"""
+        db = SQLiteEngine._connect_(dbfile)
+        try:
+            db.execute('BEGIN')
+            db.execute('CREATE TABLE meta '
+                       '(key TEXT PRIMARY KEY, value BLOB NOT NULL)')
+            db.execute('CREATE TABLE sibs '
+                       '(idx INTEGER PRIMARY KEY AUTOINCREMENT, '
+                       'sib BLOB NOT NULL)')
+            db.execute('COMMIT')
+        finally:
+            db.close()
+        cls._chmod_(dbfile)
+
+    @classmethod
+    def remove(cls, dbfile):
+        """Delete the database and its WAL files"""
+        for suffix in ('-wal', '-shm'):
+            try:
+                os.unlink(dbfile + cls.suffix + suffix)
+            except FileNotFoundError:
+                pass
+        return super(SQLiteEngine, cls).remove(dbfile)
+
+    @classmethod
+    def files(cls, dbfile):
+        """Return the database and its WAL files"""
+        return [dbfile + cls.suffix + suffix for suffix in ('', '-wal', '-shm')]
+
+    @classmethod
+    def rename(cls, src, dst):
+        """Rename the database (both databases must be closed)"""
+        for suffix in ('-wal', '-shm'):
+            try:
+                os.unlink(dst + cls.suffix + suffix)  # Not a valid WAL file
+            except FileNotFoundError:
+                pass
+        super(SQLiteEngine, cls).rename(src, dst)
+
+    # Opened vault
+
+    def close(self):
+        """Close the database (the WAL file is checkpointed)"""
+        self.db.close()
+
+    def get_meta(self, key):
+        """Return a named entry"""
+        row = self.db.execute('SELECT value FROM meta WHERE key = ?',
+                              (key,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return pickle.loads(row[0])
+
+    def set_meta(self, key, value):
+        """Set a named entry"""
+        self.db.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)',
+                        (key, pickle.dumps(value)))
+
+    def del_meta(self, key):
+        """Delete a named entry"""
+        cursor = self.db.execute('DELETE FROM meta WHERE key = ?', (key,))
+        if cursor.rowcount == 0:
+            raise KeyError(key)
+
+    def meta_items(self):
+        """Iterate over (key, value) of named entries"""
+        rows = self.db.execute('SELECT key, value FROM meta ORDER BY key')
+        for key, value in rows.fetchall():
+            yield key, pickle.loads(value)
+
+    def add(self, sib):
+        """Add a sib and return its index"""
+        cursor = self.db.execute('INSERT INTO sibs (sib) VALUES (?)',
+                                 (self.dumps(sib),))
+        return cursor.lastrowid
+
+    def get(self, index):
+        """Return the sib at the index"""
+        return self.loads(self.get_raw(index))
+
+    def put(self, index, sib):
+        """Store a sib at the index"""
+        self.db.execute('INSERT OR REPLACE INTO sibs VALUES (?, ?)',
+                        (int(index), self.dumps(sib)))
+
+    def delete(self, index):
+        """Delete the sib at the index"""
+        cursor = self.db.execute('DELETE FROM sibs WHERE idx = ?',
+                                 (int(index),))
+        if cursor.rowcount == 0:
+            raise KeyError(index)
+
+    def count(self):
+        """Return the number of sibs"""
+        return self.db.execute('SELECT COUNT(*) FROM sibs').fetchone()[0]
+
+    def last_index(self):
+        """Return the last index used"""
+        row = self.db.execute(
+            "SELECT seq FROM sqlite_sequence WHERE name = 'sibs'").fetchone()
+        return 0 if row is None else row[0]
+
+    def set_last_index(self, index):
+        """Increase the last index used"""
+        if index > self.last_index():
+            self.begin()
+            try:
+                self.db.execute(
+                    "DELETE FROM sqlite_sequence WHERE name = 'sibs'")
+                self.db.execute(
+                    "INSERT INTO sqlite_sequence VALUES ('sibs', ?)", (index,))
+            except:
+                self.rollback()
+                raise
+            self.commit()
+
+    def indexes(self):
+        """Return the sorted list of indexes of sibs"""
+        rows = self.db.execute('SELECT idx FROM sibs ORDER BY idx')
+        return [row[0] for row in rows.fetchall()]
+
+    def items(self):
+        """Iterate over (index, sib) in index order"""
+        rows = self.db.execute('SELECT idx, sib FROM sibs ORDER BY idx')
+        for index, psib in rows.fetchall():
+            yield index, self.loads(psib)
+
+    def get_raw(self, index):
+        """Return the serialized sib at the index"""
+        row = self.db.execute('SELECT sib FROM sibs WHERE idx = ?',
+                              (int(index),)).fetchone()
+        if row is None:
+            raise KeyError(index)
+        return row[0]
+
+    def items_raw(self):
+        """Iterate over (index, serialized sib) in index order"""
+        rows = self.db.execute('SELECT idx, sib FROM sibs ORDER BY idx')
+        yield from rows.fetchall()
+
+    def snapshot(self, dbfile):
+        """Start a point-in-time copy: the copy is done by the SQLite backup
+        API in a read transaction (in WAL mode writers are not blocked)"""
+        source = self.dbfile + SQLiteEngine.suffix
+
+        def copy():
+            db = sqlite3.connect(source)
+            try:
+                db_dst = sqlite3.connect(dbfile + SQLiteEngine.suffix)
+                try:
+                    db.backup(db_dst)
+                finally:
+                    db_dst.close()
+            finally:
+                db.close()
+
+        return copy
+
+    def fragmentation(self):
+        """Return the ratio of free pages"""
+        pages = self.db.execute('PRAGMA page_count').fetchone()[0]
+        pagesize = self.db.execute('PRAGMA page_size').fetchone()[0]
+        if pages * pagesize < 65536:
+            return 0.0  # Not worth compacting
+        free = self.db.execute('PRAGMA freelist_count').fetchone()[0]
+        return free / pages
+
+    def compact(self):
+        """Rebuild the database (VACUUM command) then truncate the WAL file.
+        Return the number of bytes reclaimed."""
+        if self.depth > 0:
+            return 0  # Not during a batch
+        size = self._size_()
+        self.db.execute('VACUUM')
+        self.db.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        return max(size - self._size_(), 0)
@@ -0,0 +1,472 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2015-2017, Thierry Lemeunier <thierry at lemeunier dot net>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR
+# OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Storage engine based on a shelf object: a persistent dictionary stored in a
+database file (see module shelve for more explanations).
+
+Each shelf have at least one entry : 'index' for the last index used
+(must only be incremented). Each sib is stored in binary format with its
+index as key.
+
+An example of a shelve:
+    {
+        'index' : 5 (it means that the next entry will have 6 for index)
+        '1' : a sib
+        '2' : a sib
+        '4' : a sib (it means that a sib has been deleted before this entry)
+        '5' : a sib
+    }
+
+The set of live indexes is built from the keys of the shelf when it is
+opened (values are not loaded) so iterations never probe deleted indexes
+and the number of sibs is the size of the set. An old 'nbsibs' entry
+(number of sibs) is not maintained anymore and is ignored.
+
+A dbm file is not transactional so modifications are first written in a
+journal file (suffix '.journal'): a header (magic, length, CRC32) followed
+by records (key length, value length or -1 for a deletion, key, serialized
+value). The journal is deleted once the shelf is updated. A complete journal
+found when the shelf is opened is replayed, an incomplete one is ignored.
+
+A dbm file never releases the space of deleted or replaced values. The size
+of these values is counted since the shelf is opened to estimate the unused
+space; compaction copies the serialized values into a fresh file.
+
+The dbm module is dbm.ndbm if it is available, dbm.dumb otherwise (dbm.gnu
+is not used: its file has no suffix). The files of a shelf depend on it:
+'.db' (ndbm with Berkeley DB), '.pag' and '.dir' (other ndbm libraries) or
+'.dat', '.dir' and '.bak' (dumb). The first one is the data file.
+
+Several files can not be renamed at once so a renaming (to replace a vault
+by a new one) first writes the source path in a swap file (suffix '.swap')
+of the destination then moves the files, the data file first. An
+interrupted renaming is finished by recover.
+"""
+
+import logging
+import os
+import pickle
+import shelve
+import stat
+import struct
+import zlib
+
+try:
+    import dbm.ndbm as dbmodule
+    if dbmodule.library == 'Berkeley DB':
+        dbsuffixes = ('.db',)
+    else:
+        dbsuffixes = ('.pag', '.dir')
+except ImportError:
+    import dbm.dumb as dbmodule
+    dbsuffixes = ('.dat', '.dir', '.bak')
+
+from .StorageEngine import StorageEngine
+
+
+class ShelveEngine(StorageEngine):
+    """Storage engine based on a shelf object"""
+
+    name = 'shelve'
+    suffix = dbsuffixes[0]  # Data file suffix
+    suffixes = dbsuffixes  # Suffixes of the files of the dbm module
+    deleted = object()  # Marker of an entry deleted during a batch
+    journal = '.journal'  # Journal file suffix
+    swap = '.swap'  # Swap file suffix
+    magic = b'MPWDJNL1'  # Journal format identifier
+    header = struct.Struct('>QI')  # Length and crc32 of journal records
+    entry = struct.Struct('>Ii')  # Key length, value length (-1: deletion)
+
+    # Intern methods
+
+    def __init__(self, dbfile, durability='group'):
+        """Open the shelf and replay a complete journal"""
+        StorageEngine.__init__(self, dbfile, durability)
+        self.db = ShelveEngine._open_(dbfile, 'w')
+        self.pending = None  # Modifications of the batch in progress
+        self.garbage = 0  # Size of values deleted or replaced since opening
+        self._replay_()
+        self.live = set(int(key) for key in self.db.keys() if key.isdigit())
+
+    @staticmethod
+    def _open_(dbfile, flag):
+        """Open a shelf with the dbm module of the engine"""
+        return shelve.Shelf(dbmodule.open(dbfile, flag))
+
+    @classmethod
+    def _chmod_(cls, dbfile):
+        """Only the user can read and write the shelf files"""
+        for filename in cls._shelf_files_(dbfile):
+            if os.path.exists(filename):
+                os.chmod(filename, stat.S_IRUSR | stat.S_IWUSR)
+
+    @classmethod
+    def _shelf_files_(cls, dbfile):
+        """Return the files of the dbm module (the data file first)"""
+        return [dbfile + suffix for suffix in cls.suffixes]
+
+    @classmethod
+    def _swap_(cls, src, dst):
+        """Move the shelf files of src to dst (again if it is interrupted)
+        then delete the swap file"""
+        for suffix in cls.suffixes:
+            if os.path.exists(src + suffix):
+                os.replace(src + suffix, dst + suffix)
+        os.unlink(dst + cls.swap)
+
+    def _files_(self):
+        """Return the files of the opened shelf"""
+        return self._shelf_files_(self.dbfile)
+
+    def _begin_(self):
+        """Start a batch: modifications are kept in memory"""
+        self.pending = {}
+        self.live_saved = set(self.live)
+
+    def _commit_(self):
+        """Write modifications of the batch in the journal then in the
+        shelf. The journal is deleted when the shelf is synchronized."""
+        pending, self.pending = self.pending, None
+        entries = []
+        for key, value in sorted(pending.items()):
+            if value is not ShelveEngine.deleted:
+                value = pickle.dumps(value, self.db._protocol)
+            else:
+                value = None
+            entries.append((key.encode(self.db.keyencoding), value))
+        self._write_journal_(entries)
+        self._apply_(entries)
+        os.unlink(self.dbfile + ShelveEngine.journal)
+
+    def _write_journal_(self, entries):
+        """Write modifications in the journal file"""
+        records = bytearray()
+        for key, value in entries:
+            length = -1 if value is None else len(value)
+            records += ShelveEngine.entry.pack(len(key), length) + key
+            if value is not None:
+                records += value
+        with open(self.dbfile + ShelveEngine.journal, 'wb') as file:
+            file.write(ShelveEngine.magic)
+            file.write(ShelveEngine.header.pack(len(records),
+                                                zlib.crc32(records)))
+            file.write(records)
+            if self.durability == 'commit':
+                file.flush()
+                os.fsync(file.fileno())
+
+    def _read_journal_(self):
+        """Return the modifications of a complete journal file
+        or None if there is no journal or if it is incomplete"""
+        try:
+            with open(self.dbfile + ShelveEngine.journal, 'rb') as file:
+                data = file.read()
+        except FileNotFoundError:
+            return None
+        start = len(ShelveEngine.magic) + ShelveEngine.header.size
+        if data[:len(ShelveEngine.magic)] != ShelveEngine.magic or \
+                len(data) < start:
+            return []
+        length, crc = ShelveEngine.header.unpack_from(data,
+                                                      len(ShelveEngine.magic))
+        records = data[start:start + length]
+        if len(records) != length or zlib.crc32(records) != crc:
+            return []  # Incomplete journal: the commit did not happen
+        entries, offset = [], 0
+        while offset < length:
+            keylength, valuelength = \
+                ShelveEngine.entry.unpack_from(records, offset)
+            offset += ShelveEngine.entry.size
+            key = records[offset:offset + keylength]
+            offset += keylength
+            value = None
+            if valuelength >= 0:
+                value = records[offset:offset + valuelength]
+                offset += valuelength
+            entries.append((key, value))
+        return entries
+
+    def _replay_(self):
+        """Apply the modifications of a complete journal file"""
+        entries = self._read_journal_()
+        if entries is None:
+            return  # No interrupted commit
+        if entries:
+            logging.warning('Vault {}: journal replayed'.format(self.dbfile))
+            self._apply_(entries)
+        else:
+            logging.warning('Vault {}: incomplete journal ignored'
+                            .format(self.dbfile))
+        os.unlink(self.dbfile + ShelveEngine.journal)
+
+    def _apply_(self, entries):
+        """Write modifications in the shelf and synchronize it.
+        Replaced and deleted values are counted as unused space."""
+        for key, value in entries:
+            try:
+                self.garbage += len(self.db.dict[key])
+                if value is None:
+                    del self.db.dict[key]
+            except KeyError:
+                pass  # New entry or already deleted (replay)
+            if value is not None:
+                self.db.dict[key] = value
+        self._flush_()  # Before the journal is deleted
+        if self.durability == 'commit':
+            self.sync()
+
+    def _flush_(self):
+        """Write the buffers of the dbm module in the shelf files (dbm.ndbm
+        has no sync method: the shelf is closed then opened again)"""
+        sync = getattr(self.db.dict, 'sync', None)
+        if sync is not None:
+            sync()
+        else:
+            self.db.close()
+            self.db = ShelveEngine._open_(self.dbfile, 'w')
+
+    def _rollback_(self):
+        """Forget modifications of the batch"""
+        self.pending = None
+        self.live = self.live_saved
+
+    def _size_(self):
+        """Return the size of the shelf file"""
+        try:
+            return os.path.getsize(self.dbfile + ShelveEngine.suffix)
+        except OSError:
+            return 0
+
+    def _get_(self, key):
+        """Return an entry. Raise KeyError if it does not exist."""
+        if self.pending is not None and key in self.pending:
+            value = self.pending[key]
+            if value is ShelveEngine.deleted:
+                raise KeyError(key)
+            return value
+        return self.db[key]
+
+    def _set_(self, key, value):
+        """Set an entry (in a batch)"""
+        self.begin()
+        self.pending[key] = value
+        self.commit()
+
+    def _del_(self, key):
+        """Delete an entry (in a batch). Raise KeyError if it does not
+        exist."""
+        self._get_(key)  # Test if the entry exists
+        self.begin()
+        self.pending[key] = ShelveEngine.deleted
+        self.commit()
+
+    def _sib_(self, value):
+        """Return the sib from a value of the shelf (a sib object
+        before the vault is upgraded)"""
+        return self.loads(value) if isinstance(value, bytes) else value
+
+    # Vault files
+
+    @classmethod
+    def create(cls, dbfile):
+        """Create an empty shelf"""
+        with ShelveEngine._open_(dbfile, 'n') as db:
+            db['index'] = 0   # Last entry index
+        cls._chmod_(dbfile)
+
+    @classmethod
+    def remove(cls, dbfile):
+        """Delete the shelf files, its journal and its swap file"""
+        for filename in cls.files(dbfile)[1:]:
+            try:
+                os.unlink(filename)
+            except FileNotFoundError:
+                pass
+        return super(ShelveEngine, cls).remove(dbfile)
+
+    @classmethod
+    def rename(cls, src, dst):
+        """Rename the shelf files (both shelves must be closed). The source
+        is written in the swap file before any file is moved."""
+        for suffix in cls.suffixes:
+            if not os.path.exists(src + suffix) and \
+                    os.path.exists(dst + suffix):
+                os.unlink(dst + suffix)  # Optional file ('.bak' of dbm.dumb)
+        with open(dst + cls.swap, 'wb') as file:
+            file.write(os.path.relpath(src, os.path.dirname(dst)).encode())
+            file.flush()
+            os.fsync(file.fileno())
+        cls._swap_(src, dst)
+
+    @classmethod
+    def files(cls, dbfile):
+        """Return the shelf files, its journal and its swap file"""
+        return cls._shelf_files_(dbfile) + \
+            [dbfile + cls.journal, dbfile + cls.swap]
+
+    @classmethod
+    def recover(cls, dbfile):
+        """Finish an interrupted renaming to the vault then replay or
+        delete the journal of an interrupted commit"""
+        recovered = False
+        try:
+            with open(dbfile + cls.swap, 'rb') as file:
+                src = file.read().decode()
+        except FileNotFoundError:
+            pass
+        else:
+            cls._swap_(os.path.join(os.path.dirname(dbfile), src), dbfile)
+            logging.warning('Vault {}: interrupted renaming finished'
+                            .format(dbfile))
+            recovered = True
+        if os.path.exists(dbfile + cls.journal):
+            cls(dbfile).close()  # The journal is replayed at opening
+            recovered = True
+        return recovered
+
+    # Opened vault
+
+    def close(self):
+        """Flush and close the shelf"""
+        self.db.close()
+
+    def get_meta(self, key):
+        """Return a named entry"""
+        return self._get_(key)
+
+    def set_meta(self, key, value):
+        """Set a named entry"""
+        self._set_(key, value)
+
+    def del_meta(self, key):
+        """Delete a named entry"""
+        self._del_(key)
+
+    def meta_items(self):
+        """Iterate over (key, value) of named entries"""
+        keys = set(self.db.keys())
+        if self.pending is not None:
+            keys.update(self.pending.keys())
+        for key in sorted(keys):
+            if key not in ('nbsibs', 'index') and not key.isdigit():
+                try:
+                    yield key, self._get_(key)
+                except KeyError:
+                    continue  # Deleted during the batch
+
+    def add(self, sib):
+        """Add a sib and return its index"""
+        self.begin()
+        index = self._get_('index') + 1        # Increment the index
+        self._set_('index', index)             # Store the new index
+        self._set_(str(index), self.dumps(sib))  # Store the block
+        self.live.add(index)
+        self.commit()
+        return index
+
+    def get(self, index):
+        """Return the sib at the index"""
+        return self._sib_(self._get_(str(index)))
+
+    def put(self, index, sib):
+        """Store a sib at the index"""
+        index = int(index)
+        self.begin()
+        if index not in self.live:
+            self.set_last_index(index)
+            self.live.add(index)
+        self._set_(str(index), self.dumps(sib))
+        self.commit()
+
+    def delete(self, index):
+        """Delete the sib at the index"""
+        index = int(index)
+        if index not in self.live:
+            raise KeyError(index)
+        self._del_(str(index))
+        self.live.discard(index)
+
+    def count(self):
+        """Return the number of sibs"""
+        return len(self.live)
+
+    def last_index(self):
+        """Return the last index used"""
+        return self._get_('index')
+
+    def set_last_index(self, index):
+        """Increase the last index used"""
+        if index > self._get_('index'):
+            self._set_('index', index)
+
+    def indexes(self):
+        """Return the sorted list of indexes of sibs"""
+        return sorted(self.live)
+
+    def items(self):
+        """Iterate over (index, sib) in index order"""
+        for i in sorted(self.live):  # For all sibs
+            yield i, self._sib_(self._get_(str(i)))
+
+    def get_raw(self, index):
+        """Return the serialized sib at the index (the stored pickle of a
+        sib before the vault is upgraded: it is never pickled again)"""
+        key = str(index)
+        value = self._get_(key)
+        if isinstance(value, bytes):
+            return value
+        return self.db.dict[key.encode(self.db.keyencoding)]
+
+    def items_raw(self):
+        """Iterate over (index, serialized sib) in index order"""
+        for i in sorted(self.live):  # For all sibs
+            yield i, self.get_raw(i)
+
+    def fragmentation(self):
+        """Return the ratio of unused space (an estimation)"""
+        size = self._size_()
+        if size < 65536:
+            return 0.0  # Not worth compacting
+        return min(self.garbage / size, 1.0)
+
+    def compact(self):
+        """Copy the serialized values into a fresh shelf.
+        Return the number of bytes reclaimed."""
+        if self.depth > 0:
+            return 0  # Not during a batch
+        size = self._size_()
+        tmpfile = self.dbfile + '_compact'
+        with ShelveEngine._open_(tmpfile, 'n') as db:
+            for key in self.db.dict.keys():
+                db.dict[key] = self.db.dict[key]
+        self.db.close()
+        ShelveEngine._chmod_(tmpfile)
+        ShelveEngine.rename(tmpfile, self.dbfile)
+        self.db = ShelveEngine._open_(self.dbfile, 'w')
+        self.garbage = 0
+        return max(size - self._size_(), 0)
@@ -0,0 +1,329 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2015-2017, Thierry Lemeunier <thierry at lemeunier dot net>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR
+# OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Storage engine interface
+
+A storage engine stores the data of a client database (called a vault):
+- some named entries (for example 'config' for the cryptographic suite);
+- secret information blocks (sibs) indexed by a positive integer.
+
+The index of a new sib is always greater than the last index used even if
+the sib with the last index has been deleted.
+
+An engine object is an opened vault. Its methods do not control concurrent
+accesses: the caller must own the lock of the vault (see DBAccess class).
+Reading methods can be called by several threads owning the shared lock.
+
+Modifications can be grouped in a batch (begin then commit or rollback):
+they are all applied or none of them. Batches can be nested, only the
+outermost batch is committed.
+
+A committed batch survives a crash of the server. The durability option
+says when data are written on disk (fsync):
+- 'commit': at each commit (slow but a commit survives a power failure);
+- 'group': when the sync method is called, by a background thread for
+  several commits together (see DBSyncer class);
+- 'none': when the operating system decides.
+
+Sibs are stored in binary format (see InfoBlock class). Sibs of a vault in
+an older format are pickled until the vault is upgraded (see VaultFormat).
+"""
+
+import os
+import pickle
+import shutil
+import stat
+
+from ....common.InfoBlock import InfoBlock
+
+
+class StorageEngine:
+    """
+    Storage engine interface
+
+    Attribute(s):
+    - name: the engine name used in the configuration (class attribute)
+    - suffix: the suffix of the vault file (class attribute)
+    - dbfile: the vault path without suffix (instance attribute)
+    - durability: 'commit', 'group' or 'none' (instance attribute)
+    - depth: the number of nested batches in progress (instance attribute)
+
+    Method(s):
+    - create: a class method to create an empty vault
+    - exists: a class method to test if a vault exists
+    - remove: a class method to delete a vault
+    - rename: a class method to rename a vault (replacing the destination)
+    - vaults: a class method to list vault names of a directory
+    - files: a class method to list the files of a vault
+    - recover: a class method to finish or cancel an interrupted commit
+    - close: flush and close the vault
+    - sync: write committed data on disk
+    - snapshot: start a point-in-time copy of the vault
+    - begin, commit, rollback: batch of modifications
+    - get_meta, set_meta, del_meta, meta_items: named entries access
+    - add: add a sib and return its index
+    - get: get the sib at an index
+    - put: store a sib at an index
+    - delete: delete the sib at an index
+    - count: return the number of sibs
+    - last_index: return the last index used
+    - set_last_index: increase the last index used
+    - indexes: return the sorted list of indexes of sibs
+    - items: iterate over (index, sib) in index order
+    - get_raw, items_raw: same as get and items but sibs are returned in
+      their serialized form (binary format)
+    - items_view: same as items_raw but serialized sibs may be read-only
+      views of the vault file (no copy)
+    - dumps, loads: static methods to serialize and restore a sib
+    - fragmentation: return the ratio of unused space in the vault file
+    - compact: rewrite the vault file without unused space
+    """
+
+    name = None  # Engine name
+    suffix = None  # Vault file suffix
+
+    # Intern methods
+
+    def __init__(self, dbfile, durability='group'):
+        """Open the vault"""
+        self.dbfile = dbfile
+        self.durability = durability
+        self.depth = 0  # No batch in progress
+
+    @classmethod
+    def _chmod_(cls, dbfile):
+        """Only the user can read and write the vault file"""
+        os.chmod(dbfile + cls.suffix,
+                 stat.S_IRUSR | stat.S_IWUSR | stat.S_IREAD | stat.S_IWRITE)
+
+    @staticmethod
+    def dumps(sib):
+        """Return the sib in binary format (a sib already in binary format
+        is returned as is)"""
+        if isinstance(sib, bytes):
+            return sib
+        return sib.encode()
+
+    @staticmethod
+    def loads(psib):
+        """Return the sib from its serialized form (a pickled sib is
+        accepted before the vault is upgraded)"""
+        if psib[:1] == b'\x80':
+            return pickle.loads(psib)
+        return InfoBlock.decode(psib)
+
+    @staticmethod
+    def _fsync_(filename):
+        """Write data of a file on disk"""
+        try:
+            fd = os.open(filename, os.O_RDONLY)
+        except FileNotFoundError:
+            return  # Deleted or renamed
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _files_(self):
+        """Return the files of the opened vault"""
+        return [self.dbfile + self.suffix]
+
+    def _begin_(self):
+        """Start the outermost batch"""
+        raise NotImplementedError()
+
+    def _commit_(self):
+        """Apply modifications of the outermost batch"""
+        raise NotImplementedError()
+
+    def _rollback_(self):
+        """Forget modifications of the outermost batch"""
+        raise NotImplementedError()
+
+    # Vault files
+
+    @classmethod
+    def create(cls, dbfile):
+        """Create an empty vault"""
+        raise NotImplementedError()
+
+    @classmethod
+    def exists(cls, dbfile):
+        """Test if the vault exists"""
+        return os.path.exists(dbfile + cls.suffix)
+
+    @classmethod
+    def remove(cls, dbfile):
+        """Delete the vault. Return True if the vault does not exist anymore."""
+        os.unlink(dbfile + cls.suffix)
+        return not cls.exists(dbfile)
+
+    @classmethod
+    def rename(cls, src, dst):
+        """Rename the vault src to dst (dst is replaced if it exists)"""
+        os.rename(src + cls.suffix, dst + cls.suffix)
+
+    @classmethod
+    def vaults(cls, path):
+        """Return the names of vaults stored in the directory"""
+        return [name[:-len(cls.suffix)] for name in os.listdir(path)
+                if name.endswith(cls.suffix)]
+
+    @classmethod
+    def files(cls, dbfile):
+        """Return the files of the vault (some of them may not exist)"""
+        return [dbfile + cls.suffix]
+
+    @classmethod
+    def recover(cls, dbfile):
+        """Finish or cancel a commit interrupted by a crash.
+        Return True if something was done."""
+        return False
+
+    # Opened vault
+
+    def close(self):
+        """Flush and close the vault"""
+        raise NotImplementedError()
+
+    def sync(self):
+        """Write committed data on disk"""
+        for filename in self._files_():
+            StorageEngine._fsync_(filename)
+
+    def snapshot(self, dbfile):
+        """Start a point-in-time copy of the vault to another vault path.
+        The caller owns the lock of the vault during this call. Return a
+        function finishing the copy (called without the lock). By default
+        files are copied to dbfile during this call: they are streamed by
+        chunks, never read in memory at once."""
+        for filename in self._files_():
+            try:
+                shutil.copyfile(filename, dbfile + filename[len(self.dbfile):])
+            except FileNotFoundError:
+                pass
+        return lambda: None
+
+    def begin(self):
+        """Start a batch of modifications"""
+        self.depth += 1
+        if self.depth == 1:
+            self._begin_()
+
+    def commit(self):
+        """End a batch of modifications"""
+        if self.depth > 0:
+            self.depth -= 1
+            if self.depth == 0:
+                self._commit_()
+
+    def rollback(self):
+        """Forget all modifications of the batches in progress"""
+        if self.depth > 0:
+            self.depth = 0
+            self._rollback_()
+
+    def get_meta(self, key):
+        """Return a named entry. Raise KeyError if it does not exist."""
+        raise NotImplementedError()
+
+    def set_meta(self, key, value):
+        """Set a named entry"""
+        raise NotImplementedError()
+
+    def del_meta(self, key):
+        """Delete a named entry. Raise KeyError if it does not exist."""
+        raise NotImplementedError()
+
+    def meta_items(self):
+        """Iterate over (key, value) of named entries"""
+        raise NotImplementedError()
+
+    def add(self, sib):
+        """Add a sib (or a serialized sib) with a new index and return the
+        index (an integer)"""
+        raise NotImplementedError()
+
+    def get(self, index):
+        """Return the sib at the index. Raise KeyError if it does not exist."""
+        raise NotImplementedError()
+
+    def put(self, index, sib):
+        """Store a sib (or a serialized sib) at the index (replacing the
+        existing one)"""
+        raise NotImplementedError()
+
+    def delete(self, index):
+        """Delete the sib at the index. Raise KeyError if it does not exist."""
+        raise NotImplementedError()
+
+    def count(self):
+        """Return the number of sibs"""
+        raise NotImplementedError()
+
+    def last_index(self):
+        """Return the last index used"""
+        raise NotImplementedError()
+
+    def set_last_index(self, index):
+        """Set the last index used if it is greater than the actual one"""
+        raise NotImplementedError()
+
+    def indexes(self):
+        """Return the sorted list of indexes of sibs"""
+        raise NotImplementedError()
+
+    def items(self):
+        """Iterate over (index, sib) in index order"""
+        raise NotImplementedError()
+
+    def get_raw(self, index):
+        """Return the serialized sib at the index.
+        Raise KeyError if it does not exist."""
+        raise NotImplementedError()
+
+    def items_raw(self):
+        """Iterate over (index, serialized sib) in index order"""
+        raise NotImplementedError()
+
+    def items_view(self):
+        """Iterate over (index, serialized sib) in index order. Serialized
+        sibs are bytes-like objects (bytes or read-only memoryview) still
+        valid when the lock is released. A caller keeping memoryview objects
+        should release them as soon as possible (the file may stay mapped
+        until then). By default they are read."""
+        return self.items_raw()
+
+    def fragmentation(self):
+        """Return the ratio of unused space in the vault file (0.0 if the
+        engine can not reclaim space)"""
+        return 0.0
+
+    def compact(self):
+        """Rewrite the vault file. Return the number of bytes reclaimed."""
+        return 0
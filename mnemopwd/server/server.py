@@ -27,12 +27,27 @@
 
 import logging
 import asyncio
+import os
+import signal
 import socket
 import ssl
-import concurrent.futures
+import threading
 from .util.Configuration import Configuration
+from .util.MeteredExecutor import MeteredExecutor
 from .clients.BruteForceShield import BruteForceShield
 from .clients.ClientHandler import ClientHandler
+from .clients.DBAccess import DBAccess
+from .clients.DBBackup import DBBackup
+from .clients.DBCompactor import DBCompactor
+from .clients.DBExecutor import DBExecutor
+from .clients.DBHandler import DBHandler
+from .clients.DBMigrator import DBMigrator
+from .clients.DBPool import DBPool
+from .clients.DBSearcher import DBSearcher
+from .clients.DBSyncer import DBSyncer
+from .clients.SIBCache import SIBCache
+from .clients.VaultIndex import VaultIndex
+from .clients.VaultTier import VaultTier
 
 """
 Server part of Mnemopwd application.
@@ -47,10 +62,14 @@ class Server:
     Attribute(s):
     - loop : an i/o asynchronous loop (see the official python asyncio module)
     - server : a SSL/TLS asynchronous socket server (see the python ssl module)
+    - executor : the default executor (protocol and cryptographic operations)
     
     Method(s):
     - start : start the server
     - stop : close the server
+    - compact : compact all database files in background (on SIGUSR1)
+    - backup : back up all database files in background (on SIGUSR2)
+    - statistics : log the statistics of pools, caches and locks periodically
     """
     
     # Intern methods
@@ -67,9 +86,22 @@ class Server:
         self.loop = asyncio.get_event_loop()
         self.loop.set_debug(Configuration.loglevel == 'DEBUG')
         
-        # Create and set an executor
-        executor = concurrent.futures.ThreadPoolExecutor(Configuration.poolsize)
-        self.loop.set_default_executor(executor)
+        # Create and set an executor (storage operations have their own
+        # executor, see DBExecutor class)
+        self.executor = MeteredExecutor(Configuration.poolsize, 'protocol')
+        self.loop.set_default_executor(self.executor)
+
+        # Move databases to their place then index them
+        VaultIndex.configure(Configuration.dbpath, Configuration.datapaths)
+        VaultIndex.migrate(Configuration.dbpath)
+        VaultIndex.vaults(Configuration.dbpath, DBHandler.engine_class())
+
+        # Recover databases after a crash
+        DBHandler.recover(Configuration.dbpath)
+
+        # Upgrade the format of idle databases in background
+        if Configuration.format_sweeper:
+            DBMigrator.start(Configuration.dbpath)
 
         # Create a brute-force shield
         shield = BruteForceShield()
@@ -98,6 +130,21 @@ class Server:
             Configuration.host, Configuration.port, family=socket.AF_INET,
             backlog=100, ssl=context, reuse_address=False)
         self.server = self.loop.run_until_complete(coro)
+
+        # Compaction and backup requested by an administrator (see serverctl)
+        self.loop.add_signal_handler(signal.SIGUSR1, self.compact)
+        self.loop.add_signal_handler(signal.SIGUSR2, self.backup)
+
+        # Statistics of pools, caches and locks during the service
+        if Configuration.statsperiod > 0:
+            self.loop.call_later(Configuration.statsperiod, self.statistics)
+
+    def _log_stats_(self, executor_stats):
+        """Log the statistics of caches, locks and executors"""
+        logging.info("Block cache statistics: {}".format(SIBCache.stats()))
+        logging.info("Memory tier statistics: {}".format(VaultTier.stats()))
+        logging.info("Lock statistics: {}".format(DBAccess.stats()))
+        logging.info("Executor statistics: {} {} {}".format(*executor_stats))
         
     # Extern methods
     
@@ -117,4 +164,32 @@ class Server:
         if self.loop.is_running():
             self.loop.run_until_complete(self.server.wait_closed())
         self.loop.close()
+        # Wait for storage operations in progress
+        executor_stats = (self.executor.stats(), DBExecutor.shutdown(),
+                          DBSearcher.shutdown())
+        DBSyncer.sync_all()  # Last group commit
+        DBPool.close_all()  # Flush and close all database files
+        self._log_stats_(executor_stats)
         logging.info("Server closed")
+
+    def compact(self):
+        """Schedule the compaction of all database files"""
+        logging.info("Compaction of all database files requested")
+        engine = DBHandler.engine_class()
+        for filename in VaultIndex.vaults(Configuration.dbpath, engine):
+            DBCompactor.schedule(DBHandler(Configuration.dbpath, filename))
+
+    def backup(self):
+        """Back up all database files in a background thread"""
+        logging.info("Backup of all database files requested")
+        os.makedirs(Configuration.backuppath, mode=0o700, exist_ok=True)
+        threading.Thread(target=DBBackup.backup, daemon=True,
+                         args=(Configuration.dbpath,
+                               Configuration.backuppath)).start()
+
+    def statistics(self):
+        """Log the statistics of pools, caches and locks then schedule
+        the next log"""
+        self._log_stats_((self.executor.stats(), DBExecutor.stats(),
+                          DBSearcher.stats()))
+        self.loop.call_later(Configuration.statsperiod, self.statistics)
@@ -58,6 +58,8 @@ class MyParserAction(argparse.Action):
             Configuration.poolsize = values
         if option_string in ['-d', '--dbpath']:
             Configuration.dbpath = values
+        if option_string in ['-b', '--bulkpath']:
+            Configuration.bulkpath = values
         if option_string in ['-c', '--cert']:
             Configuration.certfile = values
         if option_string in ['-k', '--key']:
@@ -79,6 +81,9 @@ class Configuration:
     dbpath = os.path.expanduser('~') + '/mnemopwddata'  # Default database path
     pidfile = os.path.expanduser('~') + '/mnemopwddata/mnemopwds.pid'  # Default daemon pid file
     logfile = os.path.expanduser('~') + '/mnemopwddata/mnemopwds.log'  # Default log file
+    backuppath = os.path.expanduser('~') + '/mnemopwdbackup'  # Default backup path
+    bulkpath = os.path.expanduser('~') + '/mnemopwddump'  # Default dump path
+    datapaths = []  # Default data directories (dbpath if empty)
     certfile = 'None'  # Default certificate X509 file
     keyfile = 'None'  # Default certificate private key file
     logmaxmb = 1  # Default logfile volume (1 => 1 MBytes)
@@ -90,7 +95,22 @@ class Configuration:
     port_min = 49152  # Minimum port value
     port_max = 65535  # Maximum port value
     poolsize = 10  # Default pool executor size
+    iopoolsize = 10  # Default storage pool executor size
+    searchpoolsize = 4  # Default search pool executor size
+    dbpoolsize = 100  # Default maximum number of opened database files
+    dbidle = 300  # Default delay (in seconds) before closing an idle database
+    storage = 'shelve'  # Default storage engine
+    compaction_ratio = 0.5  # Default unused space ratio before compaction
+    cachemb = 32  # Default memory budget of the block cache (in MBytes)
+    tiermb = 64  # Default memory budget of resident databases (in MBytes)
+    tieridle = 600  # Default delay (in seconds) before evicting a database
+    sessioncachekb = 0  # Default budget of decrypted information per session
+    durability = 'group'  # Default durability of commits
+    group_commit_ms = 100  # Default delay (in ms) between two group commits
+    format_sweeper = False  # Default upgrade of idle databases at start
+    statsperiod = 600  # Default delay (in seconds) between two statistics logs
     search_mode = 'all'  # Default search mode
+    blind_index = False  # Default blind index of blocks for searches
     max_login = 5  # Default maximum login attempts per hour
     action = 'status'  # Default action if not given
 
@@ -169,10 +189,44 @@ class Configuration:
             Configuration.port = int(fileparser['server']['port'])
             Configuration.host = fileparser['server']['host']
             Configuration.dbpath = fileparser['server']['dbpath']
+            Configuration.backuppath = fileparser['server'].get(
+                'backuppath', fallback=Configuration.backuppath)
+            Configuration.datapaths = fileparser['server'].get(
+                'datapaths', fallback='').split()
             Configuration.certfile = fileparser['server']['certfile']
             Configuration.keyfile = fileparser['server']['keyfile']
             Configuration.poolsize = int(fileparser['server']['poolsize'])
+            Configuration.iopoolsize = fileparser['server'].getint(
+                'iopoolsize', fallback=Configuration.iopoolsize)
+            Configuration.searchpoolsize = fileparser['server'].getint(
+                'searchpoolsize', fallback=Configuration.searchpoolsize)
+            Configuration.dbpoolsize = fileparser['server'].getint(
+                'dbpoolsize', fallback=Configuration.dbpoolsize)
+            Configuration.dbidle = fileparser['server'].getint(
+                'dbidle', fallback=Configuration.dbidle)
             Configuration.search_mode = fileparser['server']['search_mode']
+            Configuration.blind_index = fileparser['server'].getboolean(
+                'blind_index', fallback=Configuration.blind_index)
+            Configuration.storage = fileparser['server'].get(
+                'storage', fallback=Configuration.storage)
+            Configuration.compaction_ratio = fileparser['server'].getfloat(
+                'compaction_ratio', fallback=Configuration.compaction_ratio)
+            Configuration.cachemb = fileparser['server'].getint(
+                'cachemb', fallback=Configuration.cachemb)
+            Configuration.tiermb = fileparser['server'].getint(
+                'tiermb', fallback=Configuration.tiermb)
+            Configuration.tieridle = fileparser['server'].getint(
+                'tieridle', fallback=Configuration.tieridle)
+            Configuration.sessioncachekb = fileparser['server'].getint(
+                'sessioncachekb', fallback=Configuration.sessioncachekb)
+            Configuration.durability = fileparser['server'].get(
+                'durability', fallback=Configuration.durability)
+            Configuration.group_commit_ms = fileparser['server'].getint(
+                'group_commit_ms', fallback=Configuration.group_commit_ms)
+            Configuration.format_sweeper = fileparser['server'].getboolean(
+                'format_sweeper', fallback=Configuration.format_sweeper)
+            Configuration.statsperiod = fileparser['server'].getint(
+                'statsperiod', fallback=Configuration.statsperiod)
             Configuration.loglevel = fileparser['server']['loglevel']
             Configuration.max_login = int(fileparser['server']['max_login'])
             Configuration.pidfile = fileparser['daemon']['pidfile']
@@ -189,11 +243,47 @@ class Configuration:
             + "..." + str(Configuration.port_max),
             'host': Configuration.host + " # IP server",
             'dbpath': Configuration.dbpath + " # Use an absolute path",
+            'backuppath': Configuration.backuppath + " # Use an absolute path",
+            'datapaths': ' '.join(Configuration.datapaths)
+            + " # Data directories (absolute paths separated by spaces)"
+            + " or nothing to use dbpath",
             'certfile': Configuration.certfile + " # Use an absolute path",
             'keyfile': Configuration.keyfile + " # Use an absolute path",
             'poolsize': str(Configuration.poolsize) + " # Number of thread",
+            'iopoolsize': str(Configuration.iopoolsize)
+            + " # Number of thread for storage operations",
+            'searchpoolsize': str(Configuration.searchpoolsize)
+            + " # Number of thread for searching a database (1 to disable)",
+            'dbpoolsize': str(Configuration.dbpoolsize)
+            + " # Maximum number of opened database files",
+            'dbidle': str(Configuration.dbidle)
+            + " # Delay in seconds before closing an idle database file",
             'search_mode': Configuration.search_mode
             + " # Values allowed: all first",
+            'blind_index': str(Configuration.blind_index)
+            + " # Skip blocks that can not match a search (True False)",
+            'storage': Configuration.storage
+            + " # Values allowed: shelve sqlite log",
+            'compaction_ratio': str(Configuration.compaction_ratio)
+            + " # Unused space ratio of a database file before compaction",
+            'cachemb': str(Configuration.cachemb)
+            + " # Memory budget of the block cache in MBytes (0 to disable)",
+            'tiermb': str(Configuration.tiermb)
+            + " # Memory budget of resident databases in MBytes (0 to disable)",
+            'tieridle': str(Configuration.tieridle)
+            + " # Delay in seconds before evicting an idle resident database",
+            'sessioncachekb': str(Configuration.sessioncachekb)
+            + " # Memory budget of decrypted information of a session in KBytes"
+            + " (0 to disable)",
+            'durability': Configuration.durability
+            + " # Values allowed: commit group none",
+            'group_commit_ms': str(Configuration.group_commit_ms)
+            + " # Delay in ms between two group commits",
+            'format_sweeper': str(Configuration.format_sweeper)
+            + " # Upgrade idle databases to the new format at start (True False)",
+            'statsperiod': str(Configuration.statsperiod)
+            + " # Delay in seconds between two logs of statistics"
+            + " (0 to disable)",
             'loglevel': Configuration.loglevel
             + " # Values allowed: DEBUG INFO WARNING ERROR CRITICAL",
             'max_login': str(Configuration.max_login)
@@ -243,6 +333,13 @@ class Configuration:
             exists only the user must have read, write and execution permissions",
             action=MyParserAction)
 
+        # Dump directory
+        argparser.add_argument(
+            '-b', '--bulkpath', nargs='?', default=Configuration.bulkpath,
+            metavar='path', type=str, help="the directory of dump files \
+            written by the dump action and read by the load action",
+            action=MyParserAction)
+
         # Certificat file
         argparser.add_argument(
             '-c', '--cert', nargs='?', default=Configuration.certfile,
@@ -283,6 +380,44 @@ class Configuration:
             '--status', action='store_const', const='status', dest='action',
             default=Configuration.action, help='get server status')
 
+        # Convert action
+        argparser.add_argument(
+            '--convert', action='store_const', const='convert', dest='action',
+            default=Configuration.action,
+            help='convert shelve databases to the configured storage engine')
+
+        # Compact action
+        argparser.add_argument(
+            '--compact', action='store_const', const='compact', dest='action',
+            default=Configuration.action,
+            help='compact database files (online if the server is running)')
+
+        # Rebalance action
+        argparser.add_argument(
+            '--rebalance', action='store_const', const='rebalance',
+            dest='action', default=Configuration.action,
+            help='move databases to their data directory (after adding a '
+                 'data directory for example)')
+
+        # Backup action
+        argparser.add_argument(
+            '--backup', action='store_const', const='backup', dest='action',
+            default=Configuration.action,
+            help='copy databases in a new directory of the backup directory '
+                 '(online if the server is running)')
+
+        # Dump action
+        argparser.add_argument(
+            '--dump', action='store_const', const='dump', dest='action',
+            default=Configuration.action,
+            help='write all databases in dump files of the dump directory')
+
+        # Load action
+        argparser.add_argument(
+            '--load', action='store_const', const='load', dest='action',
+            default=Configuration.action,
+            help='create databases from the dump files of the dump directory')
+
         # Program version
         argparser.add_argument(
             '-v', '--version', action='version',
@@ -302,8 +437,25 @@ class Configuration:
         options = argparser.parse_args()
         Configuration.action = options.action  # Action to apply to the server
 
-        # Verify dbpath
+        # Verify dbpath and data directories
         Configuration.__test_dbpath__(argparser, Configuration.dbpath)
+        for path in Configuration.datapaths:
+            Configuration.__test_dbpath__(argparser, path)
+
+        # Verify storage engine
+        if Configuration.storage not in ['shelve', 'sqlite', 'log']:
+            argparser.error("invalid storage engine {} (choose shelve, sqlite or log)"
+                            .format(Configuration.storage))
+
+        # Verify sizes of pool executors
+        if Configuration.poolsize < 1 or Configuration.iopoolsize < 1 or \
+                Configuration.searchpoolsize < 1:
+            argparser.error("invalid pool size (at least one thread)")
+
+        # Verify durability
+        if Configuration.durability not in ['commit', 'group', 'none']:
+            argparser.error("invalid durability {} (choose commit, group or none)"
+                            .format(Configuration.durability))
 
         # Verify private key and certificate files
         if Configuration.keyfile != 'None' and Configuration.certfile != 'None':
@@ -121,6 +121,18 @@ class Daemon(object):
     def status(self):
         self.check_pid(True)
 
+    def running_pid(self):
+        """Return the pid of the running instance or None"""
+        if not Configuration.pidfile or \
+                not os.path.exists(Configuration.pidfile):
+            return None
+        try:
+            pid = int(open(Configuration.pidfile, 'rb').read().decode('utf-8').strip())
+            os.kill(pid, 0)
+        except (ValueError, OSError):
+            return None
+        return pid
+
     def start_logging(self):
         """Configure the logging module"""
         handler = RotatingFileHandler(
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2015-2017, Thierry Lemeunier <thierry at lemeunier dot net>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR
+# OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+Thread pool executor with queue metrics
+
+The executor counts the tasks waiting for a thread (the queue depth) and
+measures how long tasks wait before being executed, so an overloaded pool
+can be identified in the log file.
+"""
+
+import concurrent.futures
+import threading
+import time
+
+
+class MeteredExecutor(concurrent.futures.ThreadPoolExecutor):
+    """
+    Thread pool executor with queue metrics
+
+    Attribute(s):
+    - name: the name of the pool (for statistics)
+    - size: the number of threads of the pool
+    - queued: the number of tasks waiting for a thread
+    - max_queued: the maximum number of tasks waiting for a thread
+    - tasks: the number of tasks started
+    - wait_total: the total waiting time of started tasks (in seconds)
+    - wait_max: the maximum waiting time of a task (in seconds)
+    - metrics_lock: a lock on the metrics
+
+    Method(s):
+    - submit: schedule the execution of a function
+    - stats: return the metrics of the pool
+    """
+
+    # Intern methods
+
+    def __init__(self, size, name):
+        """Create a pool of size threads"""
+        super(MeteredExecutor, self).__init__(size)
+        self.name = name
+        self.size = size
+        self.queued = 0
+        self.max_queued = 0
+        self.tasks = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.metrics_lock = threading.Lock()
+
+    def _run_(self, submitted, fn, args, kwargs):
+        """Record the waiting time of a task then execute it"""
+        wait = time.monotonic() - submitted
+        with self.metrics_lock:
+            self.queued -= 1
+            self.tasks += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+        return fn(*args, **kwargs)
+
+    def _done_(self, future):
+        """Forget a task cancelled before its execution"""
+        if future.cancelled():
+            with self.metrics_lock:
+                self.queued -= 1  # Never started
+
+    # Extern methods
+
+    def submit(self, fn, *args, **kwargs):
+        """Schedule the execution of fn(*args, **kwargs) and return a
+        future"""
+        with self.metrics_lock:
+            self.queued += 1
+            self.max_queued = max(self.max_queued, self.queued)
+        try:
+            future = super(MeteredExecutor, self).submit(
+                self._run_, time.monotonic(), fn, args, kwargs)
+        except:
+            with self.metrics_lock:
+                self.queued -= 1  # Not scheduled (pool shut down)
+            raise
+        future.add_done_callback(self._done_)
+        return future
+
+    def stats(self):
+        """Return a dictionary of the metrics of the pool"""
+        with self.metrics_lock:
+            return {'name': self.name, 'size': self.size,
+                    'queued': self.queued, 'max_queued': self.max_queued,
+                    'tasks': self.tasks,
+                    'wait_avg': self.wait_total / self.tasks
+                    if self.tasks else 0.0,
+                    'wait_max': self.wait_max}
@@ -25,12 +25,21 @@
 # OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
 # ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import os
+import signal
+import time
 from os import path
 
 from .common.util.MnemopwdFingerPrint import MnemopwdFingerPrint
 from .server.util.Configuration import Configuration
 from .server.util.Daemon import Daemon
 from .server.server import Server
+from .server.clients.DBBackup import DBBackup
+from .server.clients.DBBulk import DBBulk
+from .server.clients.DBHandler import DBHandler
+from .server.clients.DBPool import DBPool
+from .server.clients.VaultIndex import VaultIndex
+from .server.clients.storage import ShelveEngine
 
 here = path.abspath(path.dirname(__file__))
 
@@ -42,6 +51,96 @@ class ServerDaemon(Daemon):
         """Start server"""
         Server().start()
 
+    def main(self):
+        """Execute an administration action or a daemon action"""
+        VaultIndex.configure(Configuration.dbpath, Configuration.datapaths)
+        if Configuration.action == 'convert':
+            self.convert()
+        elif Configuration.action == 'compact':
+            self.compact()
+        elif Configuration.action == 'backup':
+            self.backup()
+        elif Configuration.action == 'rebalance':
+            self.rebalance()
+        elif Configuration.action in ['dump', 'load']:
+            self.bulk(Configuration.action)
+        else:
+            Daemon.main(self)
+
+    def convert(self):
+        """Convert shelve databases to the configured storage engine"""
+        self.check_pid()  # The server must be stopped
+        if DBHandler.engine_class() is ShelveEngine:
+            print("choose another storage engine than shelve in configuration")
+            return
+        nbconverted = 0
+        VaultIndex.migrate(Configuration.dbpath)
+        for filename in VaultIndex.vaults(Configuration.dbpath, ShelveEngine):
+            if DBHandler.convert(Configuration.dbpath, filename, ShelveEngine):
+                nbconverted += 1
+        print("{} database(s) converted to {} (shelve files are kept)"
+              .format(nbconverted, Configuration.storage))
+
+    def compact(self):
+        """Compact database files. A running server is asked to do it
+        in background (see Server class) else it is done now."""
+        pid = self.running_pid()
+        if pid is not None:
+            os.kill(pid, signal.SIGUSR1)
+            print("compaction requested to the server [pid {}] "
+                  "(see log file for the result)".format(pid))
+            return
+        reclaimed = 0
+        VaultIndex.migrate(Configuration.dbpath)
+        engine = DBHandler.engine_class()
+        for filename in VaultIndex.vaults(Configuration.dbpath, engine):
+            reclaimed += DBHandler(Configuration.dbpath, filename).compact()
+        DBPool.close_all()
+        print("{} bytes reclaimed".format(reclaimed))
+
+
+    def backup(self):
+        """Back up databases. A running server is asked to do it in
+        background (see Server class) else it is done now."""
+        pid = self.running_pid()
+        if pid is not None:
+            os.kill(pid, signal.SIGUSR2)
+            print("backup requested to the server [pid {}] "
+                  "(see log file for the result)".format(pid))
+            return
+        os.makedirs(Configuration.backuppath, mode=0o700, exist_ok=True)
+        VaultIndex.migrate(Configuration.dbpath)
+        directory = DBBackup.backup(Configuration.dbpath,
+                                    Configuration.backuppath)
+        DBPool.close_all()
+        print("databases copied in {}".format(directory))
+
+
+    def rebalance(self):
+        """Move databases to their data directory"""
+        self.check_pid()  # The server must be stopped
+        nbmoved = VaultIndex.migrate(Configuration.dbpath)
+        print("{} database(s) moved".format(nbmoved))
+
+    def bulk(self, action):
+        """Dump databases in dump files or load databases from dump files
+        (by a pool of worker processes)"""
+        self.check_pid()  # The server must be stopped
+        VaultIndex.migrate(Configuration.dbpath)
+        if action == 'dump':
+            os.makedirs(Configuration.bulkpath, mode=0o700, exist_ok=True)
+        elif not os.path.isdir(Configuration.bulkpath):
+            print("no dump directory {}".format(Configuration.bulkpath))
+            return
+        start = time.time()
+        nbvaults, nbsibs = DBBulk.run(action, Configuration.dbpath,
+                                      Configuration.bulkpath,
+                                      Configuration.poolsize)
+        duration = max(time.time() - start, 0.001)
+        print("{} database(s) {}ed ({} blocks in {:.1f} seconds, {:.0f} "
+              "blocks/s)".format(nbvaults, action, nbsibs, duration,
+                                 nbsibs / duration))
+
 
 def main():
     """Main function"""
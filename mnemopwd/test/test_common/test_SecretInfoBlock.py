@@ -29,6 +29,7 @@ import unittest
 import logging
 
 from mnemopwd.pyelliptic import hash as _hash
+from mnemopwd.common.InfoBlock import InfoBlock
 from mnemopwd.common.SecretInfoBlock import SecretInfoBlock
 from mnemopwd.common.KeyHandler import KeyHandler
 
@@ -188,6 +189,33 @@ class SecretInfoBlockTestCase(unittest.TestCase):
         self.foo1["info1"] = self.value
         self.assertTrue(self.value in self.foo1)
 
+    def test_encode(self):
+        self.foo2["info2"] = self.value
+        data = self.foo2.encode()
+        sib = InfoBlock.decode(data)
+        self.assertIsInstance(sib, SecretInfoBlock)
+        self.assertEqual(sib.scheme, SecretInfoBlock.CANONICAL)
+        self.assertEqual(sib.encode(), data)  # Fingerprint kept
+        sib.control_integrity(SecretInfoBlockTestCase.keyh)
+        self.assertEqual(sib["info2"], self.value)
+        self.assertEqual(sib.nbInfo, self.nbInfo2)
+
+        # Blocks modified or truncated
+        with self.assertRaises(AssertionError):
+            sib = InfoBlock.decode(data[:-1] + bytes([data[-1] ^ 1]))
+            sib.control_integrity(SecretInfoBlockTestCase.keyh)
+        with self.assertRaises(ValueError):
+            InfoBlock.decode(data[:-1])
+        with self.assertRaises(ValueError):
+            InfoBlock.decode(data[:10])
+
+        # Fingerprint of a block restored by pickle
+        state = self.foo1.__getstate__()
+        self.foo1.__setstate__(state)
+        sib = InfoBlock.decode(self.foo1.encode())
+        self.assertEqual(sib.scheme, SecretInfoBlock.LEGACY)
+        sib.control_integrity(SecretInfoBlockTestCase.keyh)
+
     def test__len__(self):
         self.assertEqual(len(self.foo1), 0)
         self.foo1["info1"] = self.value
@@ -0,0 +1,915 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2015-2017, Thierry Lemeunier <thierry at lemeunier dot net>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR
+# OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import unittest
+import os
+import pickle
+import re
+import tempfile
+import shutil
+import threading
+import types
+
+from mnemopwd.common.InfoBlock import InfoBlock
+from mnemopwd.server.util.Configuration import Configuration
+from mnemopwd.server.util.MeteredExecutor import MeteredExecutor
+from mnemopwd.server.clients.BlindIndex import BlindIndex
+from mnemopwd.server.clients.DBAccess import DBAccess, RWLock
+from mnemopwd.server.clients.DBBackup import DBBackup
+from mnemopwd.server.clients.DBBulk import DBBulk
+from mnemopwd.server.clients.DBExecutor import DBExecutor
+from mnemopwd.server.clients.DBHandler import DBHandler
+from mnemopwd.server.clients.DBMigrator import DBMigrator
+from mnemopwd.server.clients.DBPool import DBPool
+from mnemopwd.server.clients.DBSearcher import DBSearcher
+from mnemopwd.server.clients.DBSyncer import DBSyncer
+from mnemopwd.server.clients.FieldCache import FieldCache
+from mnemopwd.server.clients.SIBCache import SIBCache
+from mnemopwd.server.clients.VaultFormat import VaultFormat
+from mnemopwd.server.clients.VaultIndex import VaultIndex
+from mnemopwd.server.clients.VaultTier import VaultTier
+from mnemopwd.server.clients.storage import ShelveEngine
+from mnemopwd.server.clients.storage import LogEngine
+
+try:
+    from mnemopwd.common.SecretInfoBlock import SecretInfoBlock
+except (ImportError, AttributeError, OSError):
+    SecretInfoBlock = None  # pyelliptic needs OpenSSL with ECDH functions
+
+
+def new_block(*infos):
+    """Return a block with clear information"""
+    ib = InfoBlock(len(infos))
+    for j, info in enumerate(infos):
+        ib['info' + str(j + 1)] = info
+    return ib
+
+
+class DBHandlerSQLiteTestCase(unittest.TestCase):
+
+    storage = 'sqlite'
+
+    def setUp(self):
+        self.storage_orig = Configuration.storage
+        self.ratio_orig = Configuration.compaction_ratio
+        self.durability_orig = Configuration.durability
+        Configuration.storage = self.storage
+        self.path = tempfile.mkdtemp()
+        self.filename = 'vault'
+        self.assertTrue(DBHandler.new(self.path, self.filename))
+        self.dbH = DBHandler(self.path, self.filename)
+        self.dbH.open()
+
+    def tearDown(self):
+        self.dbH.close()
+        DBPool.close_all()
+        Configuration.storage = self.storage_orig
+        Configuration.compaction_ratio = self.ratio_orig
+        Configuration.durability = self.durability_orig
+        shutil.rmtree(self.path)
+
+    def test_new_exist_delete(self):
+        self.assertTrue(DBHandler.exist(self.path, self.filename))
+        self.assertFalse(DBHandler.new(self.path, self.filename))
+        self.assertTrue(DBHandler.delete(self.path, self.filename))
+        self.assertFalse(DBHandler.exist(self.path, self.filename))
+
+    def test_layout(self):
+        self.assertEqual(self.dbH.database, self.path + '/va/ul/vault')
+        self.assertTrue(DBHandler.exist(self.path, 'vault'))
+        self.assertFalse(DBHandler.exist(self.path, 'unknown'))
+        self.assertTrue(DBHandler.new(self.path, 'other'))
+        self.assertTrue(os.path.isdir(self.path + '/ot/he'))
+        DBHandler.rename(self.path, 'other', 'renamed')
+        self.assertFalse(DBHandler.exist(self.path, 'other'))
+        self.assertTrue(DBHandler.exist(self.path, 'renamed'))
+
+    def test_migrate(self):
+        engine = DBHandler.engine_class()
+        engine.create(self.path + '/flat')  # Old layout
+        self.assertFalse(DBHandler.exist(self.path, 'flat'))
+        self.assertEqual(VaultIndex.migrate(self.path), 1)
+        self.assertEqual(VaultIndex.migrate(self.path), 0)
+        self.assertTrue(DBHandler.exist(self.path, 'flat'))
+        self.assertTrue(engine.exists(self.path + '/fl/at/flat'))
+        self.assertEqual(VaultIndex.vaults(self.path, engine), ['flat', 'vault'])
+
+    def test_datapaths(self):
+        self.assertEqual(VaultIndex.migrate(self.path + '/'), 0)  # At its place
+        for name, identity in (('d1', 'one'), ('d2', 'two'), ('d3', 'three')):
+            os.mkdir(self.path + '/' + name)
+            with open(self.path + '/' + name + '/.datapath', 'w') as file:
+                file.write(identity)
+        roots = [self.path + '/d1', self.path + '/d2']
+        VaultIndex.configure(self.path, roots)
+        self.assertEqual(VaultIndex.migrate(self.path), 1)  # 'vault'
+        names = ['A' * 10 + str(i) for i in range(2, 12)]
+        for name in names:
+            self.assertTrue(DBHandler.new(self.path, name))
+            DBHandler(self.path, name)['config'] = name
+        placed = {name: DBHandler(self.path, name).database.split('/')[-4]
+                  for name in names}
+        self.assertEqual([placed[name] for name in names],
+                         ['d2', 'd1', 'd2', 'd1', 'd1',
+                          'd1', 'd1', 'd2', 'd2', 'd2'])
+        self.assertEqual(DBHandler(self.path, names[0] + '_tmp').database
+                         .split('/')[-4], placed[names[0]])
+        DBPool.close_all()
+        VaultIndex.configure(self.path, roots + [self.path + '/d3'])
+        self.assertEqual(VaultIndex.migrate(self.path), 3)
+        self.assertEqual(VaultIndex.migrate(self.path), 0)
+        for name in names:
+            self.assertTrue(DBHandler.exist(self.path, name))
+            self.assertEqual(DBHandler(self.path, name)['config'], name)
+        DBPool.close_all()
+        # Renaming a data directory does not move databases
+        os.rename(self.path + '/d3', self.path + '/d4')
+        VaultIndex.configure(self.path, roots + [self.path + '/d4/'])
+        self.assertEqual(VaultIndex.migrate(self.path), 0)
+        DBPool.close_all()
+        VaultIndex.configure(self.path, [])
+
+    def test_pool_in_use(self):
+        dbpoolsize_orig, dbidle_orig = Configuration.dbpoolsize, Configuration.dbidle
+        try:
+            Configuration.dbpoolsize, Configuration.dbidle = 1, -1
+            self.assertTrue(DBHandler.new(self.path, 'other'))
+            other = DBHandler(self.path, 'other')
+            with self.dbH.batch() as vault:
+                vault.add(new_block(b'one'))
+                other['config'] = 'a config'  # Pool full but vault in use
+                DBPool.evict_idle()
+                vault.add(new_block(b'two'))  # Still opened
+            self.assertEqual([i for i, sib in self.dbH.get_data(None)], [1, 2])
+        finally:
+            Configuration.dbpoolsize, Configuration.dbidle = dbpoolsize_orig, dbidle_orig
+
+    def test_named_entries(self):
+        with self.assertRaises(KeyError):
+            self.dbH['config']
+        self.dbH['config'] = 'a config'
+        self.assertEqual(self.dbH['config'], 'a config')
+        del self.dbH['config']
+        with self.assertRaises(KeyError):
+            del self.dbH['config']
+
+    def test_add_get_update_delete(self):
+        self.assertEqual(self.dbH.add_data(new_block(b'one')), '1')
+        self.assertEqual(self.dbH.add_data(new_block(b'two')), '2')
+        self.assertEqual(self.dbH.add_data(new_block(b'three')), '3')
+        self.assertTrue(self.dbH.delete_data('3'))
+        self.assertFalse(self.dbH.delete_data('3'))
+        self.assertFalse(self.dbH.delete_data('x'))
+        # An index is never used twice
+        self.assertEqual(self.dbH.add_data(new_block(b'four')), '4')
+        self.assertTrue(self.dbH.update_data('1', new_block(b'ONE')))
+        self.assertFalse(self.dbH.update_data('3', new_block(b'THREE')))
+        tabsibs = self.dbH.get_data(None)
+        self.assertEqual([i for i, sib in tabsibs], [1, 2, 4])
+        self.assertEqual(tabsibs[0][1]['info1'], b'ONE')
+
+    def test_count_after_reopen(self):
+        for info in (b'one', b'two', b'three', b'four'):
+            self.dbH.add_data(new_block(info))
+        self.dbH.delete_data('2')
+        self.dbH.delete_data('4')
+        DBPool.close(self.dbH.database)
+        with self.dbH.batch() as vault:
+            self.assertEqual(vault.count(), 2)
+            self.assertEqual(vault.last_index(), 4)
+            self.assertEqual([i for i, sib in vault.items()], [1, 3])
+
+    def test_cache(self):
+        self.dbH.add_data(new_block(b'one'))
+        self.dbH.add_data(new_block(b'two'))
+        self.dbH.get_data(None)
+        hits = SIBCache.stats()['hits']
+        tabsibs = self.dbH.get_data(None)
+        self.assertEqual(SIBCache.stats()['hits'], hits + 2)
+        # A copy is returned
+        self.assertIsNot(tabsibs[0][1], self.dbH.get_data(None)[0][1])
+        # Invalidation
+        self.dbH.update_data('1', new_block(b'ONE'))
+        self.dbH.delete_data('2')
+        tabsibs = self.dbH.get_data(None)
+        self.assertEqual([(i, sib['info1']) for i, sib in tabsibs],
+                         [(1, b'ONE')])
+        DBHandler.delete(self.path, self.filename)
+        self.assertNotIn(self.dbH.database, SIBCache.vaults)
+
+    def test_tier(self):
+        self.dbH.add_data(new_block(b'one'))
+        self.dbH.add_data(new_block(b'two'))
+        self.dbH.load()
+        self.assertTrue(VaultTier.resident(self.dbH.database))
+        hits = VaultTier.stats()['hits']
+        self.dbH.add_data(new_block(b'three'))
+        self.dbH.update_data('1', new_block(b'ONE'))
+        self.dbH.delete_data('2')
+        self.assertEqual([sib['info1'] for i, sib in self.dbH.get_data(None)],
+                         [b'ONE', b'three'])
+        self.assertEqual([i for i, psib in self.dbH.get_raw_data()], [1, 3])
+        self.assertEqual(VaultTier.stats()['hits'], hits + 2)
+        DBPool.close_all()  # Reads do not need the database file
+        self.assertEqual(len(self.dbH.get_data(None)), 2)
+        tieridle = Configuration.tieridle
+        Configuration.tieridle = -1
+        try:
+            with self.assertLogs(level='INFO') as logs:
+                VaultTier.evict_idle()
+        finally:
+            Configuration.tieridle = tieridle
+        self.assertIn("'evictions'", logs.output[0])  # Runtime statistics
+        self.assertFalse(VaultTier.resident(self.dbH.database))
+        self.assertEqual([sib['info1'] for i, sib in self.dbH.get_data(None)],
+                         [b'ONE', b'three'])
+
+    def test_tier_budget(self):
+        tiermb = Configuration.tiermb
+        Configuration.tiermb = 1
+        half = new_block(b'x' * 600000).encode()
+        try:
+            self.assertTrue(VaultTier.load('a', [(1, half)]))
+            self.assertTrue(VaultTier.load('b', []))
+            # The least recently used database is the written one
+            VaultTier.put('a', 2, half)
+            self.assertFalse(VaultTier.resident('a'))  # Too big
+            self.assertTrue(VaultTier.resident('b'))
+            self.assertTrue(VaultTier.load('a', []))
+            self.assertTrue(VaultTier.load('c', [(1, half)]))
+            VaultTier.put('b', 1, half)
+            self.assertFalse(VaultTier.resident('c'))
+            self.assertTrue(VaultTier.resident('b'))
+            self.assertLessEqual(VaultTier.stats()['bytes'], 1024 * 1024)
+        finally:
+            Configuration.tiermb = tiermb
+            for database in 'abc':
+                VaultTier.evict(database)
+
+    def test_get_raw_data(self):
+        self.dbH.add_data(new_block(b'one'))
+        self.dbH.add_data(new_block(b'two'))
+        self.dbH.delete_data('1')
+        tabsibs = self.dbH.get_raw_data()
+        self.assertEqual([i for i, psib in tabsibs], [2])
+        self.assertEqual(InfoBlock.decode(tabsibs[0][1])['info1'], b'two')
+
+    def test_search_data(self):
+        self.dbH.add_data(new_block(b'github', b'login'))
+        self.dbH.add_data(new_block(b'bank', b'GitHub account'))
+        self.dbH.add_data(new_block(b'mail', b'password'))
+        Configuration.search_mode = 'all'
+        self.assertEqual([i for i, sib in self.dbH.search_data(None, 'git')],
+                         [1, 2])
+        Configuration.search_mode = 'first'
+        self.assertEqual([i for i, sib in self.dbH.search_data(None, 'git')],
+                         [1])
+        Configuration.search_mode = 'all'
+        # Literal pattern (casefolded) and regular expressions
+        self.assertEqual([i for i, sib in self.dbH.search_data(None, 'HUB A')],
+                         [2])
+        self.assertEqual([i for i, sib in self.dbH.search_data(None, r'^\w+ \w+$')],
+                         [2])
+        self.assertEqual([i for i, sib in self.dbH.search_data(None, 'MAIL|^b')],
+                         [2, 3])
+        with self.assertRaises(re.error):
+            self.dbH.search_data(None, 'git(')
+
+    def test_field_cache(self):
+        for info in (b'github', b'bank', b'mail'):
+            self.dbH.add_data(new_block(info, b'login'))
+        cache = FieldCache(32)
+        for n in range(2):
+            self.assertEqual(
+                [i for i, sib in self.dbH.search_data(None, 'a', cache)], [2, 3])
+        self.assertEqual((cache.hits, cache.misses, cache.size), (4, 4, 19))
+        # A modified block is decrypted again
+        self.dbH.update_data('3', new_block(b'post', b'login'))
+        self.assertEqual(
+            [i for i, sib in self.dbH.search_data(None, 'a', cache)], [2])
+        self.assertEqual((cache.hits, cache.misses), (7, 6))
+        # Least recently used information are dropped
+        small = FieldCache(10)
+        list(self.dbH.search_data(None, 'a', small))
+        self.assertEqual(list(small.fields), [(3, 1), (3, 2)])
+        value = cache.get(2, self.dbH.get_data(None)[1][1], 1)
+        cached = cache.fields[(2, 1)][1]
+        cache.invalidate(2)
+        self.assertEqual(cached, bytes(4))  # Zeroed
+        self.assertEqual(value, b'bank')  # The returned copy is not zeroed
+        self.assertNotIn((2, 1), cache.fields)
+        cache.clear()
+        self.assertEqual((len(cache.fields), cache.size), (0, 0))
+        cache.get(2, self.dbH.get_data(None)[1][1], 1)
+        self.assertEqual(len(cache.fields), 0)  # Not used anymore
+
+    def test_blind_index(self):
+        keyH = types.SimpleNamespace(ikey=b'the integrity key')
+        blind_index_orig = Configuration.blind_index
+        try:
+            Configuration.blind_index = True
+            self.dbH.add_data(new_block(b'github', b'login'), keyH)
+            self.dbH.add_data(new_block(b'bank', b'GitLab'), keyH)
+            self.dbH.add_data(new_block(b'mail', b'login'))  # Not indexed
+            self.dbH.add_data(new_block(b'post', b'news'), keyH)
+            cache = FieldCache(1024)
+            self.assertEqual(
+                [i for i, sib in self.dbH.search_data(keyH, 'GIT', cache)], [1, 2])
+            self.assertEqual(cache.misses, 5)  # Block 4 is not decrypted
+            self.assertEqual(len(BlindIndex.get(self.dbH.database)), 3)  # Loaded
+            self.assertEqual(
+                [i for i, sib in self.dbH.search_data(keyH, 'gitl')], [2])
+            self.assertEqual(
+                [i for i, sib in self.dbH.search_data(keyH, 'g.t')], [1, 2])
+            # An outdated entry is not used
+            self.dbH.update_data('4', new_block(b'gitea'))
+            self.assertEqual(
+                [i for i, sib in self.dbH.search_data(keyH, 'git')], [1, 2, 4])
+            self.dbH.update_data('4', new_block(b'post'), keyH)
+            self.assertEqual(
+                [i for i, sib in self.dbH.search_data(keyH, 'git')], [1, 2])
+            self.dbH.delete_data('1')
+            with self.assertRaises(KeyError):
+                self.dbH['blind.1']
+            # Rebuild the index
+            self.dbH.index_data(keyH)
+            cache = FieldCache(1024)
+            self.assertEqual(
+                [i for i, sib in self.dbH.search_data(keyH, 'post', cache)], [4])
+            self.assertEqual(cache.misses, 1)  # Block 3 is not decrypted
+            Configuration.blind_index = False
+            self.dbH.index_data(keyH)
+            with self.assertRaises(KeyError):
+                self.dbH['blind.3']
+        finally:
+            Configuration.blind_index = blind_index_orig
+
+    def test_parallel_search(self):
+        for i in range(50):
+            self.dbH.add_data(new_block(b'mail', str(i).encode()))
+        self.dbH.delete_data('12')
+        chunk_orig, poolsize_orig = DBSearcher.chunk, Configuration.searchpoolsize
+        try:
+            DBSearcher.chunk = 3
+            for poolsize in (1, 4):
+                Configuration.searchpoolsize = poolsize
+                self.assertEqual(
+                    [i for i, sib in self.dbH.search_data(None, '[13]$')],
+                    [i for i in range(1, 51) if i % 10 in (2, 4) and i != 12])
+            self.assertLessEqual(DBSearcher.stats()['max_queued'], 4)  # Bounded
+            results = self.dbH.search_data(None, 'mail')
+            next(results)
+            results.close()  # Next chunks are cancelled
+            self.assertEqual(DBSearcher.shutdown()['queued'], 0)
+        finally:
+            DBSearcher.chunk = chunk_orig
+            Configuration.searchpoolsize = poolsize_orig
+            DBSearcher.shutdown()
+
+    def test_batch(self):
+        with self.dbH.batch() as vault:
+            vault.add(new_block(b'one'))
+            vault.add(new_block(b'two'))
+            vault.set_meta('config', 'a config')
+            self.assertEqual(vault.count(), 2)
+        with self.assertRaises(ValueError):
+            with self.dbH.batch() as vault:
+                vault.delete(1)
+                vault.add(new_block(b'three'))
+                del vault
+                raise ValueError()
+        with self.dbH.batch() as vault:
+            self.assertEqual(vault.count(), 2)
+            self.assertEqual(vault.last_index(), 2)
+        self.assertEqual(self.dbH['config'], 'a config')
+        self.assertEqual([i for i, sib in self.dbH.get_data(None)], [1, 2])
+
+    def test_copy_to(self):
+        self.dbH['config'] = 'a config'
+        for info in (b'one', b'two', b'three'):
+            self.dbH.add_data(new_block(info))
+        self.dbH.delete_data('3')
+        self.assertTrue(DBHandler.new(self.path, 'copy'))
+        dbH_copy = DBHandler(self.path, 'copy')
+        self.dbH.copy_to(dbH_copy)
+        self.assertEqual(dbH_copy['config'], 'a config')
+        self.assertEqual([i for i, sib in dbH_copy.get_data(None)], [1, 2])
+        self.assertEqual(dbH_copy.add_data(new_block(b'four')), '4')
+
+    def test_compact(self):
+        Configuration.compaction_ratio = 1.0  # No background compaction
+        for i in range(10):
+            self.dbH.add_data(new_block(b'x' * 10000))
+        for i in range(1, 10):
+            self.dbH.update_data(str(i), new_block(b'y' * 10000))
+        self.dbH.delete_data('10')
+        self.assertGreater(self.dbH.compact(), 0)
+        tabsibs = self.dbH.get_data(None)
+        self.assertEqual([i for i, sib in tabsibs], list(range(1, 10)))
+        self.assertEqual(tabsibs[0][1]['info1'], b'y' * 10000)
+        self.assertEqual(self.dbH.add_data(new_block(b'z')), '11')
+
+    def test_durability(self):
+        for durability in ('commit', 'none', 'group'):
+            Configuration.durability = durability
+            DBPool.close_all()  # Reopen with the durability option
+            self.dbH.add_data(new_block(durability.encode()))
+            DBSyncer.sync_all()
+        DBPool.close_all()
+        self.assertEqual([sib['info1'] for i, sib in self.dbH.get_data(None)],
+                         [b'commit', b'none', b'group'])
+
+    def test_backup(self):
+        self.dbH['config'] = 'a config'
+        self.dbH.add_data(new_block(b'one'))
+        self.dbH.add_data(new_block(b'two'))
+        self.assertTrue(DBHandler.new(self.path, 'other_tmp'))
+        directory = DBBackup.backup(self.path, self.path + '/backup')
+        self.dbH.delete_data('1')  # After the backup
+        with open(directory + '/' + DBBackup.manifest) as file:
+            lines = file.readlines()
+        self.assertGreaterEqual(len(lines), 2)  # Header and the only database
+        for line in lines[1:]:
+            checksum, size, filename = line.split()
+            self.assertTrue(os.path.basename(filename).startswith(self.filename))
+            self.assertEqual(DBBackup._checksum_(directory + '/' + filename),
+                             (checksum, int(size)))
+        dbH = DBHandler(directory, self.filename)
+        self.assertEqual(dbH['config'], 'a config')
+        self.assertEqual([sib['info1'] for i, sib in dbH.get_data(None)],
+                         [b'one', b'two'])
+        # An interrupted backup is removed by the next one
+        leftover = self.path + '/backup/20000101-000000.tmp'
+        os.makedirs(leftover + '/ab')
+        with open(leftover + '/ab/partial', 'wb') as file:
+            file.write(b'partial')
+        with self.assertLogs(level='WARNING'):
+            self.assertIsNotNone(DBBackup.backup(self.path,
+                                                 self.path + '/backup'))
+        self.assertFalse(os.path.exists(leftover))
+
+    def test_bulk(self):
+        self.dbH['config'] = 'a config'
+        self.dbH.add_data(new_block(b'one'))
+        self.dbH.add_data(new_block(b'two'))
+        self.dbH.delete_data('2')
+        bulkpath = self.path + '/dump'
+        os.mkdir(bulkpath)
+        self.assertEqual(DBBulk.run('dump', self.path, bulkpath, 2), (1, 1))
+        self.assertTrue(DBHandler.delete(self.path, self.filename))
+        self.assertEqual(DBBulk.run('load', self.path, bulkpath, 2), (1, 1))
+        dbH = DBHandler(self.path, self.filename)
+        self.assertEqual(dbH['config'], 'a config')
+        self.assertEqual([sib['info1'] for i, sib in dbH.get_data(None)],
+                         [b'one'])
+        self.assertEqual(dbH.add_data(new_block(b'three')), '3')
+        self.assertIsNone(DBBulk.load(self.path, self.filename, bulkpath))
+        # A truncated dump file creates no database
+        dumpfile = bulkpath + '/' + self.filename + DBBulk.suffix
+        with open(dumpfile, 'r+b') as file:
+            file.truncate(os.path.getsize(dumpfile) - 1)
+        with open(dumpfile, 'rb') as file:
+            data = file.read()
+        with open(bulkpath + '/other' + DBBulk.suffix, 'wb') as file:
+            file.write(data)
+        with self.assertRaises(ValueError):
+            DBBulk.load(self.path, 'other', bulkpath)
+        self.assertFalse(DBHandler.exist(self.path, 'other'))
+        # A block with an invalid header is refused
+        with open(bulkpath + '/other' + DBBulk.suffix, 'wb') as file:
+            file.write(DBBulk.magic)
+            file.write(DBBulk.record.pack(DBBulk.SIB, 1, 7))
+            file.write(b'garbage')
+            file.write(DBBulk.record.pack(DBBulk.END, 1, 1))
+        with self.assertRaises(ValueError):
+            DBBulk.load(self.path, 'other', bulkpath)
+        self.assertFalse(DBHandler.exist(self.path, 'other'))
+
+    def test_stats(self):
+        self.assertEqual(self.dbH.get_stats(),
+                         {'count': 0, 'bytes': 0, 'largest': 0})
+        self.dbH.add_data(new_block(b'one'))
+        self.dbH.add_data(new_block(b'two' * 100))
+        self.dbH.add_data(new_block(b'three'))
+        with self.dbH.reader() as vault:
+            sizes = [len(psib) for i, psib in vault.items_raw()]
+        self.assertEqual(self.dbH.get_stats(), {
+            'count': 3, 'bytes': sum(sizes), 'largest': sizes[1]})
+        self.dbH.update_data('1', new_block(b'one' * 10))
+        with self.dbH.batch() as vault:
+            vault.items_view = None  # Other blocks are not read
+        self.dbH.delete_data('2')  # The largest block
+        with self.dbH.batch() as vault:
+            del vault.items_view
+        self.assertFalse(self.dbH.delete_data('2'))
+        with self.dbH.reader() as vault:
+            sizes = [len(psib) for i, psib in vault.items_raw()]
+        self.assertEqual(self.dbH.get_stats(), {
+            'count': 2, 'bytes': sum(sizes), 'largest': max(sizes)})
+        # Database of an older version
+        del self.dbH['stats']
+        self.assertEqual(self.dbH.get_stats()['bytes'], sum(sizes))
+        self.assertEqual(self.dbH['stats']['count'], 2)
+
+    def test_format(self):
+        self.assertEqual(self.dbH['version'], VaultFormat.version)
+        self.dbH.add_data(new_block(b'one'))
+        # Database of the version 0 (pickled blocks, without statistics)
+        with self.dbH.batch() as vault:
+            vault.dumps = pickle.dumps
+            vault.put(2, new_block(b'two'))
+            del vault.dumps
+        del self.dbH['version']
+        del self.dbH['stats']
+        VaultFormat.forget(self.dbH.database)
+        version = VaultFormat.version
+        self.assertEqual(self.dbH['version'], version)  # Upgraded at first use
+        with self.dbH.reader() as vault:
+            self.assertEqual(vault.get_meta('stats')['count'], 2)
+        for i, psib in self.dbH.get_raw_data():
+            self.assertEqual(psib[:2], InfoBlock.magic)
+        self.assertEqual(self.dbH.get_data(None)[1][1]['info1'], b'two')
+        # A new format version (a new release of the server)
+        VaultFormat.version = version + 1
+        VaultFormat.forget(self.dbH.database)
+        try:
+            @VaultFormat.migration(version)
+            def something(vault):
+                vault.set_meta('something', True)
+
+            self.assertEqual(DBMigrator.sweep(self.path), 0)  # In use
+            self.dbH.close()
+            self.assertEqual(DBMigrator.sweep(self.path), 1)
+            self.assertEqual(DBMigrator.sweep(self.path), 0)
+            self.dbH.open()
+            self.assertTrue(self.dbH['something'])
+            self.assertEqual(self.dbH['version'], version + 1)
+        finally:
+            VaultFormat.version = version
+            del VaultFormat.migrations[version]
+            VaultFormat.forget(self.dbH.database)
+        with self.assertRaises(ValueError):
+            self.dbH.get_data(None)  # Newer format version
+
+    def test_forget_while_reading(self):
+        self.dbH.add_data(new_block(b'one'))
+        upgrade = self.dbH.upgrade
+
+        def upgrade_then_forget():
+            """Another session renames the database after the upgrade"""
+            result = upgrade()
+            VaultFormat.forget(self.dbH.database)
+            return result
+
+        self.dbH.upgrade = upgrade_then_forget
+        self.assertEqual([i for i, sib in self.dbH.get_data(None)], [1])
+        self.assertEqual([i for i, psib in self.dbH.get_raw_data()], [1])
+        self.assertTrue(self.dbH.snapshot(self.path + '/copy'))
+        self.assertEqual(self.dbH.add_data(new_block(b'two')), '2')
+        self.assertTrue(self.dbH.delete_data('2'))
+
+    def test_recover(self):
+        self.dbH.add_data(new_block(b'one'))
+        self.assertTrue(DBHandler.new(self.path, self.filename + '_tmp'))
+        self.assertEqual(DBHandler.recover(self.path), 1)
+        self.assertFalse(DBHandler.exist(self.path, self.filename + '_tmp'))
+        self.assertEqual(DBHandler.recover(self.path), 0)
+        self.assertEqual(len(self.dbH.get_data(None)), 1)
+
+
+class MeteredExecutorTestCase(unittest.TestCase):
+
+    def test_stats(self):
+        executor = MeteredExecutor(1, 'test')
+        started, event = threading.Event(), threading.Event()
+
+        def task():
+            started.set()
+            return event.wait(5)
+
+        futures = [executor.submit(task)]
+        futures += [executor.submit(pow, 2, i) for i in range(3)]
+        started.wait(5)
+        self.assertEqual(executor.stats()['queued'], 3)  # One is running
+        event.set()
+        self.assertEqual([future.result() for future in futures],
+                         [True, 1, 2, 4])
+        executor.shutdown()
+        stats = executor.stats()
+        self.assertEqual(stats['queued'], 0)
+        self.assertGreaterEqual(stats['max_queued'], 3)
+        self.assertEqual(stats['tasks'], 4)
+        self.assertGreater(stats['wait_max'], 0.0)
+
+    def test_cancel(self):
+        executor = MeteredExecutor(1, 'test')
+        event = threading.Event()
+        futures = [executor.submit(event.wait, 5), executor.submit(pow, 2, 1)]
+        self.assertTrue(futures[1].cancel())  # Never started
+        event.set()
+        executor.shutdown()
+        self.assertEqual(executor.stats()['queued'], 0)
+        self.assertEqual(executor.stats()['tasks'], 1)
+
+    def test_storage_call(self):
+        DBExecutor.shutdown()  # A new pool
+        self.assertNotEqual(DBExecutor.call(threading.get_ident),
+                            threading.get_ident())  # A thread of the pool
+        self.assertEqual(DBExecutor.call(pow, 2, 3), 8)
+        with self.assertRaises(ZeroDivisionError):
+            DBExecutor.call(divmod, 1, 0)
+        with self.assertLogs(level='ERROR') as logs:
+            DBExecutor.spawn('Division', divmod, 1, 0).exception()
+            DBExecutor.shutdown()
+        self.assertIn('Division failed', logs.output[0])
+
+
+class DBHandlerShelveTestCase(DBHandlerSQLiteTestCase):
+
+    storage = 'shelve'
+
+    @unittest.skipIf(SecretInfoBlock is None, 'needs the pyelliptic module')
+    def test_baseline_vault(self):
+        keyH = types.SimpleNamespace(
+            config='a config', ikey=b'the integrity key',
+            encrypt=lambda stage, value: value,
+            decrypt=lambda stage, value: value)
+        # A database written by the first release: pickled sibs
+        self.dbH.close()
+        DBPool.close_all()
+        VaultFormat.forget(self.dbH.database)
+        with ShelveEngine._open_(self.dbH.database, 'n') as db:
+            db['nbsibs'] = 2
+            db['index'] = 3
+            db['config'] = 'a config'
+            for i, info in ((1, b'one'), (3, b'three')):
+                sib = SecretInfoBlock(keyH)
+                sib['info1'] = info
+                db[str(i)] = sib
+        self.dbH.open()
+        # Upgraded at first use
+        tabsibs = self.dbH.get_data(None)
+        self.assertEqual([i for i, sib in tabsibs], [1, 3])
+        self.assertEqual(self.dbH['version'], VaultFormat.version)
+        stats = self.dbH.get_stats()
+        self.assertEqual(stats['count'], 2)
+        # Exported blocks keep their fingerprint
+        raw = self.dbH.get_raw_data()
+        self.assertEqual(stats['bytes'], sum(len(psib) for i, psib in raw))
+        for (i, psib), info in zip(raw, (b'one', b'three')):
+            sib = InfoBlock.decode(psib)
+            sib.control_integrity(keyH)
+            self.assertEqual(sib['info1'], info)
+        self.assertEqual(self.dbH.add_data(new_block(b'four')), '4')
+
+    def test_journal(self):
+        self.dbH.add_data(new_block(b'one'))
+        DBPool.close_all()
+        vault = ShelveEngine(self.dbH.database)
+        vault._write_journal_([(b'1', None)])  # Crash after the journal
+        vault.close()
+        self.assertTrue(ShelveEngine.recover(self.dbH.database))
+        self.assertFalse(ShelveEngine.recover(self.dbH.database))
+        self.assertEqual(self.dbH.get_data(None), [])
+        DBPool.close_all()
+        vault = ShelveEngine(self.dbH.database)
+        vault._write_journal_([(b'index', None)])
+        vault.close()
+        with open(self.dbH.database + ShelveEngine.journal, 'r+b') as file:
+            file.truncate(20)  # Crash during the journal writing
+        self.assertEqual(self.dbH.add_data(new_block(b'two')), '2')
+
+    def test_flush(self):
+        DBPool.close_all()
+        vault = ShelveEngine(self.dbH.database)  # Group durability
+
+        class Database(type(vault.db.dict)):
+            @property
+            def sync(self):
+                raise AttributeError('sync')  # Like dbm.ndbm
+
+        vault.db.dict.__class__ = Database
+        fsync = os.fsync
+        fsyncs = []
+        os.fsync = fsyncs.append
+        try:
+            vault.add(new_block(b'one'))
+        finally:
+            os.fsync = fsync
+        self.assertEqual(fsyncs, [])
+        with ShelveEngine._open_(self.dbH.database, 'r') as db:
+            self.assertIn('1', db)  # Flushed by the commit
+        vault.close()
+
+    def test_interrupted_rename(self):
+        self.dbH.add_data(new_block(b'one'))
+        self.assertTrue(DBHandler.new(self.path, self.filename + '_tmp'))
+        dbH_tmp = DBHandler(self.path, self.filename + '_tmp')
+        dbH_tmp.add_data(new_block(b'two'))
+        dbH_tmp.add_data(new_block(b'three'))
+        DBPool.close_all()
+        src, dst = dbH_tmp.database, self.dbH.database
+        # Crash after the data file is moved
+        with open(dst + ShelveEngine.swap, 'wb') as file:
+            file.write(os.path.basename(src).encode())
+        os.replace(src + ShelveEngine.suffix, dst + ShelveEngine.suffix)
+        self.assertEqual(DBHandler.recover(self.path), 1)
+        self.assertFalse(DBHandler.exist(self.path, dbH_tmp.filename))
+        self.assertEqual([f for f in ShelveEngine.files(src) if os.path.exists(f)], [])
+        self.assertFalse(os.path.exists(dst + ShelveEngine.swap))
+        self.assertEqual([sib['info1'] for i, sib in self.dbH.get_data(None)],
+                         [b'two', b'three'])
+
+    def test_convert(self):
+        self.dbH['config'] = 'a config'
+        self.dbH.add_data(new_block(b'one'))
+        self.dbH.add_data(new_block(b'two'))
+        self.dbH.delete_data('1')
+        Configuration.storage = 'sqlite'
+        self.assertTrue(DBHandler.convert(self.path, self.filename, ShelveEngine))
+        self.assertFalse(DBHandler.convert(self.path, self.filename, ShelveEngine))
+        dbH = DBHandler(self.path, self.filename)
+        self.assertEqual(dbH['config'], 'a config')
+        self.assertEqual([i for i, sib in dbH.get_data(None)], [2])
+        self.assertEqual(dbH.add_data(new_block(b'three')), '3')
+        Configuration.storage = self.storage
+
+
+class DBHandlerLogTestCase(DBHandlerSQLiteTestCase):
+
+    storage = 'log'
+
+    def test_reopen(self):
+        self.dbH['config'] = 'a config'
+        for info in (b'one', b'two', b'three'):
+            self.dbH.add_data(new_block(info))
+        self.dbH.update_data('1', new_block(b'ONE'))
+        self.dbH.delete_data('3')
+        DBPool.close(self.dbH.database)
+        # Offset index is rebuilt from the log file
+        self.assertEqual(self.dbH['config'], 'a config')
+        tabsibs = self.dbH.get_data(None)
+        self.assertEqual([i for i, sib in tabsibs], [1, 2])
+        self.assertEqual(tabsibs[0][1]['info1'], b'ONE')
+        self.assertEqual(self.dbH.add_data(new_block(b'four')), '4')
+
+    def test_torn_record(self):
+        self.dbH.add_data(new_block(b'one'))
+        self.dbH.add_data(new_block(b'two'))
+        DBPool.close(self.dbH.database)
+        with open(self.dbH.database + LogEngine.suffix, 'r+b') as file:
+            file.truncate(file.seek(0, 2) - 1)
+        self.assertEqual([i for i, sib in self.dbH.get_data(None)], [1])
+        self.assertEqual(self.dbH.add_data(new_block(b'three')), '2')
+
+    def test_uncommitted_batch(self):
+        self.dbH.add_data(new_block(b'one'))
+        with self.dbH.batch() as vault:
+            vault.add(new_block(b'two'))
+            vault.add(new_block(b'three'))
+        size = os.path.getsize(self.dbH.database + LogEngine.suffix)
+        self.dbH.add_data(new_block(b'four'))
+        DBPool.close(self.dbH.database)
+        # A crash before the COMMIT record of the last batch
+        with open(self.dbH.database + LogEngine.suffix, 'r+b') as file:
+            file.truncate(file.seek(0, 2) - LogEngine.record.size)
+        self.assertEqual([i for i, sib in self.dbH.get_data(None)], [1, 2, 3])
+        self.assertEqual(os.path.getsize(self.dbH.database + LogEngine.suffix),
+                         size)
+
+    def test_compact(self):
+        Configuration.compaction_ratio = 1.0  # No background compaction
+        for i in range(10):
+            self.dbH.add_data(new_block(b'x' * 10000))
+        for i in range(1, 10):
+            self.dbH.update_data(str(i), new_block(b'y' * 10000))
+        self.dbH.delete_data('10')
+        self.assertGreater(self.dbH.compact(), 100000)
+        self.assertEqual(self.dbH.compact(), 0)
+        tabsibs = self.dbH.get_data(None)
+        self.assertEqual([i for i, sib in tabsibs], list(range(1, 10)))
+        self.assertEqual(tabsibs[0][1]['info1'], b'y' * 10000)
+        self.assertEqual(self.dbH.add_data(new_block(b'z')), '11')
+
+    def test_items_view(self):
+        Configuration.compaction_ratio = 1.0  # No background compaction
+        for info in (b'one', b'two', b'three'):
+            self.dbH.add_data(new_block(info))
+        tabsibs = self.dbH.get_raw_data()
+        self.assertTrue(all(isinstance(psib, memoryview)
+                            for i, psib in tabsibs))
+        # Views are still valid after modifications and a compaction
+        self.dbH.update_data('1', new_block(b'ONE'))
+        self.dbH.delete_data('2')
+        with self.assertRaises(ValueError):
+            with self.dbH.batch() as vault:
+                vault.add(new_block(b'four'))
+                raise ValueError()  # Rollback
+        self.assertGreater(self.dbH.compact(), 0)
+        self.assertEqual([InfoBlock.decode(psib)['info1']
+                          for i, psib in tabsibs], [b'one', b'two', b'three'])
+        self.assertEqual([bytes(psib) for i, psib in self.dbH.get_raw_data()],
+                         [new_block(b'ONE').encode(),
+                          new_block(b'three').encode()])
+
+    @unittest.skipUnless(os.path.isdir('/proc/self/fd'), 'needs /proc')
+    def test_items_view_unmapped(self):
+        self.dbH.add_data(new_block(b'one'))
+        with self.dbH.reader() as vault:
+            nbfds = len(os.listdir('/proc/self/fd'))
+            self.assertEqual([len(psib) for i, psib in vault.items_view()],
+                             [len(new_block(b'one').encode())])
+            self.assertEqual(len(os.listdir('/proc/self/fd')), nbfds)  # Closed
+            views = list(vault.items_view())  # Views kept by the caller
+            self.assertEqual(len(os.listdir('/proc/self/fd')), nbfds + 1)
+            views[0][1].release()
+            self.assertEqual(len(os.listdir('/proc/self/fd')), nbfds)
+
+
+class RWLockTestCase(unittest.TestCase):
+
+    def test_shared_readers(self):
+        lock = RWLock()
+        barrier = threading.Barrier(2, timeout=5)
+
+        def read():
+            with lock.reader():
+                barrier.wait()  # Both readers own the lock together
+
+        thread = threading.Thread(target=read)
+        thread.start()
+        read()
+        thread.join()
+        self.assertFalse(barrier.broken)
+
+    def test_exclusive_writer(self):
+        lock = RWLock()
+        with lock.reader():
+            result = []
+            thread = threading.Thread(
+                target=lambda: result.append(lock.acquire(blocking=False)))
+            thread.start()
+            thread.join()
+            self.assertEqual(result, [False])
+            self.assertRaises(RuntimeError, lock.acquire)  # No upgrade
+        with lock:
+            with lock, lock.reader():  # Reentrant
+                pass
+            result = []
+            thread = threading.Thread(
+                target=lambda: result.append(lock.acquire(blocking=False)))
+            thread.start()
+            thread.join()
+            self.assertEqual(result, [False])
+        self.assertTrue(lock.acquire(blocking=False))
+        self.assertTrue(lock.owned())
+        lock.release()
+        self.assertFalse(lock.owned())
+        with lock.reader():
+            self.assertTrue(lock.owned())
+
+    def test_wait_statistics(self):
+        lock = DBAccess.getLock('test_wait_statistics')
+        self.assertIs(DBAccess.getLock('test_wait_statistics'), lock)
+        waits = DBAccess.stats()['read_waits']
+
+        def read():
+            with lock.reader():
+                pass
+
+        lock.acquire()
+        thread = threading.Thread(target=read)
+        thread.start()
+        threading.Event().wait(0.1)  # Reader is waiting
+        lock.release()
+        thread.join()
+        self.assertEqual(DBAccess.stats()['read_waits'], waits + 1)
+        DBAccess.delLock('test_wait_statistics')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -30,11 +30,11 @@ import threading
 import socket
 import ssl
 import time
-import pickle
 from pathlib import Path
 from mnemopwd.server.server import Server
 from mnemopwd.server.util.Configuration import Configuration
 from mnemopwd.common.KeyHandler import KeyHandler
+from mnemopwd.common.InfoBlock import InfoBlock
 from mnemopwd.common.SecretInfoBlock import SecretInfoBlock
 from mnemopwd.pyelliptic import ECC
 from mnemopwd.pyelliptic import OpenSSL
@@ -591,7 +591,7 @@ class Test_Server_Client_S32_OK(Test_Server_Client_S31_OK_SAME_CONFIG):
             
             psib = tab_protocol_data[1][:taille]
             #print(psib)
-            sib = pickle.loads(psib)
+            sib = InfoBlock.decode(psib)
             sib.control_integrity(self.keyH)
            
             protocol_data = tab_protocol_data[1][taille+1:]
@@ -701,61 +701,28 @@ class Test_Server_Client_S34_OK(Test_Server_Client_S31_OK_SAME_CONFIG):
         connect.send(echallenge + b';SEARCHDATA;' + epattern)
         
     def state_S34_OK(self, connect):
-        message = connect.recv(1024)
+        message = connect.recv(4096)
         protocol_cd = message[:2]
         self.test.assertEqual(protocol_cd, b'OK')
-        
-        tab_protocol_data = message[3:].split(b';', maxsplit=1)
-        nbsibs = int(tab_protocol_data[0].decode())
-        
-        self.test.assertEqual(nbsibs, self.nbsibs)
-        
-        #print('nbsibs: ', nbsibs)
-        #print(tab_protocol_data)
-        
-        if nbsibs > 0:
-            if len(tab_protocol_data) == 1:
-                tab_protocol_data.append("")
-            while len(tab_protocol_data) <= 1:
-                tab_protocol_data[1] += connect.recv(4096)
-            
-            tab_protocol_data = tab_protocol_data[1].split(b';', maxsplit=1)
-        
-        for i in range(nbsibs):
-            protocol_cd = tab_protocol_data[0]
-            self.test.assertEqual(protocol_cd, b'SIB')
-            #print(protocol_cd)
-            
-            tab_protocol_data = tab_protocol_data[1].split(b';', maxsplit=1)
-            index = int((tab_protocol_data[0]).decode())
-            #print(index)
-           
-            tab_protocol_data = tab_protocol_data[1].split(b';', maxsplit=1)
-            taille = int((tab_protocol_data[0]).decode())
-            #print(taille)
-            
-            if taille > len(tab_protocol_data[1]) :
-                if (len(tab_protocol_data[1]) != 0):
-                    tab_protocol_data[1] += connect.recv(4096)
-                else:
-                    tab_protocol_data[1] = connect.recv(4096)
-            
-            psib = tab_protocol_data[1][:taille]
-            #print(psib)
-            sib = pickle.loads(psib)
+
+        # Receive blocks until the end of results
+        end = b';END;' + str(self.nbsibs).encode() + b';'
+        protocol_data = message[2:]
+        while not protocol_data.endswith(end):
+            protocol_data += connect.recv(4096)
+
+        nbsibs = 0
+        while protocol_data[:5] == b';SIB;':
+            tab_protocol_data = protocol_data[5:].split(b';', maxsplit=2)
+            taille = int((tab_protocol_data[1]).decode())
+            psib = tab_protocol_data[2][:taille]
+            sib = InfoBlock.decode(psib)
             sib.control_integrity(self.keyH)
-           
-            protocol_data = tab_protocol_data[1][taille+1:]
-            if len(protocol_data) == 0 and i != nbsibs - 1:
-                protocol_data = connect.recv(4096)
-            #print(protocol_data)
-            if len(protocol_data) != 0:
-                #print(protocol_data[0])
-                if protocol_data[0] == ord(';'):
-                    tab_protocol_data = protocol_data[1:].split(b';', maxsplit=1)
-                else:
-                    tab_protocol_data = protocol_data.split(b';', maxsplit=1)
-            #print(tab_protocol_data)
+            protocol_data = tab_protocol_data[2][taille:]
+            nbsibs += 1
+
+        self.test.assertEqual(protocol_data, end)
+        self.test.assertEqual(nbsibs, self.nbsibs)
         
     def run(self):
         try:
@@ -798,61 +765,28 @@ class Test_Server_Client_S34_OK_NEW_CONFIG(Test_Server_Client_S31_OK_NEW_CONFIG)
         connect.send(echallenge + b';SEARCHDATA;' + epattern)
         
     def state_S34_OK(self, connect):
-        message = connect.recv(1024)
+        message = connect.recv(4096)
         protocol_cd = message[:2]
         self.test.assertEqual(protocol_cd, b'OK')
-        
-        tab_protocol_data = message[3:].split(b';', maxsplit=1)
-        nbsibs = int(tab_protocol_data[0].decode())
-        
-        self.test.assertEqual(nbsibs, self.nbsibs)
-        
-        #print('nbsibs: ', nbsibs)
-        #print(tab_protocol_data)
-        
-        if nbsibs > 0:
-            if len(tab_protocol_data) == 1:
-                tab_protocol_data.append("")
-            while len(tab_protocol_data) <= 1:
-                tab_protocol_data[1] += connect.recv(4096)
-            
-            tab_protocol_data = tab_protocol_data[1].split(b';', maxsplit=1)
-        
-        for i in range(nbsibs):
-            protocol_cd = tab_protocol_data[0]
-            self.test.assertEqual(protocol_cd, b'SIB')
-            #print(protocol_cd)
-            
-            tab_protocol_data = tab_protocol_data[1].split(b';', maxsplit=1)
-            index = int((tab_protocol_data[0]).decode())
-            #print(index)
-           
-            tab_protocol_data = tab_protocol_data[1].split(b';', maxsplit=1)
-            taille = int((tab_protocol_data[0]).decode())
-            #print(taille)
-            
-            if taille > len(tab_protocol_data[1]) :
-                if (len(tab_protocol_data[1]) != 0):
-                    tab_protocol_data[1] += connect.recv(4096)
-                else:
-                    tab_protocol_data[1] = connect.recv(4096)
-            
-            psib = tab_protocol_data[1][:taille]
-            #print(psib)
-            sib = pickle.loads(psib)
+
+        # Receive blocks until the end of results
+        end = b';END;' + str(self.nbsibs).encode() + b';'
+        protocol_data = message[2:]
+        while not protocol_data.endswith(end):
+            protocol_data += connect.recv(4096)
+
+        nbsibs = 0
+        while protocol_data[:5] == b';SIB;':
+            tab_protocol_data = protocol_data[5:].split(b';', maxsplit=2)
+            taille = int((tab_protocol_data[1]).decode())
+            psib = tab_protocol_data[2][:taille]
+            sib = InfoBlock.decode(psib)
             sib.control_integrity(self.keyH)
-           
-            protocol_data = tab_protocol_data[1][taille+1:]
-            if len(protocol_data) == 0 and i != nbsibs - 1:
-                protocol_data = connect.recv(4096)
-            #print(protocol_data)
-            if len(protocol_data) != 0:
-                #print(protocol_data[0])
-                if protocol_data[0] == ord(';'):
-                    tab_protocol_data = protocol_data[1:].split(b';', maxsplit=1)
-                else:
-                    tab_protocol_data = protocol_data.split(b';', maxsplit=1)
-            #print(tab_protocol_data)
+            protocol_data = tab_protocol_data[2][taille:]
+            nbsibs += 1
+
+        self.test.assertEqual(protocol_data, end)
+        self.test.assertEqual(nbsibs, self.nbsibs)
         
     def run(self):
         try:
@@ -899,7 +833,7 @@ class Test_Server_Client_S35_OK_1(Test_Server_Client_S31_OK_SAME_CONFIG):
         sib['info1'] = "secret information"
         
         echallenge = self.get_echallenge(b'S35.6')
-        connect.send(echallenge + b';ADDDATA;' + pickle.dumps(sib))
+        connect.send(echallenge + b';ADDDATA;' + sib.encode())
         
     def state_S35_OK(self, connect):
         message = connect.recv(4096)
@@ -952,7 +886,7 @@ class Test_Server_Client_S35_OK_2(Test_Server_Client_S31_OK_SAME_CONFIG):
         sib['info5'] = "secret information"
         
         echallenge = self.get_echallenge(b'S35.6')
-        connect.send(echallenge + b';ADDDATA;' + pickle.dumps(sib))
+        connect.send(echallenge + b';ADDDATA;' + sib.encode())
         
     def state_S35_OK(self, connect):
         message = connect.recv(4096)
@@ -1035,7 +969,7 @@ class Test_Server_Client_S35_OK_NEW_CONFIG(Test_Server_Client_S31_OK_NEW_CONFIG)
         sib['info1'] = "secret information"
         
         echallenge = self.get_echallenge(b'S35.6')
-        connect.send(echallenge + b';ADDDATA;' + pickle.dumps(sib))
+        connect.send(echallenge + b';ADDDATA;' + sib.encode())
         
     def state_S35_OK(self, connect):
         message = connect.recv(4096)
@@ -1205,11 +1139,11 @@ class Test_Server_Client_S37_OK(Test_Server_Client_S31_OK_SAME_CONFIG):
         
         echallenge = self.get_echallenge(b'S37.5')
         if bug == 1:
-            connect.send(echallenge + b';UPDATEDATA;' + b'1000;' + pickle.dumps(sib))
+            connect.send(echallenge + b';UPDATEDATA;' + b'1000;' + sib.encode())
         elif bug == 2:
-            connect.send(echallenge + b';UPDATEDATA;' + b'badindex;' + pickle.dumps(sib))
+            connect.send(echallenge + b';UPDATEDATA;' + b'badindex;' + sib.encode())
         elif bug == False:
-            connect.send(echallenge + b';UPDATEDATA;' + b'2;' + pickle.dumps(sib))
+            connect.send(echallenge + b';UPDATEDATA;' + b'2;' + sib.encode())
         
     def state_S37_OK(self, connect):
         message = connect.recv(1024)